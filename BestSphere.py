@@ -1,137 +1,129 @@
+import argparse
 import os
-import time
 import math
 
-# Function to generate the 3D sphere with lighting and rotation
-def generate_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x=1.0, scale_y=1.0):
-    chars = '.,-~:;=!*#$@'  # Characters for shading based on light intensity
-    ambient_light = 0.1  # Constant ambient light
-    specular_power = 32  # Controls sharpness of specular highlights
-
-    # Calculate light position based on spherical coordinates
-    light_x = light_radius * math.sin(light_phi) * math.cos(light_theta)
-    light_y = light_radius * math.sin(light_phi) * math.sin(light_theta)
-    light_z = light_radius * math.cos(light_phi)
-
-    # Normalize light vector
-    light_magnitude = math.sqrt(light_x ** 2 + light_y ** 2 + light_z ** 2)
-    light_x /= light_magnitude
-    light_y /= light_magnitude
-    light_z /= light_magnitude
-
-    zbuffer = [-float('inf')] * (screen_width * screen_height)  # Z-buffer for depth sorting
-    screen_pixels = [' '] * (screen_width * screen_height)  # Screen pixel buffer
-
-    # ANSI escape code for green color
-    color_code = "\033[38;2;0;255;0m"  # Green color in RGB
-
-    # Loop over spherical coordinates to generate each point
-    for phi in range(0, 628, 7):  # phi angle (latitude) loop
-        for theta in range(0, 628, 2):  # theta angle (longitude) loop
-            phi_rad = phi / 100  # Convert phi to radians
-            theta_rad = theta / 100  # Convert theta to radians
-
-            # 3D coordinates of the point on the sphere
-            x = radius * math.sin(phi_rad) * math.cos(theta_rad)
-            y = radius * math.sin(phi_rad) * math.sin(theta_rad)
-            z = radius * math.cos(phi_rad)
-
-            # Apply rotation around Y-axis
-            x_rot = x * math.cos(rotation_y) - z * math.sin(rotation_y)
-            z_rot_y = x * math.sin(rotation_y) + z * math.cos(rotation_y)
-
-            # Apply rotation around X-axis
-            y_rot = y * math.cos(rotation_x) - z_rot_y * math.sin(rotation_x)
-            z_rot = y * math.sin(rotation_x) + z_rot_y * math.cos(rotation_x)
-
-            # Normalize the normal vector at the current point
-            nx, ny, nz = x_rot / radius, y_rot / radius, z_rot / radius
-
-            # Backface culling: discard points facing away from the viewer
-            if nz > 0:
-                # Diffuse lighting: dot product between normal and light direction
-                dot_light_normal = max(0, nx * light_x + ny * light_y + nz * light_z)
-
-                # Light attenuation for points behind the sphere
-                attenuation = 1.0 if dot_light_normal > 0 else 0.2  
-                diffuse = dot_light_normal * light_intensity * attenuation
-
-                # Specular highlights: reflection of light
-                reflection = max(0, 2 * dot_light_normal * nz - light_z)
-                specular = (reflection ** specular_power) * light_intensity if dot_light_normal > 0 else 0
-
-                # Total light intensity (ambient + diffuse + specular)
-                light_intensity_final = ambient_light + diffuse + specular
-                light_intensity_final = max(0, min(1, light_intensity_final))  # Clamp to [0, 1]
-                luminance_index = int(light_intensity_final * (len(chars) - 1))  # Map to character index
-
-                # Project the 3D point onto the 2D screen
-                xp = int(screen_width / 2 + scale_x * x_rot)
-                yp = int(screen_height / 2 - scale_y * y_rot)
-
-                # Render the point if it is on the screen
-                if 0 <= xp < screen_width and 0 <= yp < screen_height:
-                    pixel_position = xp + screen_width * yp
-                    if zbuffer[pixel_position] < z_rot:  # Ensure that the nearest point is drawn
-                        zbuffer[pixel_position] = z_rot
-                        # Assign the colored character based on intensity
-                        screen_pixels[pixel_position] = f"{color_code}{chars[luminance_index]}\033[0m"
-
-    # Return the 2D representation of the sphere
-    return [''.join(screen_pixels[i * screen_width:(i + 1) * screen_width]) for i in range(screen_height)]
+import renderer
+from ansi import encode_rows
+from frame_cache import FrameCache
+from geometry_cache import sphere_table
+from lod import sphere_steps
+from presenter import TerminalPresenter
+from scheduler import DEFAULT_FPS, FrameScheduler
+from renderer import Orthographic, Phong
+from transform import rotation_yx, spherical
+
+# Cell for each screen code: 0 is blank, 1.. are the shading characters in green
+PALETTE = renderer.LUMINANCE_PALETTE
+
+# Speeds are per frame at 30 fps (scheduler.REFERENCE_FPS)
+ROTATION_SPEED_X = 0.05  # Speed of rotation around the X-axis
+ROTATION_SPEED_Y = 0.03  # Speed of rotation around the Y-axis
+LIGHT_ROTATION_SPEED = 0.2  # Speed of light rotation
+LIGHT_PHI = math.pi / 4  # The light starts at 45 degrees from the vertical
+
+# Function to compute the sphere and light angles (rotation_x, rotation_y,
+# light_theta, light_phi) `time` frames into the animation; depends on
+# nothing else, so any frame can be rendered on its own
+def pose_at(time):
+    return (ROTATION_SPEED_X * time, ROTATION_SPEED_Y * time,
+            LIGHT_ROTATION_SPEED * time, LIGHT_PHI + LIGHT_ROTATION_SPEED * 0.8 * time)
+
+# Function to set up the rotation, projection and lighting (ambient + diffuse +
+# specular, back faces culled) of one sphere frame
+def sphere_frame(rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, scale_x=1.0, scale_y=1.0):
+    light = spherical(light_radius, light_theta, light_phi)
+    lighting = Phong(light, light_intensity, ambient=0.1, specular_power=32, levels=len(PALETTE) - 1)
+    return rotation_yx(rotation_x, rotation_y), Orthographic(scale_x, scale_y), lighting
+
+# Function to rasterize the 3D sphere with lighting and rotation into flat char and color planes
+def rasterize_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x=1.0, scale_y=1.0, phi_step=7, theta_step=2, phi_limit=628):
+    frame = sphere_frame(rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, scale_x, scale_y)
+    return renderer.render(sphere_table(radius, phi_step, theta_step, phi_limit), *frame, PALETTE, screen_width, screen_height, radius=radius)
+
+# Function to ray-cast the sphere, one ray per cell (needs NumPy), into flat char and color planes
+def raycast_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x=1.0, scale_y=1.0):
+    import raycast  # Imported lazily so the sample engine works without NumPy installed
+    frame = sphere_frame(rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, scale_x, scale_y)
+    return raycast.render(raycast.Sphere(radius), *frame, PALETTE, screen_width, screen_height)
+
+def generate_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x=1.0, scale_y=1.0, phi_step=7, theta_step=2, phi_limit=628):
+    screen_chars, screen_colors = rasterize_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x, scale_y, phi_step, theta_step, phi_limit)
+    return encode_rows(screen_chars, screen_colors, screen_width, screen_height)
 
 # Function to clear the terminal screen (works across platforms)
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
 # Main function to control animation and rendering
-def main():
+def main(processes=0, presenter=None, lod=False, cache_mb=0, fps=DEFAULT_FPS, engine="splat"):
     radius = 12  # Radius of the sphere
-    rotation_speed_x = 0.05  # Speed of rotation around the X-axis
-    rotation_speed_y = 0.03  # Speed of rotation around the Y-axis
-    light_rotation_speed = 0.2  # Speed of light rotation
 
     scale_x = 2.0  # Horizontal scaling factor (for aspect ratio)
     scale_y = 1.0  # Vertical scaling factor (for aspect ratio)
     screen_width = 80  # Terminal screen width
     screen_height = 24  # Terminal screen height
 
-    # Initial rotation angles for the sphere and light
-    rotation_x = 0
-    rotation_y = 0
-    light_theta = 0
-    light_phi = math.pi / 4  # Start at 45 degrees from the vertical
+    # Sample steps: the fixed ones, or with lod the ones for the size on screen
+    sample_steps = sphere_steps(Orthographic(scale_x, scale_y), radius) if lod else (7, 2)
 
     light_radius = 3.0  # Distance of the light from the sphere
     light_intensity = 1.5  # Light intensity
 
+    # Optionally render parts of the sample table in a process pool
+    pool = None
+    if processes and engine == "splat":
+        from parallel import ParallelRenderer
+        pool = ParallelRenderer(sphere_table, (radius, *sample_steps), PALETTE, screen_width, screen_height, processes=processes)
+
+    # Optionally keep finished frames by sphere and light angles
+    cache = FrameCache(int(cache_mb * 1048576)) if cache_mb else None
+
+    # Function to render the frame for the current angles
+    def render():
+        if engine == "raycast":
+            return raycast_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x, scale_y)
+        if pool is not None:
+            return pool.render(*sphere_frame(rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, scale_x, scale_y), radius=radius)
+        return rasterize_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x, scale_y, *sample_steps)
+
+    if presenter is None:
+        presenter = TerminalPresenter(screen_width, screen_height)  # Redraws only the cells that changed
+    scheduler = FrameScheduler(fps)
+
+    # The presenter is closed on any exit (it restores the cursor), before the
+    # message so that lands below the frame
     try:
-        while True:
-            start_time = time.time()  # Record the start time for FPS calculation
-
-            # Update light rotation angles
-            light_theta += light_rotation_speed
-            light_phi += light_rotation_speed * 0.8
-
-            # Generate the sphere and render it
-            sphere = generate_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x, scale_y)
-            clear_screen()  # Clear the screen before rendering
-            for line in sphere:  # Print each line of the sphere to the terminal
-                print(line)
-
-            # Calculate and display FPS (frames per second)
-            elapsed_time = time.time() - start_time
-            fps = 1 / elapsed_time
-            print(f"\nFPS: {fps:.2f}")
-
-            # Update rotation angles for the next frame
-            rotation_x += rotation_speed_x
-            rotation_y += rotation_speed_y
-
-            time.sleep(0.03)  # Control animation speed
+        try:
+            while True:
+                # Sphere and light angles at the current animation time
+                rotation_x, rotation_y, light_theta, light_phi = pose_at(scheduler.time)
+
+                # Generate the sphere and render it, with the FPS and dropped frames below it
+                if cache is not None:
+                    key = cache.key(rotation_x, rotation_y, light_theta, light_phi)
+                    screen_chars, screen_colors = cache.frame(key, render)
+                    presenter.present(screen_chars, screen_colors, f"{scheduler.status()}  {cache.stats()}")
+                else:
+                    screen_chars, screen_colors = render()
+                    presenter.present(screen_chars, screen_colors, scheduler.status())
+
+                # Wait for the next frame; the scheduler's clock moves on by the time that passed
+                scheduler.wait()
+        finally:
+            presenter.close()
+            if pool is not None:
+                pool.close()
     except KeyboardInterrupt:  # Graceful exit on keyboard interrupt
         print("\nAnimation stopped.")
 
 # Start the program
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=("splat", "raycast"), default="splat",
+                        help="draw the sample table, or cast one ray per cell (needs NumPy)")
+    parser.add_argument("--processes", type=int, default=0, help="render in a pool of this many processes (0: single process)")
+    parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the sphere on screen")
+    parser.add_argument("--cache-mb", type=float, default=0, help="reuse frames of recurring poses, keeping up to this many MB (0: off)")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="target frame rate; the animation speed does not depend on it")
+    args = parser.parse_args()
+    main(args.processes, lod=args.lod, cache_mb=args.cache_mb, fps=args.fps, engine=args.engine)
@@ -1,82 +1,75 @@
+import argparse
 import os
-import time
 import math
 
-def generate_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x=1.0, scale_y=1.0):
+import renderer
+from ansi import encode_rows
+from geometry_cache import sphere_table
+from lod import sphere_steps
+from presenter import TerminalPresenter
+from scheduler import DEFAULT_FPS, REFERENCE_FPS, FrameScheduler
+from renderer import Diffuse, Orthographic
+from transform import rotation_yx, spherical
+
+# Cell for each screen code: 0 is blank, 1.. are the luminance characters in fixed green
+PALETTE = renderer.LUMINANCE_PALETTE
+
+ROTATION_SPEED_X = 0.05  # Per frame at 30 fps (scheduler.REFERENCE_FPS)
+ROTATION_SPEED_Y = 0.1
+
+def pose_at(time):
+    """
+    Sphere and light angles (rotation_x, rotation_y, light_theta, light_phi) `time` frames into the animation.
+
+    The light swings back and forth once every 2π seconds of animation. Nothing
+    else is read, so any frame can be rendered on its own.
+    """
+    seconds = time / REFERENCE_FPS
+    return (ROTATION_SPEED_X * time, ROTATION_SPEED_Y * time,
+            math.sin(seconds) * math.pi * 2, math.cos(seconds) * math.pi)
+
+def sphere_frame(rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, scale_x=1.0, scale_y=1.0):
+    """
+    Rotation, projection and lighting of one sphere frame.
+
+    The light vector is not normalized, so light_radius acts as a second intensity.
+    Only the hemisphere facing the viewer is drawn.
+    """
+    levels = len(PALETTE) - 1
+    lx, ly, lz = spherical(light_radius * light_intensity * (levels - 1), light_theta, light_phi)
+    lighting = Diffuse((lx, ly, lz), levels, cull_back=True)
+    return rotation_yx(rotation_x, rotation_y), Orthographic(scale_x, scale_y), lighting
+
+def rasterize_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x=1.0, scale_y=1.0, phi_step=7, theta_step=2, phi_limit=628):
     """
     Generate a 3D sphere using spherical coordinates, rotating it and applying lighting effects.
+    Returns the flat char and color planes of the screen (row-major).
+    """
+    frame = sphere_frame(rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, scale_x, scale_y)
+    return renderer.render(sphere_table(radius, phi_step, theta_step, phi_limit), *frame, PALETTE, screen_width, screen_height, radius=radius)
+
+def generate_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x=1.0, scale_y=1.0, phi_step=7, theta_step=2, phi_limit=628):
+    """
+    Render the sphere and return it as a list of screen rows.
     """
-    # Define the characters used for different light intensities
-    chars = '.,-~:;=!*#$@'
-
-    # Calculate light direction based on light_radius, light_theta, and light_phi
-    light_x = light_radius * math.sin(light_phi) * math.cos(light_theta)
-    light_y = light_radius * math.sin(light_phi) * math.sin(light_theta)
-    light_z = light_radius * math.cos(light_phi)
-
-    # Precompute rotation cosines and sines
-    cos_rx, sin_rx = math.cos(rotation_x), math.sin(rotation_x)
-    cos_ry, sin_ry = math.cos(rotation_y), math.sin(rotation_y)
-
-    zbuffer = [0 for _ in range(screen_height * screen_width)]
-    screen_pixels = [' ' for _ in range(screen_height * screen_width)]
-
-    # Iterate over the spherical coordinates
-    for phi in range(0, 628, 7):
-        for theta in range(0, 628, 2):
-            # Convert to radians
-            phi_rad = phi / 100
-            theta_rad = theta / 100
-
-            # Spherical to Cartesian conversion
-            x = radius * math.sin(phi_rad) * math.cos(theta_rad)
-            y = radius * math.sin(phi_rad) * math.sin(theta_rad)
-            z = radius * math.cos(phi_rad)
-
-            # Apply rotation transformations
-            x_rot = x * cos_ry - z * sin_ry
-            z_rot = x * sin_ry + z * cos_ry
-            y_rot = y * cos_rx - z_rot * sin_rx
-            z_rot = y * sin_rx + z_rot * cos_rx
-
-            # Normalize the normal vector
-            nx, ny, nz = x_rot / radius, y_rot / radius, z_rot / radius
-
-            # Calculate light intensity based on light vector and surface normal
-            dot = max(0, nx * light_x + ny * light_y + nz * light_z) * light_intensity
-
-            # Map intensity to character
-            luminance_index = max(0, min(len(chars) - 1, int(dot * (len(chars) - 1))))
-
-            # Convert to screen space
-            xp = int(screen_width / 2 + scale_x * x_rot)
-            yp = int(screen_height / 2 - scale_y * y_rot)
-
-            if 0 <= xp < screen_width and 0 <= yp < screen_height:
-                pixel_position = xp + screen_width * yp
-                if zbuffer[pixel_position] < z_rot:
-                    zbuffer[pixel_position] = z_rot
-                    
-                    # Fixed green color for all characters
-                    r, g, b = 0, 255, 0  # Full green, no red or blue
-                    
-                    # ANSI escape code for fixed green color
-                    color_code = f"\033[38;2;{r};{g};{b}m"  # Green color in RGB
-
-                    # Assign the colored character to the screen
-                    screen_pixels[pixel_position] = f"{color_code}{chars[luminance_index]}\033[0m"
-
-    screen = [''.join(screen_pixels[i * screen_width:(i + 1) * screen_width]) for i in range(screen_height)]
+    screen_chars, screen_colors = rasterize_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x, scale_y, phi_step, theta_step, phi_limit)
+    screen = encode_rows(screen_chars, screen_colors, screen_width, screen_height)
     return screen
 
+def raycast_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x=1.0, scale_y=1.0):
+    """
+    Ray-cast the sphere, one ray per screen cell (needs NumPy).
+    Returns the flat char and color planes of the screen (row-major).
+    """
+    import raycast  # Imported lazily so the sample engine works without NumPy installed
+    frame = sphere_frame(rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, scale_x, scale_y)
+    return raycast.render(raycast.Sphere(radius), *frame, PALETTE, screen_width, screen_height)
+
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def main():
+def main(processes=0, presenter=None, lod=False, fps=DEFAULT_FPS, engine="splat"):
     radius = 10
-    rotation_speed_x = 0.05
-    rotation_speed_y = 0.1
-    light_rotation_speed = 0.05
 
     scale_x = 2.0  # Horizontal scaling
     scale_y = 1.0  # Vertical scaling
@@ -84,41 +77,55 @@ def main():
     screen_width = 80
     screen_height = 24
 
-    rotation_x = 0
-    rotation_y = 0
-    light_theta = 0
-    light_phi = math.pi / 4
+    # Sample steps: the fixed ones, or with lod the ones for the size on screen
+    sample_steps = sphere_steps(Orthographic(scale_x, scale_y), radius) if lod else (7, 2)
 
     # New light properties
     light_radius = 1.5  # Distance of light from the center of the sphere
     light_intensity = 1.2  # Controls brightness, >1 increases brightness
 
-    try:
-        while True:
-            start_time = time.time()
-
-            # Update light position dynamically
-            light_theta = math.sin(time.time() * 1.0) * math.pi * 2
-            light_phi = math.cos(time.time() * 1.0) * math.pi
-
-            # Generate the sphere with dynamic lighting
-            screen = generate_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x, scale_y)
-            clear_screen()
-
-            for line in screen:
-                print(line)
+    # Optionally render parts of the sample table in a process pool
+    pool = None
+    if processes and engine == "splat":
+        from parallel import ParallelRenderer
+        pool = ParallelRenderer(sphere_table, (radius, *sample_steps), PALETTE, screen_width, screen_height, processes=processes)
 
-            rotation_x += rotation_speed_x
-            rotation_y += rotation_speed_y
-
-            elapsed_time = time.time() - start_time
-            fps = 1 / elapsed_time if elapsed_time > 0 else 0
-            print(f"\nFPS: {fps:.2f}")
-
-            time.sleep(0.03)
+    if presenter is None:
+        presenter = TerminalPresenter(screen_width, screen_height)
+    scheduler = FrameScheduler(fps)
 
+    # The presenter is closed on any exit (it restores the cursor), before the
+    # message so that lands below the frame
+    try:
+        try:
+            while True:
+                # Sphere and light angles at the current animation time
+                rotation_x, rotation_y, light_theta, light_phi = pose_at(scheduler.time)
+
+                # Generate the sphere with dynamic lighting
+                if engine == "raycast":
+                    screen_chars, screen_colors = raycast_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x, scale_y)
+                elif pool is not None:
+                    screen_chars, screen_colors = pool.render(*sphere_frame(rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, scale_x, scale_y), radius=radius)
+                else:
+                    screen_chars, screen_colors = rasterize_sphere(radius, rotation_x, rotation_y, light_theta, light_phi, light_radius, light_intensity, screen_width, screen_height, scale_x, scale_y, *sample_steps)
+                presenter.present(screen_chars, screen_colors, scheduler.status())
+
+                # Wait for the next frame; the scheduler's clock moves on by the time that passed
+                scheduler.wait()
+        finally:
+            presenter.close()
+            if pool is not None:
+                pool.close()
     except KeyboardInterrupt:
         print("\nAnimation stopped.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=("splat", "raycast"), default="splat",
+                        help="draw the sample table, or cast one ray per cell (needs NumPy)")
+    parser.add_argument("--processes", type=int, default=0, help="render in a pool of this many processes (0: single process)")
+    parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the sphere on screen")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="target frame rate; the animation speed does not depend on it")
+    args = parser.parse_args()
+    main(args.processes, lod=args.lod, fps=args.fps, engine=args.engine)
@@ -0,0 +1,63 @@
+import argparse
+
+import rasterizer
+import renderer
+from mesh import cube_mesh, fit, load_obj, sphere_mesh, torus_mesh, triangle_count
+from presenter import TerminalPresenter
+from scheduler import DEFAULT_FPS, FrameScheduler
+from renderer import Diffuse, Perspective
+from transform import rotation_matrix
+
+SCREEN_WIDTH = 80
+SCREEN_HEIGHT = 24
+ROTATE_SPEED = 0.04  # Per frame at 30 fps (scheduler.REFERENCE_FPS)
+
+PALETTE = renderer.LUMINANCE_PALETTE
+
+# Light from above and behind the viewer, as in MyDonut.py; faces turned away
+# from it get the darkest character, so the silhouette stays visible
+LIGHTING = Diffuse((0, 8, -8))
+
+# Built-in shapes, for trying the rasterizer without an OBJ file
+SHAPES = {
+    'torus': torus_mesh,
+    'sphere': lambda: sphere_mesh(1.0),
+    'cube': lambda: cube_mesh(1.0),
+}
+
+# Function to set up the projection: every mesh is fitted into the unit
+# sphere, 5 units in front of the viewer, filling the screen height
+def mesh_projection(screen_width, screen_height):
+    return Perspective(screen_height * 15 / 8, 5, x_scale=screen_width * 3 / (screen_height * 5))
+
+# Function to compute the rotation angles (A, B, C) `time` frames into the animation
+def pose_at(time):
+    return ROTATE_SPEED * time, 0, ROTATE_SPEED / 2 * time
+
+def main(mesh, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT, presenter=None, fps=DEFAULT_FPS):
+    if presenter is None:
+        presenter = TerminalPresenter(screen_width, screen_height)
+    mesh = fit(mesh, 1.0)
+    projection = mesh_projection(screen_width, screen_height)
+
+    scheduler = FrameScheduler(fps)
+
+    try:
+        while True:
+            screen_chars, screen_colors = rasterizer.render_mesh(mesh, rotation_matrix(*pose_at(scheduler.time)), projection, LIGHTING,
+                                                                 PALETTE, screen_width, screen_height, radius=1.0)
+            presenter.present(screen_chars, screen_colors, f"{scheduler.status()}  triangles: {triangle_count(mesh)}")
+
+            scheduler.wait()
+    finally:
+        presenter.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spinning ASCII view of a triangle mesh")
+    parser.add_argument("obj", nargs="?", help="Wavefront OBJ file to show")
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="torus", help="built-in shape when no OBJ file is given")
+    parser.add_argument("--width", type=int, default=SCREEN_WIDTH)
+    parser.add_argument("--height", type=int, default=SCREEN_HEIGHT)
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="target frame rate; the animation speed does not depend on it")
+    args = parser.parse_args()
+    main(load_obj(args.obj) if args.obj else SHAPES[args.shape](), args.width, args.height, fps=args.fps)
@@ -1,122 +1,123 @@
-import os
-import time
-from math import sin, cos
+import argparse
 import colorsys
+import math
+
+import renderer
+from ansi import rgb
+from frame_cache import FrameCache
+from geometry_cache import ALL_FACES, cube_table
+from lod import cube_step
+from presenter import TerminalPresenter
+from scheduler import DEFAULT_FPS, FrameScheduler
+from renderer import FaceCodes, Perspective
+from transform import rotation_matrix
+from transform import calculate_x, calculate_y, calculate_z  # noqa: F401 (kept importable from here)
 
 # Constants
 CUBE_SIZE = 10
+CUBE_BOUND = CUBE_SIZE * math.sqrt(3)  # Distance of the corners from the centre
 SCREEN_WIDTH = 80
 SCREEN_HEIGHT = 30
 K2 = 40
 K1 = 20
-ROTATE_SPEED = 0.05
-SLEEP_TIME = 0.03
+ROTATE_SPEED = 0.05  # Per frame at 30 fps (scheduler.REFERENCE_FPS)
+SAMPLE_STEP = 0.6  # Spacing of the surface lattice
 
-# Function to initialize the rotation angles
-def init_rotation():
-    return 0, 0, 0  # A, B, C angles
+# Use colorsys to generate a green color (hue = 0.33, max saturation and value)
+GREEN = rgb(*(int(c * 255) for c in colorsys.hsv_to_rgb(0.33, 1.0, 1.0)))
+
+# Characters of the 6 cube faces; screen code 0 is blank and code n is face n
+FACE_CHARS = '@$#~;+'
+PALETTE = [(' ', None)] + [(char, GREEN) for char in FACE_CHARS]
+
+# The cube is flat-shaded: every face is drawn with its own character
+PROJECTION = Perspective(K1, K2)
+LIGHTING = FaceCodes()
+
+CULL_FACES = True  # Skip the faces turned away from the viewer
+
+# Function to pick the lattice step: the fixed one, or with lod the one for the size on screen
+def lattice_step(lod=False):
+    return cube_step(PROJECTION, CUBE_SIZE) if lod else SAMPLE_STEP
+
+# Function to pick the cube_table arguments of a frame: only the faces turned
+# towards the viewer, or all six with culling off (to compare the output)
+def frame_lattice(rotation, cull_faces=CULL_FACES, lod=False):
+    faces = renderer.visible_cube_faces(rotation, PROJECTION, CUBE_SIZE) if cull_faces else ALL_FACES
+    return CUBE_SIZE, lattice_step(lod), False, faces
+
+# Function to compute the rotation angles (A, B, C) `time` frames into the
+# animation; depends on nothing else, so any frame can be rendered on its own
+def pose_at(time):
+    return ROTATE_SPEED * time, 0, ROTATE_SPEED * time
 
 # Main rendering function
-def main():
-    clear_command = "cls" if os.name == "nt" else "clear"
-
-    # Initialize rotation angles
-    A, B, C = init_rotation()
-
-    frame_count = 0  # To count the frames rendered
-    start_time = time.time()  # To measure elapsed time
-
-    while True:
-        # Reset buffers
-        zbuffer = [-float('inf')] * (SCREEN_WIDTH * SCREEN_HEIGHT)
-        screen_pixels = [' '] * (SCREEN_WIDTH * SCREEN_HEIGHT)
-
-        # Iterate through the cube's grid points
-        for cubeX in frange(-CUBE_SIZE, CUBE_SIZE, 0.6):
-            for cubeY in frange(-CUBE_SIZE, CUBE_SIZE, 0.6):
-                # Draw 6 cube faces using different characters
-                draw_cube_faces(cubeX, cubeY, -CUBE_SIZE, '@', zbuffer, screen_pixels, A, B, C)
-                draw_cube_faces(CUBE_SIZE, cubeY, cubeX, '$', zbuffer, screen_pixels, A, B, C)
-                draw_cube_faces(-CUBE_SIZE, cubeY, -cubeX, '#', zbuffer, screen_pixels, A, B, C)
-                draw_cube_faces(-cubeX, cubeY, CUBE_SIZE, '~', zbuffer, screen_pixels, A, B, C)
-                draw_cube_faces(cubeX, -CUBE_SIZE, -cubeY, ';', zbuffer, screen_pixels, A, B, C)
-                draw_cube_faces(cubeX, CUBE_SIZE, cubeY, '+', zbuffer, screen_pixels, A, B, C)
-
-        # Clear and render the frame
-        os.system(clear_command)
-        render_frame(screen_pixels)
-
-        # Increment rotation angles
-        A += ROTATE_SPEED
-        C += ROTATE_SPEED
-
-        # Update FPS counter
-        frame_count += 1
-        elapsed_time = time.time() - start_time
-        if elapsed_time >= 1:
-            fps = frame_count / elapsed_time
-            frame_count = 0
-            start_time = time.time()
-        else:
-            fps = frame_count / elapsed_time if elapsed_time > 0 else 0
-
-        # Print FPS in the same line
-        print(f"\rFPS: {fps:.2f}", end="")  # Overwrites the previous FPS on the same line
-
-        time.sleep(SLEEP_TIME)
-
-# Function to generate floating-point ranges for iteration
-def frange(start, stop, step):
-    while start < stop:
-        yield round(start, 2)
-        start += step
-
-# Function to draw cube faces
-def draw_cube_faces(cubeX, cubeY, cubeZ, char, zbuffer, screen_pixels, A, B, C):
-    x = calculate_x(cubeX, cubeY, cubeZ, A, B, C)
-    y = calculate_y(cubeX, cubeY, cubeZ, A, B, C)
-    z = calculate_z(cubeX, cubeY, cubeZ, A, B, C) + K2
-
-    ooz = 1 / z  # Inverse of depth (1/z)
-    xp = int(SCREEN_WIDTH / 2 + K1 * ooz * x * 2)
-    yp = int(SCREEN_HEIGHT / 2 - K1 * ooz * y)
-
-    if 0 <= xp < SCREEN_WIDTH and 0 <= yp < SCREEN_HEIGHT:
-        pixel_position = xp + yp * SCREEN_WIDTH
-        if ooz > zbuffer[pixel_position]:
-            zbuffer[pixel_position] = ooz
-
-            # Use colorsys to generate a green color (hue = 0.33, max saturation and value)
-            hue = 0.33  # Green color in HSV
-            saturation = 1.0
-            value = 1.0  # Brightness
-            r, g, b = colorsys.hsv_to_rgb(hue, saturation, value)  # Convert to RGB
-            r, g, b = int(r * 255), int(g * 255), int(b * 255)  # Convert to 8-bit RGB
-
-            # ANSI escape code for green color
-            color_code = f"\033[38;2;{r};{g};{b}m"  # Green color in RGB
-
-            # Assign the colored character to the screen
-            screen_pixels[pixel_position] = f"{color_code}{char}\033[0m"
-
-# 3D rotation functions
-def calculate_x(i, j, k, A, B, C):
-    return (j * sin(A) * sin(B) * cos(C)) - (k * cos(A) * sin(B) * cos(C)) + \
-           (j * cos(A) * sin(C)) + (k * sin(A) * sin(C)) + (i * cos(B) * cos(C))
-
-def calculate_y(i, j, k, A, B, C):
-    return (j * cos(A) * cos(C)) + (k * sin(A) * cos(C)) - \
-           (j * sin(A) * sin(B) * sin(C)) + (k * cos(A) * sin(B) * sin(C)) - \
-           (i * cos(B) * sin(C))
-
-def calculate_z(i, j, k, A, B, C):
-    return (k * cos(A) * cos(B)) - ((j * sin(A) * cos(B)) + (i * sin(B)))
-
-# Function to render the frame
-def render_frame(screen_pixels):
-    for i in range(SCREEN_HEIGHT):
-        row = "".join(screen_pixels[i * SCREEN_WIDTH:(i + 1) * SCREEN_WIDTH])
-        print(row)
+def main(processes=0, presenter=None, cull_faces=CULL_FACES, lod=False, cache_mb=0, fps=DEFAULT_FPS, engine="splat"):
+    if presenter is None:
+        presenter = TerminalPresenter(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    # Optionally render parts of the sample lattice in a process pool
+    pool = None
+    if processes and engine == "splat":
+        from parallel import ParallelRenderer
+        pool = ParallelRenderer(cube_table, (CUBE_SIZE, lattice_step(lod), False, ALL_FACES), PALETTE, SCREEN_WIDTH, SCREEN_HEIGHT, processes=processes)
+
+    # Optionally keep finished frames by pose, so a warm loop only looks them up
+    cache = FrameCache(int(cache_mb * 1048576)) if cache_mb else None
+
+    # Function to render the frame for the current angles
+    def render():
+        if engine == "raycast":
+            return raycast_frame(A, B, C)
+        if pool is not None:
+            rotation = rotation_matrix(A, B, C)
+            return pool.render(rotation, PROJECTION, LIGHTING, frame_lattice(rotation, cull_faces, lod), radius=CUBE_BOUND)
+        return rasterize_frame(A, B, C, cull_faces=cull_faces, lod=lod)
+
+    scheduler = FrameScheduler(fps)
+
+    try:
+        while True:
+            A, B, C = pose_at(scheduler.time)
+            if cache is not None:
+                screen_chars, screen_colors = cache.frame(cache.key(A, B, C), render)
+                status = f"{scheduler.status()}  {cache.stats()}"
+            else:
+                screen_chars, screen_colors = render()
+                status = scheduler.status()
+
+            # Render the frame, with the FPS line below it
+            presenter.present(screen_chars, screen_colors, status)
+
+            # Wait for the next frame; the scheduler's clock moves on by the time that passed
+            scheduler.wait()
+    finally:
+        presenter.close()
+        if pool is not None:
+            pool.close()
+
+# Function to render one frame of the cube into char and color planes
+def rasterize_frame(A, B, C, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT, cull_faces=CULL_FACES, lod=False):
+    rotation = rotation_matrix(A, B, C)
+    table = cube_table(*frame_lattice(rotation, cull_faces, lod))
+    return renderer.render(table, rotation, PROJECTION, LIGHTING, PALETTE, screen_width, screen_height, radius=CUBE_BOUND)
+
+# Function to ray-cast one frame of the cube, one ray per cell (needs NumPy);
+# culling and lod do not apply, only the nearest face is ever hit
+def raycast_frame(A, B, C, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT):
+    import raycast  # Imported lazily so the sample engine works without NumPy installed
+    rotation = rotation_matrix(A, B, C)
+    return raycast.render(raycast.Cube(CUBE_SIZE), rotation, PROJECTION, LIGHTING, PALETTE, screen_width, screen_height)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=("splat", "raycast"), default="splat",
+                        help="draw the sample lattice, or cast one ray per cell (needs NumPy)")
+    parser.add_argument("--processes", type=int, default=0, help="render in a pool of this many processes (0: single process)")
+    parser.add_argument("--cull", action=argparse.BooleanOptionalAction, default=CULL_FACES,
+                        help="skip the faces turned away from the viewer (--no-cull draws all six)")
+    parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the cube on screen")
+    parser.add_argument("--cache-mb", type=float, default=0, help="reuse frames of recurring poses, keeping up to this many MB (0: off)")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="target frame rate; the animation speed does not depend on it")
+    args = parser.parse_args()
+    main(args.processes, cull_faces=args.cull, lod=args.lod, cache_mb=args.cache_mb, fps=args.fps, engine=args.engine)
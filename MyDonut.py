@@ -1,79 +1,122 @@
-import os
-import time
-from math import sin, cos
-
-def main():
-    a = 0  # Initial rotation angle around the X-axis
-    b = 0  # Initial rotation angle around the Z-axis    
-    screen_height = 24
-    screen_width = 80
-
-    clear_command = "cls" if os.name == "nt" else "clear"
-
-    while True:
-        start_time = time.time()  # Start FPS timing
-        zbuffer = [0 for _ in range(screen_height * screen_width)]
-        screen_pixels = [' ' for _ in range(screen_height * screen_width)]
-        
-        phi = 0
-        while phi < 6.28:
-            phi += 0.07
-            theta = 0
-            while theta < 6.28:
-                theta += 0.02
-                sinA = sin(a)
-                cosA = cos(a)
-                cosB = cos(b)
-                sinB = sin(b)
-
-                costheta = cos(theta)
-                sintheta = sin(theta)
-                cosphi = cos(phi)
-                sinphi = sin(phi)
-
-                circlex = 2 + costheta
-                circley = sintheta
-
-                x = circlex * (cosB * cosphi + sinA * sinB * sinphi) - circley * cosA * sinB
-                y = circlex * (sinB * cosphi - sinA * cosB * sinphi) + circley * cosA * cosB
-                z = cosA * circlex * sinphi + circley * sinA + 5
-                z_inverse = 1 / z
-
-                xp = int(40 + 30 * z_inverse * x)
-                yp = int(12 - 15 * z_inverse * y)
-
-                pixel_position = xp + screen_width * yp
-
-                L = cosphi * costheta * sinB - cosA * sinphi * costheta - sinA * sintheta + cosB * (cosA * sintheta - sinphi * costheta * sinA)
-                if L > 0 and 0 <= pixel_position < len(screen_pixels):
-                    if z_inverse > zbuffer[pixel_position]:
-                        zbuffer[pixel_position] = z_inverse
-                        luminance_index = L * 8
-                        char = '.,-~:;=!*#$@'[int(luminance_index)]
-
-                        # ANSI escape code for green color
-                        color_code = "\033[38;2;0;255;0m"  # Green color in RGB
-
-                        # Assign the colored character to the screen
-                        screen_pixels[pixel_position] = f"{color_code}{char}\033[0m"
-
-        os.system(clear_command)
-        for index, char in enumerate(screen_pixels):
-            if index % screen_width == 0:
-                print()
-            else:
-                print(char, end='')
+import argparse
+
+import renderer
+from frame_cache import FrameCache
+from geometry_cache import torus_table
+from lod import torus_steps
+from presenter import TerminalPresenter
+from scheduler import DEFAULT_FPS, FrameScheduler
+from renderer import Diffuse, Perspective
+from transform import rotation_xz
+
+PHI_STEP = 0.07
+THETA_STEP = 0.02
+BOUND = 3  # Distance of the outermost torus points from its centre (R1 + R2 of torus_table)
+
+# Rotation speeds around the X and Z axes, per frame at 30 fps (scheduler.REFERENCE_FPS)
+SPEED_A = 0.07
+SPEED_B = 0.02
+
+# Cell for each screen code: 0 is blank, 1.. are the green luminance characters
+PALETTE = renderer.LUMINANCE_PALETTE
+
+# Light from above and behind the viewer, scaled so int(normal . LIGHT) is the
+# luminance level; samples facing away from it are not drawn
+LIGHTING = Diffuse((0, 8, -8), skip_unlit=True)
+
+# Function to compute the rotation angles (a, b) `time` frames into the
+# animation; depends on nothing else, so any frame can be rendered on its own
+def pose_at(time):
+    return SPEED_A * time, SPEED_B * time
+
+# Function to set up the rotation, projection and lighting of one torus frame
+def torus_frame(a, b, screen_width, screen_height):
+    # Projection centre and scale follow the terminal size (scale 30/15 at 80x24),
+    # with the torus 5 units in front of the viewer
+    projection = Perspective(screen_height * 5 / 8, 5, x_scale=screen_width * 3 / (screen_height * 5))
+    return rotation_xz(a, b), projection, LIGHTING
+
+# Function to pick the torus sample steps: the fixed ones, or with lod the ones
+# that match the size of the torus on screen
+def sample_steps(projection, lod=False):
+    return torus_steps(projection) if lod else (PHI_STEP, THETA_STEP)
 
-        a += 0.07
-        b += 0.02
+# Function to rasterize one frame of the torus into flat char and color planes
+def render_frame(a, b, screen_width=80, screen_height=24, lod=False):
+    rotation, projection, lighting = torus_frame(a, b, screen_width, screen_height)
+    table = torus_table(*sample_steps(projection, lod))
+    return renderer.render(table, rotation, projection, lighting, PALETTE, screen_width, screen_height, radius=BOUND)
+
+# Function to rasterize one frame of the torus as a triangle mesh; lod has no
+# effect, the cost already follows the number of cells covered
+def render_mesh_frame(a, b, screen_width=80, screen_height=24, lod=False):
+    # Imported lazily, so the other engines start without building the mesh code
+    import rasterizer
+    from mesh import torus_mesh
+    frame = torus_frame(a, b, screen_width, screen_height)
+    return rasterizer.render_mesh(torus_mesh(), *frame, PALETTE, screen_width, screen_height, radius=BOUND)
+
+# Function to ray-cast one frame of the torus, one ray per cell (needs NumPy);
+# lod has no effect, the cost already follows the number of cells
+def render_raycast_frame(a, b, screen_width=80, screen_height=24, lod=False):
+    import raycast  # Imported lazily so the other engines work without NumPy installed
+    frame = torus_frame(a, b, screen_width, screen_height)
+    return raycast.render(raycast.Torus(), *frame, PALETTE, screen_width, screen_height)
+
+def main(engine="python", screen_width=80, screen_height=24, processes=None, presenter=None, lod=False, cache_mb=0, fps=DEFAULT_FPS):
+    pool = None
+    if engine == "numpy":
+        # Imported lazily so the pure-Python path works without NumPy installed
+        import donut_numpy
+        render = donut_numpy.render_frame
+    elif engine == "parallel":
+        # Parts of the sample table rendered by a persistent process pool
+        from parallel import ParallelRenderer
+        projection = torus_frame(0, 0, screen_width, screen_height)[1]
+        pool = ParallelRenderer(torus_table, sample_steps(projection, lod), PALETTE, screen_width, screen_height, processes=processes)
+
+        def render(a, b, screen_width, screen_height, lod=False):
+            rotation, projection, lighting = torus_frame(a, b, screen_width, screen_height)
+            return pool.render(rotation, projection, lighting, sample_steps(projection, lod), radius=BOUND)
+    elif engine == "mesh":
+        render = render_mesh_frame
+    elif engine == "raycast":
+        render = render_raycast_frame
+    else:
+        render = render_frame
+
+    # Optionally keep finished frames by pose, so a warm loop only looks them up
+    cache = FrameCache(int(cache_mb * 1048576)) if cache_mb else None
+
+    if presenter is None:
+        presenter = TerminalPresenter(screen_width, screen_height)
+    scheduler = FrameScheduler(fps)
+
+    try:
+        while True:
+            a, b = pose_at(scheduler.time)
+            if cache is not None:
+                screen_chars, screen_colors = cache.frame(cache.key(a, b), lambda: render(a, b, screen_width, screen_height, lod=lod))
+                presenter.present(screen_chars, screen_colors, f"{scheduler.status()}  {cache.stats()}")
+            else:
+                screen_chars, screen_colors = render(a, b, screen_width, screen_height, lod=lod)
+                presenter.present(screen_chars, screen_colors, scheduler.status())
 
-        # Calculate FPS
-        elapsed_time = time.time() - start_time
-        fps = 1 / elapsed_time
-        print(f"\nFPS: {fps:.2f}")
-        
-        # Add a small delay to stabilize frame rate
-        time.sleep(0.03)
+            # Sleep for the rest of the frame; the scheduler's clock moves on by the time that passed
+            scheduler.wait()
+    finally:
+        presenter.close()
+        if pool is not None:
+            pool.close()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Spinning ASCII torus")
+    parser.add_argument("--engine", choices=("python", "numpy", "parallel", "mesh", "raycast"), default="python")
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=24)
+    parser.add_argument("--processes", type=int, help="worker processes for --engine parallel (default: one per CPU)")
+    parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the torus on screen")
+    parser.add_argument("--cache-mb", type=float, default=0, help="reuse frames of recurring poses, keeping up to this many MB (0: off)")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="target frame rate; the animation speed does not depend on it")
+    args = parser.parse_args()
+    main(args.engine, args.width, args.height, args.processes, lod=args.lod, cache_mb=args.cache_mb, fps=args.fps)
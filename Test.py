@@ -1,195 +1,137 @@
+import argparse
 import math
-import os
-import time
-import colorsys
-from math import sin, cos, sqrt
 
-# Global rotation angles (for rotating the cube)
-A, B, C = 0, 0, 0
+import renderer
+from frame_cache import FrameCache
+from geometry_cache import ALL_FACES, cube_table
+from lod import cube_step
+from presenter import TerminalPresenter
+from scheduler import DEFAULT_FPS, FrameScheduler
+from renderer import LightOrbit, Perspective, ShadedLights
+from shading import shading_table
+from transform import rotation_matrix
+from transform import calculate_x, calculate_y, calculate_z, dot_product, normalize  # noqa: F401 (kept importable from here)
+
+rotate_speed = 0.05  # Rotation of the cube per frame at 30 fps (scheduler.REFERENCE_FPS)
 cubesize = 10  # Size of the cube
+sample_step = 0.6  # Spacing of the surface lattice
+# cube_table arguments: rounded normals, so the lighting varies smoothly over the faces
+lattice_args = (cubesize, sample_step, True, ALL_FACES)
+cull_faces = True  # Only draw the faces turned towards the viewer
+lod = False  # Pick the lattice step from the size of the cube on screen
+cache_mb = 0  # Memory for frames of recurring poses and lights, in MB (0: no cache)
+target_fps = DEFAULT_FPS  # Frame rate the loop is paced at
+engine = "splat"  # "raycast": one ray per screen cell instead of the lattice (needs NumPy)
 screen_width = 80  # Width of the terminal screen
 screen_height = 30  # Height of the terminal screen
 K2 = 40  # Depth scaling factor
 K1 = 25  # Projection scaling factor
+projection = Perspective(K1, K2)
 
 # Light configuration
-light_radius = 30  # Radius of light's orbit around the cube
 light_intensity = 3.5  # Intensity of the light (brightness)
-
-# Primary light source direction (initial direction pointing towards the viewer)
-light_direction1 = (0, 0, -1)  
-light_theta1 = 0  # Azimuthal angle for the first light
-light_phi1 = math.pi / 4  # Polar angle for the first light (start from 45 degrees)
-
-# Secondary light source direction (initial direction for the second light)
-light_direction2 = (0, -1, 0)  
-light_theta2 = 0  # Azimuthal angle for the second light
-light_phi2 = math.pi / 3  # Polar angle for the second light
-
-# Function to normalize a 3D vector (make its length equal to 1)
-def normalize(vector):
-    """Normalize a 3D vector."""
-    length = sqrt(sum(i * i for i in vector))  # Calculate vector length
-    return (vector[0] / length, vector[1] / length, vector[2] / length)  # Normalize each component
-
-# Function to calculate the dot product of two 3D vectors
-def dot_product(v1, v2):
-    """Compute dot product of two 3D vectors."""
-    return v1[0] * v2[0] + v1[1] * v2[1] + v1[2] * v2[2]
-
-# Function to subtract two vectors
-def vector_subtract(v1, v2):
-    """Subtract two vectors."""
-    return (v1[0] - v2[0], v1[1] - v2[1], v1[2] - v2[2])
+min_light_intensity = 0.3  # Minimum intensity to avoid dark colors
+
+# Quantized intensity -> (glyph, color) table for the green HSV shading
+shading_levels = 256  # Number of intensity levels in the table
+shading = shading_table(hue=0.33, levels=shading_levels)
+palette = shading.palette()  # Screen code n + 1 is shading level n
+
+# Primary light source: orbits the cube, its polar angle kept within 45° to 135°;
+# the secondary light is always opposite it
+light_orbit = LightOrbit(0, math.pi / 4, math.pi / 4, 3 * math.pi / 4, delta_theta=0.05, delta_phi=0.015, wobble_rate=0.5)
+
+# Function to compute the animation state `time` frames into the animation:
+# the rotation angles (A, B, C) and the two light directions. It depends on
+# nothing else, so any frame can be rendered on its own
+def pose_at(time):
+    light_direction1 = light_orbit.at(time)
+    light_direction2 = (-light_direction1[0], -light_direction1[1], -light_direction1[2])
+    return rotate_speed * time, 0, rotate_speed * time, light_direction1, light_direction2
+
+# Function to set up the rotation, projection and lighting of the frame at `time`
+def cube_frame(time):
+    A, B, C, light_direction1, light_direction2 = pose_at(time)
+    lighting = ShadedLights((light_direction1, light_direction2), light_intensity, shading, min_light_intensity)
+    return rotation_matrix(A, B, C), projection, lighting
+
+# Function to pick the cube_table arguments of a frame: the fixed step or, with
+# lod, the one for the size on screen, leaving out the faces turned away from
+# the viewer when culling (the settings are passed in, so the benchmark can
+# choose them without touching this module's globals)
+def frame_lattice(rotation, cull_faces, lod):
+    step = cube_step(projection, cubesize) if lod else sample_step
+    faces = renderer.visible_cube_faces(rotation, projection, cubesize) if cull_faces else ALL_FACES
+    return cubesize, step, True, faces
+
+# Function to render the cube at `time` into char and color planes
+def rasterize_frame(time):
+    rotation, projection, lighting = cube_frame(time)
+    if engine == "raycast":
+        import raycast  # Imported lazily so the lattice works without NumPy installed
+        shape = raycast.Cube(cubesize, smooth_normals=True)
+        return raycast.render(shape, rotation, projection, lighting, palette, screen_width, screen_height)
+    table = cube_table(*frame_lattice(rotation, cull_faces, lod))
+    return renderer.render(table, rotation, projection, lighting, palette, screen_width, screen_height,
+                           radius=cubesize * math.sqrt(3))
 
 # Main function to run the program
-def main():
-    clear_command = "cls" if os.name == "nt" else "clear"  # Command to clear screen based on OS
-
-    while True:
-        # Reset buffers (z-buffer for depth and screen buffer for pixel data)
-        zbuffer = [-float('inf')] * (screen_width * screen_height)
-        screen_pixels = [' '] * (screen_width * screen_height)
-
-        # Loop through the surfaces of the cube and apply lighting calculations
-        cubeX = -cubesize
-        while cubeX < cubesize:
-            cubeX += 0.6
-            cubeY = -cubesize
-            while cubeY < cubesize:
-                cubeY += 0.6
-                # Render all six cube faces
-                calculate_surface(cubeX, cubeY, -cubesize, zbuffer, screen_pixels)  # Front face
-                calculate_surface(cubesize, cubeY, cubeX, zbuffer, screen_pixels)  # Back face
-                calculate_surface(-cubesize, cubeY, -cubeX, zbuffer, screen_pixels)  # Left face
-                calculate_surface(-cubeX, cubeY, cubesize, zbuffer, screen_pixels)  # Right face
-                calculate_surface(cubeX, -cubesize, -cubeY, zbuffer, screen_pixels)  # Bottom face
-                calculate_surface(cubeX, cubesize, cubeY, zbuffer, screen_pixels)  # Top face
-
-        # Clear the terminal and render the frame
-        os.system(clear_command)
-        for i in range(screen_height):
-            row = "".join(screen_pixels[i * screen_width:(i + 1) * screen_width])
-            print(row)
-
-        # Increment rotation angles for continuous rotation
-        global A, C
-        A += 0.05
-        C += 0.05
-
-        # Update light positions for dynamic lighting effects
-        update_light_direction(0.1, 0.05)
-
-        time.sleep(0.03)  # Slow down the loop for visual smoothness
-
-# Function to calculate the surface and its lighting on the cube
-def calculate_surface(cubeX, cubeY, cubeZ, zbuffer, screen_pixels):
-    """Calculate projection and render points on a surface."""
-    world_x = calculate_x(cubeX, cubeY, cubeZ)
-    world_y = calculate_y(cubeX, cubeY, cubeZ)
-    world_z = calculate_z(cubeX, cubeY, cubeZ)
-
-    # Compute the vector from the surface to the light sources (normal vector)
-    surface_normal = normalize((cubeX, cubeY, cubeZ))
-
-    distance1 = sqrt(light_direction1[0]**2 + light_direction1[1]**2 + light_direction1[2]**2)
-    distance2 = sqrt(light_direction2[0]**2 + light_direction2[1]**2 + light_direction2[2]**2)
-
-    attenuation1 = 1 / (1 + distance1**2)
-    attenuation2 = 1 / (1 + distance2**2)
-
-    # Modify light intensity factors to include attenuation
-    light_intensity_factor1 = max(0, dot_product(surface_normal, normalize(light_direction1))) * light_intensity * attenuation1
-    light_intensity_factor2 = max(0, dot_product(surface_normal, normalize(light_direction2))) * light_intensity * attenuation2
-
-    # Combine the light intensities from both light sources
-    light_intensity_factor = (light_intensity_factor1 + light_intensity_factor2) / 2
-
-    # Project the 3D coordinates onto 2D screen space (perspective projection)
-    z = world_z + K2  # Add depth offset
-    ooz = 1 / z  # Inverse of z for perspective
-    xp = int(screen_width / 2 + K1 * ooz * world_x * 2)  # Horizontal projection
-    yp = int(screen_height / 2 - K1 * ooz * world_y)  # Vertical projection
-
-    # Check if the projected pixel is within screen boundaries
-    if 0 <= xp < screen_width and 0 <= yp < screen_height:
-        pixel_position = xp + yp * screen_width
-        if ooz > zbuffer[pixel_position]:  # Update z-buffer if closer to the camera
-            zbuffer[pixel_position] = ooz
-
-            # Apply a minimum brightness to avoid dark colors
-            light_intensity_factor = max(0.3, light_intensity_factor)  # Minimum intensity to avoid darkness
-
-            # Convert intensity to green (using colorsys)
-            green_intensity = min(1, light_intensity_factor)  # Cap the intensity at 1
-            r, g, b = colorsys.hsv_to_rgb(0.33, 1.0, green_intensity)  # Green hue in HSV (0.33)
-
-            # Apply light intensity to turn the green color towards white
-            r = min(1, r + light_intensity_factor * 0.3)
-            g = min(1, g + light_intensity_factor * 0.3)
-            b = min(1, b + light_intensity_factor * 0.3)
-
-            # Convert back to ANSI RGB color codes
-            r, g, b = int(r * 255), int(g * 255), int(b * 255)
-
-            # ANSI escape code for the calculated color
-            color_code = f"\033[38;2;{r};{g};{b}m"
-
-            # Assign the colored character to the screen
-            luminance_chars = ".,-~:;=!*#$@"  # Set of characters representing brightness levels
-            char_index = int(light_intensity_factor * (len(luminance_chars) - 1))
-            screen_pixels[pixel_position] = f"{color_code}{luminance_chars[min(char_index, len(luminance_chars) - 1)]}\033[0m"
-
-# Functions to calculate the x, y, z coordinates of the cube surfaces after rotation
-def calculate_x(i, j, k):
-    global A, B, C
-    return (j * sin(A) * sin(B) * cos(C)) - (k * cos(A) * sin(B) * cos(C)) + \
-           (j * cos(A) * sin(C)) + (k * sin(A) * sin(C)) + (i * cos(B) * cos(C))
-
-def calculate_y(i, j, k):
-    global A, B, C
-    return (j * cos(A) * cos(C)) + (k * sin(A) * cos(C)) - \
-           (j * sin(A) * sin(B) * sin(C)) + (k * cos(A) * sin(B) * sin(C)) - \
-           (i * cos(B) * sin(C))
-
-def calculate_z(i, j, k):
-    global A, B, C
-    return (k * cos(A) * cos(B)) - ((j * sin(A) * cos(B)) + (i * sin(B)))
-
-# Function to update light directions to simulate rotation around the cube
-def update_light_direction(delta_theta, delta_phi):
-    """Update light direction for two light sources to simulate smooth spherical orbits."""
-    global light_direction1, light_theta1, light_phi1, light_direction2, light_theta2, light_phi2
-
-    # Update first light source
-    light_theta1 += delta_theta * 0.5
-    light_phi1 += delta_phi * 0.3
-    light_phi1 += 0.2 * math.sin(light_theta1 * 0.5)
-    light_phi1 = max(math.pi/4, min(light_phi1, 3*math.pi/4))  # Keep within 45° to 135° range
-    
-    # Update second light source with inverse direction
-    light_theta2 += delta_theta * 0.4
-    light_phi2 += delta_phi * 0.25
-    light_phi2 += 0.2 * math.sin(light_theta2 * 0.5)
-    light_phi2 = max(math.pi/4, min(light_phi2, 3*math.pi/4))  # Keep within 45° to 135° range
-
-    # Calculate the actual radii for the light sources
-    actual_radius = light_radius * (1 + 0.1 * math.sin(light_theta1))*1.5
-
-    # Calculate the 3D positions of the lights
-    x1 = actual_radius * math.sin(light_phi1) * math.cos(light_theta1)
-    y1 = actual_radius * math.sin(light_phi1) * math.sin(light_theta1)
-    z1 = actual_radius * math.cos(light_phi1)
-    
-    # The second light is positioned exactly opposite to the first
-    x2 = -x1
-    y2 = -y1
-    z2 = -z1
-
-    # Normalize the light directions and set them
-    light_direction1 = normalize((x1, y1, z1))
-    light_direction2 = normalize((x2, y2, z2))
+def main(processes=0, presenter=None):
+    if presenter is None:
+        presenter = TerminalPresenter(screen_width, screen_height)  # Redraws only the cells that changed
+
+    # Optionally render parts of the sample lattice in a process pool
+    pool = None
+    if processes and engine == "splat":
+        from parallel import ParallelRenderer
+        pool = ParallelRenderer(cube_table, lattice_args, palette, screen_width, screen_height, processes=processes)
+
+    # Optionally keep finished frames by pose and light directions
+    cache = FrameCache(int(cache_mb * 1048576)) if cache_mb else None
+
+    # Function to render the frame at `time`
+    def render(time):
+        if pool is not None:
+            rotation, projection, lighting = cube_frame(time)
+            return pool.render(rotation, projection, lighting, frame_lattice(rotation, cull_faces, lod), radius=cubesize * math.sqrt(3))
+        return rasterize_frame(time)
+
+    scheduler = FrameScheduler(target_fps)
+
+    try:
+        while True:
+            # Draw the frame for the current animation time to the terminal
+            time = scheduler.time
+            if cache is not None:
+                A, B, C, light_direction1, light_direction2 = pose_at(time)
+                key = cache.key(A, B, C) + cache.quantize(light_direction1 + light_direction2)
+                screen_chars, screen_colors = cache.frame(key, lambda: render(time))
+            else:
+                screen_chars, screen_colors = render(time)
+            presenter.present(screen_chars, screen_colors, scheduler.status())
+
+            # Wait for the next frame; the scheduler's clock moves on by the time that passed
+            scheduler.wait()
+    finally:
+        presenter.close()
+        if pool is not None:
+            pool.close()
 
 # Run the main program
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=("splat", "raycast"), default=engine,
+                        help="draw the sample lattice, or cast one ray per cell (needs NumPy)")
+    parser.add_argument("--processes", type=int, default=0, help="render in a pool of this many processes (0: single process)")
+    parser.add_argument("--cull", action=argparse.BooleanOptionalAction, default=cull_faces,
+                        help="skip the faces turned away from the viewer (--no-cull draws all six)")
+    parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the cube on screen")
+    parser.add_argument("--cache-mb", type=float, default=0, help="reuse frames of recurring poses, keeping up to this many MB (0: off)")
+    parser.add_argument("--fps", type=float, default=target_fps, help="target frame rate; the animation speed does not depend on it")
+    args = parser.parse_args()
+    cull_faces = args.cull
+    lod = args.lod
+    cache_mb = args.cache_mb
+    target_fps = args.fps
+    engine = args.engine
+    main(args.processes)
@@ -1,141 +1,127 @@
+import argparse
 import math
-import os
-import time
-import colorsys
-from math import sin, cos, sqrt
 
-# Global rotation angles
-A, B, C = 0, 0, 0
+import renderer
+from frame_cache import FrameCache
+from geometry_cache import ALL_FACES, cube_table
+from lod import cube_step
+from presenter import TerminalPresenter
+from scheduler import DEFAULT_FPS, FrameScheduler
+from renderer import LightOrbit, Perspective, ShadedLights
+from shading import shading_table
+from transform import rotation_matrix
+from transform import calculate_x, calculate_y, calculate_z, dot_product, normalize  # noqa: F401 (kept importable from here)
+
+rotate_speed = 0.05  # Rotation of the cube per frame at 30 fps (scheduler.REFERENCE_FPS)
 cubesize = 10
+sample_step = 1
+lattice_args = (cubesize, sample_step, True, ALL_FACES)  # cube_table arguments, with rounded normals
+# Culling stays off here: with a step of 1 the front faces are sampled more
+# sparsely than the screen cells, and the back faces fill the gaps (--lod
+# samples densely enough to cull)
+cull_faces = False
+lod = False  # Pick the lattice step from the size of the cube on screen
+cache_mb = 0  # Memory for frames of recurring poses and lights, in MB (0: no cache)
+target_fps = DEFAULT_FPS  # Frame rate the loop is paced at
+engine = "splat"  # "raycast": one ray per screen cell instead of the lattice (needs NumPy)
 screen_width = 80
 screen_height = 30
 K2 = 40
 K1 = 25
+projection = Perspective(K1, K2)
 
 # Light settings
-light_radius = 30
 light_intensity = 3.5
-light_theta1, light_phi1 = 0, math.pi / 4
-light_theta2, light_phi2 = 0, math.pi / 3
-
-def normalize(vector):
-    length = sqrt(sum(i * i for i in vector))
-    return (vector[0] / length, vector[1] / length, vector[2] / length)
-
-def dot_product(v1, v2):
-    return v1[0] * v2[0] + v1[1] * v2[1] + v1[2] * v2[2]
-
-def update_light_direction(delta_theta, delta_phi):
-    global light_theta1, light_phi1, light_theta2, light_phi2
-
-    light_theta1 += delta_theta
-    light_phi1 += 0.2 * math.sin(light_theta1)
-    light_phi1 = max(math.pi / 6, min(light_phi1, 5 * math.pi / 6))
-
-    light_theta2 -= delta_theta
-    light_phi2 -= 0.2 * math.sin(light_theta2)
-    light_phi2 = max(math.pi / 6, min(light_phi2, 5 * math.pi / 6))
-
-    x1 = light_radius * sin(light_phi1) * cos(light_theta1)
-    y1 = light_radius * sin(light_phi1) * sin(light_theta1)
-    z1 = light_radius * cos(light_phi1)
-    x2, y2, z2 = -x1, -y1, -z1
-
-    light_direction1 = normalize((x1, y1, z1))
-    light_direction2 = normalize((x2, y2, z2))
-
-    return light_direction1, light_direction2
-
-def calculate_surface(cubeX, cubeY, cubeZ, zbuffer, screen_pixels, light_directions):
-    world_x = calculate_x(cubeX, cubeY, cubeZ)
-    world_y = calculate_y(cubeX, cubeY, cubeZ)
-    world_z = calculate_z(cubeX, cubeY, cubeZ)
-
-    surface_normal = normalize((cubeX, cubeY, cubeZ))
-    light_intensity_factor = 0
-
-    for light in light_directions:
-        distance = sqrt(sum(coord ** 2 for coord in light))
-        attenuation = 1 / (1 + distance ** 2)
-        intensity = max(0, dot_product(surface_normal, normalize(light))) * light_intensity * attenuation
-        light_intensity_factor += intensity
-
-    light_intensity_factor /= 2
-
-    # Ensure a minimum light intensity to avoid too dark colors
-    light_intensity_factor = max(0.1, light_intensity_factor)  # Prevent dark colors
-
-    z = world_z + K2
-    ooz = 1 / z
-    xp = int(screen_width / 2 + K1 * ooz * world_x * 2)
-    yp = int(screen_height / 2 - K1 * ooz * world_y)
-
-    if 0 <= xp < screen_width and 0 <= yp < screen_height:
-        pixel_position = xp + yp * screen_width
-        if ooz > zbuffer[pixel_position]:
-            zbuffer[pixel_position] = ooz
-
-            # Convert intensity to a color using HSV
-            # Here, we use green as the primary color and adjust brightness
-            hue = 0.33  # Green in HSV color space
-            saturation = 1.0
-            value = min(1, light_intensity_factor)  # Cap the intensity at 1 for full brightness
-            r, g, b = colorsys.hsv_to_rgb(hue, saturation, value)
-
-            # Adjust color to add some white light blending
-            r = min(1, r + light_intensity_factor * 0.3)
-            g = min(1, g + light_intensity_factor * 0.3)
-            b = min(1, b + light_intensity_factor * 0.3)
-
-            # Convert to ANSI RGB color codes
-            r, g, b = int(r * 255), int(g * 255), int(b * 255)
-
-            # ANSI escape code for the calculated color
-            color_code = f"\033[38;2;{r};{g};{b}m"
-
-            # Assign the colored character to the screen
-            luminance_chars = ".,-~:;=!*#$@"  # Set of characters representing brightness levels
-            char_index = int(light_intensity_factor * (len(luminance_chars) - 1))
-            screen_pixels[pixel_position] = f"{color_code}{luminance_chars[min(char_index, len(luminance_chars) - 1)]}\033[0m"
-
-def calculate_x(i, j, k):
-    return (j * sin(A) * sin(B) * cos(C)) - (k * cos(A) * sin(B) * cos(C)) + \
-           (j * cos(A) * sin(C)) + (k * sin(A) * sin(C)) + (i * cos(B) * cos(C))
-
-def calculate_y(i, j, k):
-    return (j * cos(A) * cos(C)) + (k * sin(A) * cos(C)) - \
-           (j * sin(A) * sin(B) * sin(C)) + (k * cos(A) * sin(B) * sin(C)) - \
-           (i * cos(B) * sin(C))
-
-def calculate_z(i, j, k):
-    return (k * cos(A) * cos(B)) - ((j * sin(A) * cos(B)) + (i * sin(B)))
-
-def main():
-    clear_command = "cls" if os.name == "nt" else "clear"
-    while True:
-        zbuffer = [-float('inf')] * (screen_width * screen_height)
-        screen_pixels = [' '] * (screen_width * screen_height)
-        
-        light_directions = update_light_direction(0.03, 0.02)
-        
-        for cubeX in range(-cubesize, cubesize):
-            for cubeY in range(-cubesize, cubesize):
-                for side in (-cubesize, cubesize):
-                    calculate_surface(cubeX, cubeY, side, zbuffer, screen_pixels, light_directions)
-                    calculate_surface(side, cubeY, cubeX, zbuffer, screen_pixels, light_directions)
-                    calculate_surface(cubeX, side, cubeY, zbuffer, screen_pixels, light_directions)
-
-        os.system(clear_command)
-        print("\n".join("".join(screen_pixels[i * screen_width:(i + 1) * screen_width]) for i in range(screen_height)))
-
-        global A, C
-        A += 0.05
-        C += 0.05
-
-        fps = 1 / 0.03
-        print(f"FPS: {fps:.2f}")
-
-        time.sleep(0.03)
+min_light_intensity = 0.1  # Prevent dark colors
+light_orbit = LightOrbit(0, math.pi / 4, math.pi / 6, 5 * math.pi / 6, delta_theta=0.03)
+
+# Shading lookup table (green hue), quantized to shading_levels intensity steps
+shading_levels = 256
+shading = shading_table(hue=0.33, levels=shading_levels)
+palette = shading.palette()
+
+# Returns the rotation angles and the directions of the orbiting light and of a
+# second light opposite it, `time` frames (at 30 fps) into the animation
+def pose_at(time):
+    light_direction1 = light_orbit.at(time)
+    light_direction2 = (-light_direction1[0], -light_direction1[1], -light_direction1[2])
+    return rotate_speed * time, 0, rotate_speed * time, (light_direction1, light_direction2)
+
+def cube_frame(time):
+    A, B, C, light_directions = pose_at(time)
+    lighting = ShadedLights(light_directions, light_intensity, shading, min_light_intensity)
+    return rotation_matrix(A, B, C), projection, lighting
+
+def frame_lattice(rotation, cull_faces, lod):
+    step = cube_step(projection, cubesize) if lod else sample_step
+    faces = renderer.visible_cube_faces(rotation, projection, cubesize) if cull_faces else ALL_FACES
+    return cubesize, step, True, faces
+
+def rasterize_frame(time):
+    rotation, projection, lighting = cube_frame(time)
+    if engine == "raycast":
+        import raycast
+        shape = raycast.Cube(cubesize, smooth_normals=True)
+        return raycast.render(shape, rotation, projection, lighting, palette, screen_width, screen_height)
+    table = cube_table(*frame_lattice(rotation, cull_faces, lod))
+    return renderer.render(table, rotation, projection, lighting, palette, screen_width, screen_height,
+                           radius=cubesize * math.sqrt(3))
+
+def main(processes=0, presenter=None):
+    if presenter is None:
+        presenter = TerminalPresenter(screen_width, screen_height)
+
+    # Optionally render parts of the sample lattice in a process pool
+    pool = None
+    if processes and engine == "splat":
+        from parallel import ParallelRenderer
+        pool = ParallelRenderer(cube_table, lattice_args, palette, screen_width, screen_height, processes=processes)
+
+    # Optionally keep finished frames by pose and light directions
+    cache = FrameCache(int(cache_mb * 1048576)) if cache_mb else None
+
+    # Function to render the frame at `time`
+    def render(time):
+        if pool is not None:
+            rotation, projection, lighting = cube_frame(time)
+            return pool.render(rotation, projection, lighting, frame_lattice(rotation, cull_faces, lod), radius=cubesize * math.sqrt(3))
+        return rasterize_frame(time)
+
+    scheduler = FrameScheduler(target_fps)
+
+    try:
+        while True:
+            time = scheduler.time
+            if cache is not None:
+                A, B, C, light_directions = pose_at(time)
+                key = cache.key(A, B, C) + cache.quantize(light_directions[0] + light_directions[1])
+                screen_chars, screen_colors = cache.frame(key, lambda: render(time))
+            else:
+                screen_chars, screen_colors = render(time)
+
+            presenter.present(screen_chars, screen_colors, scheduler.status())
+
+            # Wait for the next frame; the scheduler's clock moves on by the time that passed
+            scheduler.wait()
+    finally:
+        presenter.close()
+        if pool is not None:
+            pool.close()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=("splat", "raycast"), default=engine,
+                        help="draw the sample lattice, or cast one ray per cell (needs NumPy)")
+    parser.add_argument("--processes", type=int, default=0, help="render in a pool of this many processes (0: single process)")
+    parser.add_argument("--cull", action=argparse.BooleanOptionalAction, default=cull_faces,
+                        help="skip the faces turned away from the viewer (--no-cull draws all six)")
+    parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the cube on screen")
+    parser.add_argument("--cache-mb", type=float, default=0, help="reuse frames of recurring poses, keeping up to this many MB (0: off)")
+    parser.add_argument("--fps", type=float, default=target_fps, help="target frame rate; the animation speed does not depend on it")
+    args = parser.parse_args()
+    cull_faces = args.cull
+    lod = args.lod
+    cache_mb = args.cache_mb
+    target_fps = args.fps
+    engine = args.engine
+    main(args.processes)
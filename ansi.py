@@ -0,0 +1,44 @@
+"""ANSI encoding of frames kept as separate char and color planes.
+
+A frame is two flat, row-major lists of the same length: the glyph of every
+cell and the SGR color escape it is drawn with (None for uncolored cells).
+The encoder only emits a color escape when the color changes along a row and
+resets once at the end of the row, instead of wrapping every glyph.
+"""
+
+RESET = "\033[0m"
+
+def rgb(r, g, b):
+    """24-bit foreground color escape."""
+    return f"\033[38;2;{r};{g};{b}m"
+
+def encode_run(screen_chars, screen_colors, start, end):
+    """Encode cells [start, end) of one row, leaving the terminal color reset afterwards."""
+    out = []
+    current = None
+    for i in range(start, end):
+        char = screen_chars[i]
+        # Blank cells look the same in any color, so they never switch it
+        if char != ' ':
+            color = screen_colors[i]
+            if color != current:
+                out.append(color if color is not None else RESET)
+                current = color
+        out.append(char)
+    if current is not None:
+        out.append(RESET)
+    return ''.join(out)
+
+def encode_rows(screen_chars, screen_colors, screen_width, screen_height):
+    """Encode a whole frame as a list of row strings."""
+    return [encode_run(screen_chars, screen_colors, i * screen_width, (i + 1) * screen_width) for i in range(screen_height)]
+
+def planes_from_codes(screen_codes, palette):
+    """
+    Expand a plane of palette codes into char and color planes.
+
+    palette is a list of (char, color) pairs; code 0 is conventionally the blank cell.
+    """
+    glyphs = [cell[0] for cell in palette]
+    colors = [cell[1] for cell in palette]
+    return [glyphs[code] for code in screen_codes], [colors[code] for code in screen_codes]
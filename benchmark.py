@@ -0,0 +1,393 @@
+"""Headless benchmark for the renderers.
+
+Drives each renderer for N frames at a given resolution without presenting
+anything to the terminal, and reports frame-time statistics, sample
+throughput, allocated bytes per frame and how many samples were drawn for
+the cells the shape covers. Results can be written as JSON so runs can be
+compared, e.g. fixed against screen-size sample density:
+
+    python benchmark.py --frames 100 --width 80 --height 24 --json bench.json
+    python benchmark.py --width 160 --height 48 --lod
+"""
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+import profiling
+from ansi import encode_rows
+
+# Each setup function takes (screen_width, screen_height, processes, cull_faces,
+# lod) and returns (render, samples, pool), where render(frame) returns char and
+# color planes and appends the number of samples it drew (triangles for the
+# meshes, rays for the ray-cast scenes) to the list samples. A frame only
+# depends on its number (the scripts' pose_at), so frames render in any order.
+# With processes > 0 the frame is rendered by a parallel.ParallelRenderer,
+# returned as pool so it can be closed; otherwise pool is None. cull_faces only
+# matters to the cubes (None keeps each script's default); lod picks the sample
+# density from the size of the shape on screen (see lod.py).
+
+def _scene(sampler, sampler_args, palette, frame_setup, screen_width, screen_height, processes, frame_lattice=None,
+           radius=None):
+    """
+    Shared setup for the renderer-core scenes.
+
+    frame_setup(frame) returns the (rotation, projection, lighting) of a frame,
+    and frame_lattice(rotation), if given, the sampler arguments of that frame
+    instead of sampler_args. radius bounds the shape, as for renderer.render.
+    """
+    import renderer
+    samples = []
+
+    def frame_args(frame):
+        rotation, projection, lighting = frame_setup(frame)
+        args = frame_lattice(rotation) if frame_lattice is not None else sampler_args
+        samples.append(len(sampler(*args).x))
+        return args, (rotation, projection, lighting)
+
+    if processes:
+        from parallel import ParallelRenderer
+        pool = ParallelRenderer(sampler, sampler_args, palette, screen_width, screen_height, processes=processes)
+
+        def render(frame):
+            args, setup = frame_args(frame)
+            return pool.render(*setup, sampler_args=args, radius=radius)
+        return render, samples, pool
+
+    def render(frame):
+        args, setup = frame_args(frame)
+        return renderer.render(sampler(*args), *setup, palette, screen_width, screen_height, radius=radius)
+    return render, samples, None
+
+def _setup_torus(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import MyDonut
+    from geometry_cache import torus_table
+
+    def frame_setup(frame):
+        return MyDonut.torus_frame(*MyDonut.pose_at(frame), screen_width, screen_height)
+    steps = MyDonut.sample_steps(frame_setup(0)[1], lod)
+    return _scene(torus_table, steps, MyDonut.PALETTE, frame_setup, screen_width, screen_height, processes,
+                  radius=MyDonut.BOUND)
+
+def _setup_torus_numpy(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import MyDonut
+    import donut_numpy
+    from geometry_cache import torus_table
+    projection = MyDonut.torus_frame(0, 0, screen_width, screen_height)[1]
+    table_size = len(torus_table(*MyDonut.sample_steps(projection, lod)).x)
+    samples = []
+
+    def render(frame):
+        samples.append(table_size)
+        return donut_numpy.render_frame(*MyDonut.pose_at(frame), screen_width, screen_height, lod=lod)
+    return render, samples, None
+
+def _mesh_scene(mesh, palette, frame_setup, screen_width, screen_height, radius=None):
+    import rasterizer
+    from mesh import triangle_count
+    samples = []
+
+    def render(frame):
+        samples.append(triangle_count(mesh))
+        return rasterizer.render_mesh(mesh, *frame_setup(frame), palette, screen_width, screen_height, radius=radius)
+    return render, samples, None
+
+def _setup_torus_mesh(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import MyDonut
+    from mesh import torus_mesh
+
+    def frame_setup(frame):
+        return MyDonut.torus_frame(*MyDonut.pose_at(frame), screen_width, screen_height)
+    return _mesh_scene(torus_mesh(), MyDonut.PALETTE, frame_setup, screen_width, screen_height, MyDonut.BOUND)
+
+def _raycast_scene(shape, palette, frame_setup, screen_width, screen_height):
+    import raycast
+    samples = []
+
+    def render(frame):
+        samples.append(screen_width * screen_height)
+        return raycast.render(shape, *frame_setup(frame), palette, screen_width, screen_height)
+    return render, samples, None
+
+def _setup_torus_raycast(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import MyDonut
+    import raycast
+
+    def frame_setup(frame):
+        return MyDonut.torus_frame(*MyDonut.pose_at(frame), screen_width, screen_height)
+    return _raycast_scene(raycast.Torus(), MyDonut.PALETTE, frame_setup, screen_width, screen_height)
+
+def _setup_boring_sphere(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import BoringSphere
+    from geometry_cache import sphere_table
+    from lod import sphere_steps
+
+    def frame_setup(frame):
+        return BoringSphere.sphere_frame(*BoringSphere.pose_at(frame), 1.5, 1.2, 2.0, 1.0)
+    steps = sphere_steps(frame_setup(0)[1], 10) if lod else (7, 2)
+    return _scene(sphere_table, (10, *steps), BoringSphere.PALETTE, frame_setup, screen_width, screen_height, processes,
+                  radius=10)
+
+def _best_sphere_frame(frame):
+    import BestSphere
+    return BestSphere.sphere_frame(*BestSphere.pose_at(frame), 3.0, 1.5, 2.0, 1.0)
+
+def _setup_best_sphere(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import BestSphere
+    from geometry_cache import sphere_table
+    from lod import sphere_steps
+    steps = sphere_steps(_best_sphere_frame(0)[1], 12) if lod else (7, 2)
+    return _scene(sphere_table, (12, *steps), BestSphere.PALETTE, _best_sphere_frame, screen_width, screen_height, processes,
+                  radius=12)
+
+def _setup_best_sphere_mesh(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import BestSphere
+    from mesh import sphere_mesh
+    return _mesh_scene(sphere_mesh(12), BestSphere.PALETTE, _best_sphere_frame, screen_width, screen_height, 12)
+
+def _setup_best_sphere_raycast(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import BestSphere
+    import raycast
+    return _raycast_scene(raycast.Sphere(12), BestSphere.PALETTE, _best_sphere_frame, screen_width, screen_height)
+
+def _setup_mycube(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import MyCube
+    from geometry_cache import ALL_FACES, cube_table
+    from transform import rotation_matrix
+
+    if cull_faces is None:
+        cull_faces = MyCube.CULL_FACES
+
+    def frame_setup(frame):
+        return rotation_matrix(*MyCube.pose_at(frame)), MyCube.PROJECTION, MyCube.LIGHTING
+    lattice = (MyCube.CUBE_SIZE, MyCube.lattice_step(lod), False, ALL_FACES)
+    return _scene(cube_table, lattice, MyCube.PALETTE, frame_setup, screen_width, screen_height, processes,
+                  lambda rotation: MyCube.frame_lattice(rotation, cull_faces, lod), MyCube.CUBE_BOUND)
+
+def _setup_mycube_mesh(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import MyCube
+    from mesh import cube_mesh
+    from transform import rotation_matrix
+
+    def frame_setup(frame):
+        return rotation_matrix(*MyCube.pose_at(frame)), MyCube.PROJECTION, MyCube.LIGHTING
+    return _mesh_scene(cube_mesh(MyCube.CUBE_SIZE), MyCube.PALETTE, frame_setup, screen_width, screen_height,
+                       MyCube.CUBE_BOUND)
+
+def _setup_mycube_raycast(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import MyCube
+    import raycast
+    from transform import rotation_matrix
+
+    def frame_setup(frame):
+        return rotation_matrix(*MyCube.pose_at(frame)), MyCube.PROJECTION, MyCube.LIGHTING
+    return _raycast_scene(raycast.Cube(MyCube.CUBE_SIZE), MyCube.PALETTE, frame_setup, screen_width, screen_height)
+
+def _setup_test(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import Test
+    from geometry_cache import cube_table
+    if cull_faces is None:
+        cull_faces = Test.cull_faces
+
+    return _scene(cube_table, Test.lattice_args, Test.palette, Test.cube_frame, screen_width, screen_height, processes,
+                  lambda rotation: Test.frame_lattice(rotation, cull_faces, lod), Test.cubesize * math.sqrt(3))
+
+def _setup_test3(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import Test3
+    from geometry_cache import cube_table
+    if cull_faces is None:
+        cull_faces = Test3.cull_faces
+
+    return _scene(cube_table, Test3.lattice_args, Test3.palette, Test3.cube_frame, screen_width, screen_height, processes,
+                  lambda rotation: Test3.frame_lattice(rotation, cull_faces, lod), Test3.cubesize * math.sqrt(3))
+
+def _setup_test3_raycast(screen_width, screen_height, processes=0, cull_faces=None, lod=False):
+    import Test3
+    import raycast
+    return _raycast_scene(raycast.Cube(Test3.cubesize, smooth_normals=True), Test3.palette, Test3.cube_frame,
+                          screen_width, screen_height)
+
+RENDERERS = {
+    'torus': _setup_torus,
+    'torus-numpy': _setup_torus_numpy,
+    'torus-mesh': _setup_torus_mesh,
+    'torus-raycast': _setup_torus_raycast,
+    'boring-sphere': _setup_boring_sphere,
+    'best-sphere': _setup_best_sphere,
+    'best-sphere-mesh': _setup_best_sphere_mesh,
+    'best-sphere-raycast': _setup_best_sphere_raycast,
+    'mycube': _setup_mycube,
+    'mycube-mesh': _setup_mycube_mesh,
+    'mycube-raycast': _setup_mycube_raycast,
+    'test': _setup_test,
+    'test3': _setup_test3,
+    'test3-raycast': _setup_test3_raycast,
+}
+
+# Module and attribute holding the palette each scene renders with, for
+# consumers that need it up front (the header of a recording)
+SCENE_PALETTES = {
+    'torus': ('MyDonut', 'PALETTE'),
+    'torus-numpy': ('MyDonut', 'PALETTE'),
+    'torus-mesh': ('MyDonut', 'PALETTE'),
+    'torus-raycast': ('MyDonut', 'PALETTE'),
+    'boring-sphere': ('BoringSphere', 'PALETTE'),
+    'best-sphere': ('BestSphere', 'PALETTE'),
+    'best-sphere-mesh': ('BestSphere', 'PALETTE'),
+    'best-sphere-raycast': ('BestSphere', 'PALETTE'),
+    'mycube': ('MyCube', 'PALETTE'),
+    'mycube-mesh': ('MyCube', 'PALETTE'),
+    'mycube-raycast': ('MyCube', 'PALETTE'),
+    'test': ('Test', 'palette'),
+    'test3': ('Test3', 'palette'),
+    'test3-raycast': ('Test3', 'palette'),
+}
+
+def scene_palette(name):
+    """The (char, color) palette a RENDERERS scene draws with."""
+    import importlib
+    module, attribute = SCENE_PALETTES[name]
+    return getattr(importlib.import_module(module), attribute)
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+def run_renderer(name, frames, screen_width, screen_height, warmup=3, alloc_frames=10, processes=0, cull_faces=None, lod=False,
+                 profile=False):
+    """
+    Benchmark one renderer and return its statistics as a dict.
+
+    With profile, the timed frames also collect the profiling stages and
+    counters (see profiling.py), at some cost to the frame times.
+    """
+    render, samples, pool = RENDERERS[name](screen_width, screen_height, processes, cull_faces, lod)
+
+    try:
+        for frame in range(warmup):
+            render(frame)
+
+        times = []
+        covered = []
+        planes = None
+        if profile:
+            profiling.reset()
+            profiling.enable(at_exit=False)
+        try:
+            for frame in range(warmup, warmup + frames):
+                start = time.perf_counter()
+                planes = render(frame)
+                times.append(time.perf_counter() - start)
+                covered.append(sum(1 for char in planes[0] if char != ' '))
+                if profile:
+                    profiling.frame_done()
+        finally:
+            if profile:
+                profiling.disable()
+
+        # Allocation pass, kept separate because tracing slows rendering down a lot.
+        # With a pool this only sees the parent's share (dispatch and merge).
+        allocated = []
+        tracemalloc.start()
+        try:
+            for frame in range(warmup + frames, warmup + frames + alloc_frames):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                render(frame)
+                allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+    finally:
+        if pool is not None:
+            pool.close()
+
+    times.sort()
+    mean = sum(times) / len(times)
+    samples_per_frame = sum(samples[warmup:warmup + frames]) / frames
+    cells_per_frame = sum(covered) / frames
+    frame_bytes = sum(len(row.encode()) for row in encode_rows(*planes, screen_width, screen_height))
+
+    stats = {
+        'frames': frames,
+        'mean_ms': mean * 1000,
+        'p50_ms': percentile(times, 50) * 1000,
+        'p95_ms': percentile(times, 95) * 1000,
+        'p99_ms': percentile(times, 99) * 1000,
+        'min_ms': times[0] * 1000,
+        'max_ms': times[-1] * 1000,
+        'samples_per_frame': samples_per_frame,
+        'samples_per_sec': samples_per_frame / mean if mean > 0 else 0,
+        'covered_cells_per_frame': cells_per_frame,
+        'samples_per_covered_cell': samples_per_frame / cells_per_frame if cells_per_frame else 0,
+        'alloc_bytes_per_frame': sum(allocated) / len(allocated) if allocated else 0,
+        'encoded_bytes_per_frame': frame_bytes,
+    }
+    if profile:
+        stats['stage_ms_per_frame'] = {stage: profiling.times[stage] * 1000 / frames for stage in profiling.STAGES}
+        stats['counters_per_frame'] = {counter: profiling.counters[counter] / frames for counter in profiling.COUNTERS}
+        stats['profile'] = profiling.report()
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless renderer benchmark")
+    parser.add_argument("--renderers", default=','.join(name for name in RENDERERS if name != 'torus-numpy'),
+                        help="comma-separated list from: " + ', '.join(RENDERERS))
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--alloc-frames", type=int, default=10, help="frames traced for allocation stats")
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=24)
+    parser.add_argument("--processes", type=int, default=0,
+                        help="render in a pool of this many processes (0: single process; torus-numpy ignores it)")
+    parser.add_argument("--cull", action=argparse.BooleanOptionalAction,
+                        help="force culling of the cube faces turned away from the viewer on or off (default: per script)")
+    parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of each shape on screen")
+    parser.add_argument("--profile", action="store_true", help="also collect and print the time per pipeline stage (see profiling.py)")
+    parser.add_argument("--json", help="write machine-readable results to this path ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.renderers.split(',') if name.strip()]
+    for name in names:
+        if name not in RENDERERS:
+            parser.error(f"unknown renderer {name!r}")
+
+    results = {
+        'width': args.width,
+        'height': args.height,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processes': args.processes,
+        'cull_faces': args.cull,
+        'lod': args.lod,
+        'renderers': {},
+    }
+
+    print(f"{'renderer':<20} {'mean ms':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'samples/s':>12} {'alloc B/frame':>14} "
+          f"{'samples':>9} {'cells':>7} {'per cell':>9}", file=sys.stderr)
+    for name in names:
+        stats = run_renderer(name, args.frames, args.width, args.height, args.warmup, args.alloc_frames, args.processes,
+                             args.cull, args.lod, args.profile)
+        results['renderers'][name] = stats
+        print(f"{name:<20} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+              f"{stats['samples_per_sec']:>12.0f} {stats['alloc_bytes_per_frame']:>14.0f} {stats['samples_per_frame']:>9.0f} "
+              f"{stats['covered_cells_per_frame']:>7.0f} {stats['samples_per_covered_cell']:>9.1f}", file=sys.stderr)
+        if args.profile:
+            print(stats['profile'], file=sys.stderr)
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+if __name__ == "__main__":
+    main()
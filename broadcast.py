@@ -0,0 +1,208 @@
+"""Broadcasting one rendered animation to many terminal viewers.
+
+The server renders a scene once per tick, with any of the benchmark.RENDERERS
+scenes, and sends it to every connected viewer over TCP or a Unix socket.
+A frame goes out as the terminal output of a presenter.TerminalPresenter:
+cursor moves plus the runs of cells that changed since the previous tick.
+That diff is encoded once per tick, whatever the number of viewers, so both
+rendering and encoding cost the same for one viewer as for a hundred.
+
+Every viewer has a one-frame mailbox. A viewer that took the previous
+frame gets the diff. A viewer whose last frame is still unsent (its socket
+is backed up), or that just connected, has the stale frame replaced by a
+full repaint, encoded at most once per tick. A slow viewer therefore skips
+frames instead of queueing them, and never holds up the others.
+
+The stream is plain terminal output, so the viewer only copies it to its
+terminal (even `nc localhost 8765` works):
+
+    python broadcast.py serve torus --tcp 127.0.0.1:8765
+    python broadcast.py watch --tcp 127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import io
+import sys
+
+from presenter import SHOW_CURSOR, TerminalPresenter
+from scheduler import DEFAULT_FPS, FrameScheduler
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+
+class Viewer:
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = None  # Frame waiting to be sent, replaced if still unsent at the next tick
+        self.tick = None  # Tick of the frame taken last
+        self.ready = asyncio.Event()
+
+    def offer(self, tick, delta, full):
+        """Queue the frame of `tick`: the diff if this viewer is in sync, else a full repaint."""
+        if self.pending is None and self.tick == tick - 1:
+            self.pending = (tick, delta)
+        else:
+            self.pending = (tick, full())
+        self.ready.set()
+
+    async def send(self):
+        # Write frames as they are offered until the connection fails
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            self.tick, data = self.pending
+            self.pending = None
+            self.writer.write(data)
+            await self.writer.drain()
+
+class Encoder:
+    """Terminal output of a frame: the diff from the previous one, and a full repaint on request."""
+
+    def __init__(self, screen_width, screen_height):
+        self.delta_stream = io.StringIO()
+        self.full_stream = io.StringIO()
+        self.delta = TerminalPresenter(screen_width, screen_height, self.delta_stream)
+        self.full = TerminalPresenter(screen_width, screen_height, self.full_stream)
+
+    @staticmethod
+    def _take(stream):
+        data = stream.getvalue().encode('utf-8')
+        stream.seek(0)
+        stream.truncate()
+        return data
+
+    def encode(self, screen_chars, screen_colors, status):
+        """Return the diff for this frame and a function returning its full repaint."""
+        self.delta.present(screen_chars, screen_colors, status)
+        delta = self._take(self.delta_stream)
+        full = []
+
+        def full_frame():
+            # Encoded on the first viewer that needs it, then shared
+            if not full:
+                self.full.reset()
+                self.full.present(screen_chars, screen_colors, status)
+                full.append(self._take(self.full_stream))
+            return full[0]
+        return delta, full_frame
+
+class BroadcastServer:
+    def __init__(self, render, screen_width, screen_height, fps=DEFAULT_FPS):
+        self.render = render
+        self.encoder = Encoder(screen_width, screen_height)
+        self.fps = fps
+        self.viewers = set()
+        self.connected = asyncio.Event()
+
+    async def handle(self, reader, writer):
+        viewer = Viewer(writer)
+        self.viewers.add(viewer)
+        self.connected.set()
+        try:
+            await viewer.send()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            # Viewer gone, or the server shutting down
+            pass
+        finally:
+            self.viewers.discard(viewer)
+            if not self.viewers:
+                self.connected.clear()
+            writer.close()
+
+    async def broadcast(self):
+        """Render and send a frame per tick while there are viewers; idle otherwise."""
+        loop = asyncio.get_running_loop()
+        scheduler = FrameScheduler(self.fps)
+        frame = 0.0
+        tick = 0
+        while True:
+            if not self.viewers:
+                await self.connected.wait()
+                scheduler = FrameScheduler(self.fps)
+
+            # Rendering runs in a thread so the viewers keep being served meanwhile
+            screen_chars, screen_colors = await loop.run_in_executor(None, self.render, frame)
+            status = f"{scheduler.status()}  viewers: {len(self.viewers)}"
+            delta, full = self.encoder.encode(screen_chars, screen_colors, status)
+            tick += 1
+            for viewer in list(self.viewers):
+                viewer.offer(tick, delta, full)
+
+            await asyncio.sleep(max(0, scheduler.remaining()))
+            frame += scheduler.tick()
+
+def _address(args):
+    if args.unix:
+        return None, args.unix
+    host, _, port = (args.tcp or DEFAULT_ADDRESS).rpartition(':')
+    return (host or '127.0.0.1', int(port)), None
+
+async def serve(render, screen_width, screen_height, fps=DEFAULT_FPS, tcp=None, unix=None):
+    """Serve the frames of render(frame) (frame: fractional animation time) on a TCP (host, port) or a Unix socket path until cancelled."""
+    server = BroadcastServer(render, screen_width, screen_height, fps)
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle, unix)
+    else:
+        listener = await asyncio.start_server(server.handle, *tcp)
+    async with listener:
+        await server.broadcast()
+
+async def watch(tcp=None, unix=None, stream=None):
+    """Copy a broadcast to the terminal until the server goes away."""
+    if stream is None:
+        stream = sys.stdout.buffer
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(*tcp)
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            stream.write(data)
+            stream.flush()
+    finally:
+        writer.close()
+        stream.write(('\n' + SHOW_CURSOR).encode())
+        stream.flush()
+
+def main(argv=None):
+    import benchmark
+    parser = argparse.ArgumentParser(description="Broadcast a rendered animation to many terminal viewers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="render a scene and broadcast it")
+    serve_parser.add_argument("renderer", choices=list(benchmark.RENDERERS))
+    serve_parser.add_argument("--width", type=int, default=80)
+    serve_parser.add_argument("--height", type=int, default=24)
+    serve_parser.add_argument("--fps", type=float, default=DEFAULT_FPS)
+    serve_parser.add_argument("--processes", type=int, default=0, help="render in a pool of this many processes (0: single process)")
+    serve_parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the shape on screen")
+
+    watch_parser = commands.add_parser("watch", help="show a broadcast in the terminal")
+    for command in (serve_parser, watch_parser):
+        command.add_argument("--tcp", help=f"host:port to listen on or connect to (default: {DEFAULT_ADDRESS})")
+        command.add_argument("--unix", help="Unix socket path to use instead of TCP")
+    args = parser.parse_args(argv)
+    tcp, unix = _address(args)
+
+    try:
+        if args.command == "serve":
+            render, samples, pool = benchmark.RENDERERS[args.renderer](args.width, args.height, args.processes, None, args.lod)
+
+            def render_frame(frame):
+                # The benchmark scenes count samples per frame; nobody reads them here
+                samples.clear()
+                return render(frame)
+            try:
+                asyncio.run(serve(render_frame, args.width, args.height, args.fps, tcp, unix))
+            finally:
+                if pool is not None:
+                    pool.close()
+        else:
+            asyncio.run(watch(tcp, unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Vectorized NumPy backend for the torus in MyDonut.py.
+
+Runs renderer.draw_samples for the whole torus sample table at once:
+projection, lighting and the z-buffer resolve are batched array operations.
+Frames are character-identical to MyDonut.render_frame.
+"""
+import functools
+
+import numpy as np
+
+import profiling
+from framebuffer import frame_buffer
+from geometry_cache import torus_table
+from MyDonut import BOUND, PALETTE, PHI_STEP, THETA_STEP, sample_steps, torus_frame
+from transform import projection_matrix
+
+@functools.lru_cache(maxsize=None)
+def sample_grid(phi_step=PHI_STEP, theta_step=THETA_STEP):
+    """Return the torus table columns (x, y, z, nx, ny, nz) as read-only arrays."""
+    table = torus_table(phi_step, theta_step)
+    # The table's float arrays are viewed in place, not copied
+    grid = tuple(np.frombuffer(column, dtype=np.float64) for column in table[:6])
+    for array in grid:
+        array.flags.writeable = False
+    return grid
+
+def render_frame(a, b, screen_width=80, screen_height=24, framebuffer=None, lod=False):
+    """Rasterize one torus frame and return its flat char and color planes."""
+    profile = profiling.enabled
+    rotation, projection, lighting = torus_frame(a, b, screen_width, screen_height)
+    x, y, z, nx, ny, nz = sample_grid(*sample_steps(projection, lod))
+    if framebuffer is None:
+        framebuffer = frame_buffer(screen_width, screen_height)
+    framebuffer.clear(projection.screen_box(BOUND, screen_width, screen_height))
+    if profile:
+        started = profiling.clock()
+
+    # Same expressions, same evaluation order as transform.project_points
+    matrix = projection_matrix(rotation, projection.K1, projection.K2, screen_width, screen_height, projection.x_scale)
+    (m00, m01, m02, m03), (m10, m11, m12, m13), _, (m30, m31, m32, m33) = matrix
+    ooz = 1 / (m30 * x + m31 * y + m32 * z + m33)
+    xp = ((m00 * x + m01 * y + m02 * z + m03) * ooz).astype(np.int64)  # truncates like int()
+    yp = ((m10 * x + m11 * y + m12 * z + m13) * ooz).astype(np.int64)
+    if profile:
+        started = profiling.stamp('transform', started)
+
+    # ... and as renderer.Diffuse on the rotated normals
+    (r00, r01, r02), (r10, r11, r12), (r20, r21, r22) = rotation
+    lx, ly, lz = lighting.light
+    dot = ((r00 * nx + r01 * ny + r02 * nz) * lx
+           + (r10 * nx + r11 * ny + r12 * nz) * ly
+           + (r20 * nx + r21 * ny + r22 * nz) * lz)
+    if profile:
+        started = profiling.stamp('shade', started)
+
+    visible = (dot > 0) & (xp >= 0) & (xp < screen_width) & (yp >= 0) & (yp < screen_height)
+    pixel_position = (xp + yp * screen_width)[visible]
+    ooz = ooz[visible]
+    dot = dot[visible]
+
+    # Scatter-max of 1/z by pixel index, in place in the frame buffer's depth plane
+    zbuffer = np.frombuffer(framebuffer.depth, dtype=np.float64)
+    np.maximum.at(zbuffer, pixel_position, ooz)
+
+    # The scalar loop only overwrites on a strictly closer sample, so among
+    # samples tied for the maximum the earliest one wins
+    front = ooz == zbuffer[pixel_position]
+    pixels, first = np.unique(pixel_position[front], return_index=True)
+    codes = np.minimum(dot[front][first].astype(np.int64), lighting.levels - 1) + 1
+
+    np.frombuffer(framebuffer.codes, dtype=np.uint16)[pixels] = codes
+    if not profile:
+        return framebuffer.planes(PALETTE)
+
+    started = profiling.stamp('depth-test', started)
+    profiling.count('samples', len(x))
+    profiling.count('culled', len(x) - len(dot))
+    profiling.count('z-passes', len(pixels))
+    planes = framebuffer.planes(PALETTE)
+    profiling.stamp('encode', started)
+    return planes
@@ -0,0 +1,352 @@
+"""Offline export of any renderer to image sequences and animated files.
+
+Frames of a benchmark.RENDERERS scene are rendered at any resolution by a
+pool of processes. Each worker sets the scene up once and renders whole
+frames, so the pool scales with the number of frames instead of splitting
+every frame like parallel.py. At most `window` frames (by default two per
+process) are in flight at a time, so memory stays bounded however long the
+range is.
+
+Output formats, picked from the extension of the path or with --format:
+
+* ppm, png: one image per frame, every cell drawn as its glyph (FONT) in its
+  color, CELL_WIDTH x CELL_HEIGHT pixels times --scale,
+* txt, ansi (.ans): one text file per frame, the bare glyphs or the rows as
+  the terminal presenter would draw them,
+* apng: a single animated PNG of the glyph images,
+* ascr: a single recording.py recording, to replay in the terminal.
+
+The per-frame formats are written by the workers as each frame completes;
+the path is a str.format pattern with the frame number as `frame`
+(`_{frame:05d}` is added before the extension when it has none). The
+animated formats are written in frame order by the parent.
+
+Frame n is taken `n / rate` seconds into the animation, so --rate changes
+the sampling of the motion, not its speed:
+
+    python export.py torus frames/torus.png --frames 300 --width 160 --height 48 --processes 8
+    python export.py best-sphere sphere.apng --frames 120 --rate 15 --scale 2
+"""
+import argparse
+import collections
+import fractions
+import functools
+import multiprocessing
+import os
+import re
+import signal
+import struct
+import sys
+import time
+import zlib
+
+from ansi import encode_rows
+from scheduler import REFERENCE_FPS
+
+# Pixels per terminal cell (cells are about twice as tall as wide) and the
+# placement of the 5x7 glyphs in it
+CELL_WIDTH = 6
+CELL_HEIGHT = 12
+GLYPH_TOP = 3
+
+BACKGROUND = (0, 0, 0)
+DEFAULT_FOREGROUND = (204, 204, 204)  # Uncolored cells
+
+DEFAULT_RATE = 30.0
+
+# 5x7 bitmaps of the glyphs the renderers draw; any other glyph is drawn as an
+# outlined box
+FONT = {
+    '.': ('     ', '     ', '     ', '     ', '     ', ' ##  ', ' ##  '),
+    ',': ('     ', '     ', '     ', '     ', ' ##  ', '  #  ', ' #   '),
+    '-': ('     ', '     ', '     ', '#####', '     ', '     ', '     '),
+    '~': ('     ', '     ', ' #   ', '# # #', '   # ', '     ', '     '),
+    ':': ('     ', ' ##  ', ' ##  ', '     ', ' ##  ', ' ##  ', '     '),
+    ';': ('     ', ' ##  ', ' ##  ', '     ', ' ##  ', '  #  ', ' #   '),
+    '=': ('     ', '     ', '#####', '     ', '#####', '     ', '     '),
+    '!': ('  #  ', '  #  ', '  #  ', '  #  ', '  #  ', '     ', '  #  '),
+    '*': ('     ', '  #  ', '# # #', ' ### ', '# # #', '  #  ', '     '),
+    '+': ('     ', '  #  ', '  #  ', '#####', '  #  ', '  #  ', '     '),
+    '#': (' # # ', ' # # ', '#####', ' # # ', '#####', ' # # ', ' # # '),
+    '$': ('  #  ', ' ####', '# #  ', ' ### ', '  # #', '#### ', '  #  '),
+    '@': (' ### ', '#   #', '# ###', '# # #', '# ###', '#    ', ' ####'),
+}
+MISSING_GLYPH = ('#####', '#   #', '#   #', '#   #', '#   #', '#   #', '#####')
+
+SEQUENCE_FORMATS = ('ppm', 'png', 'txt', 'ansi')
+ANIMATED_FORMATS = ('apng', 'ascr')
+EXTENSIONS = {'.ppm': 'ppm', '.png': 'png', '.txt': 'txt', '.ans': 'ansi', '.apng': 'apng', '.ascr': 'ascr'}
+
+_RGB_ESCAPE = re.compile(r'\033\[38;2;(\d+);(\d+);(\d+)m')
+
+@functools.lru_cache(maxsize=None)
+def _color_rgb(color):
+    # RGB of a color escape (ansi.rgb), or the default foreground
+    match = _RGB_ESCAPE.fullmatch(color) if color is not None else None
+    return tuple(int(c) for c in match.groups()) if match else DEFAULT_FOREGROUND
+
+@functools.lru_cache(maxsize=4096)
+def _cell_rows(glyph, color, scale):
+    """The pixel rows (RGB bytes) of one cell drawing `glyph` in `color`."""
+    background = bytes(BACKGROUND) * scale
+    blank = bytes(BACKGROUND) * (CELL_WIDTH * scale)
+    if glyph == ' ':
+        return (blank,) * (CELL_HEIGHT * scale)
+
+    foreground = bytes(_color_rgb(color)) * scale
+    bitmap = FONT.get(glyph, MISSING_GLYPH)
+    rows = []
+    for y in range(CELL_HEIGHT):
+        line = y - GLYPH_TOP
+        if 0 <= line < len(bitmap):
+            pixels = [foreground if bit == '#' else background for bit in bitmap[line]]
+            row = b''.join(pixels) + background * (CELL_WIDTH - len(pixels))
+        else:
+            row = blank
+        rows.extend((row,) * scale)
+    return tuple(rows)
+
+def rasterize(screen_chars, screen_colors, screen_width, screen_height, scale=1):
+    """Draw char and color planes as an RGB image: (width, height, pixel rows as bytes)."""
+    rows = []
+    for i in range(screen_height):
+        start = i * screen_width
+        cells = [_cell_rows(screen_chars[j], screen_colors[j], scale) for j in range(start, start + screen_width)]
+        for y in range(CELL_HEIGHT * scale):
+            rows.append(b''.join(cell[y] for cell in cells))
+    return screen_width * CELL_WIDTH * scale, screen_height * CELL_HEIGHT * scale, rows
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+def _png_header(width, height):
+    # 8-bit RGB, no interlacing
+    return b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+def _scanlines(rows):
+    # Compressed image data: every row with filter type 0 (none)
+    return zlib.compress(b''.join(b'\0' + row for row in rows))
+
+# Encoders: (screen_chars, screen_colors, screen_width, screen_height, scale)
+# to what a worker hands on, the file contents for the per-frame formats
+
+def _encode_ppm(screen_chars, screen_colors, screen_width, screen_height, scale):
+    width, height, rows = rasterize(screen_chars, screen_colors, screen_width, screen_height, scale)
+    return b'P6\n%d %d\n255\n' % (width, height) + b''.join(rows)
+
+def _encode_png(screen_chars, screen_colors, screen_width, screen_height, scale):
+    width, height, rows = rasterize(screen_chars, screen_colors, screen_width, screen_height, scale)
+    return _png_header(width, height) + _png_chunk(b'IDAT', _scanlines(rows)) + _png_chunk(b'IEND', b'')
+
+def _encode_txt(screen_chars, screen_colors, screen_width, screen_height, scale):
+    rows = (''.join(screen_chars[i * screen_width:(i + 1) * screen_width]) for i in range(screen_height))
+    return ('\n'.join(rows) + '\n').encode('utf-8')
+
+def _encode_ansi(screen_chars, screen_colors, screen_width, screen_height, scale):
+    return ('\n'.join(encode_rows(screen_chars, screen_colors, screen_width, screen_height)) + '\n').encode('utf-8')
+
+def _encode_apng(screen_chars, screen_colors, screen_width, screen_height, scale):
+    # Only the compressed image data; the parent frames it with the APNG chunks
+    return _scanlines(rasterize(screen_chars, screen_colors, screen_width, screen_height, scale)[2])
+
+def _encode_ascr(screen_chars, screen_colors, screen_width, screen_height, scale):
+    return screen_chars, screen_colors
+
+ENCODERS = {
+    'ppm': _encode_ppm,
+    'png': _encode_png,
+    'txt': _encode_txt,
+    'ansi': _encode_ansi,
+    'apng': _encode_apng,
+    'ascr': _encode_ascr,
+}
+
+class AnimatedPNGWriter:
+    """Animated PNG from the compressed image data of _encode_apng, one frame at a time."""
+
+    def __init__(self, path, width, height, frames, frame_rate=DEFAULT_RATE):
+        # Frame delay in seconds as a fraction of two u16s: the nearest one
+        # to 1 / frame_rate, at most 65535 s
+        delay = (1 / fractions.Fraction(frame_rate)).limit_denominator(65535)
+        self.delay = struct.pack('>HH', min(delay.numerator, 65535), delay.denominator)
+        self.width = width
+        self.height = height
+        self.file = open(path, 'wb')
+        self.sequence = 0  # Shared by the fcTL and fdAT chunks
+        self.count = 0
+        self.file.write(_png_header(width, height))
+        self.file.write(_png_chunk(b'acTL', struct.pack('>II', frames, 0)))  # 0: loop forever
+
+    def write(self, data):
+        # Every frame covers the whole image and replaces the previous one
+        control = struct.pack('>IIIII', self.sequence, self.width, self.height, 0, 0) + self.delay + b'\0\0'
+        self.file.write(_png_chunk(b'fcTL', control))
+        self.sequence += 1
+        if self.count == 0:
+            # The first frame is the default image as well
+            self.file.write(_png_chunk(b'IDAT', data))
+        else:
+            self.file.write(_png_chunk(b'fdAT', struct.pack('>I', self.sequence) + data))
+            self.sequence += 1
+        self.count += 1
+
+    def close(self):
+        self.file.write(_png_chunk(b'IEND', b''))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# State of the current export worker (or of the parent without a pool), set up once by _init_worker
+_worker = {}
+
+def _init_worker(name, screen_width, screen_height, lod, output_format, scale, path, time_scale, interrupt=True):
+    # Ctrl-C is handled by the parent, which shuts the pool down
+    if interrupt:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import benchmark
+    render, samples, _ = benchmark.RENDERERS[name](screen_width, screen_height, 0, None, lod)
+    _worker.update(
+        render=render,
+        samples=samples,
+        encode=ENCODERS[output_format],
+        screen_width=screen_width,
+        screen_height=screen_height,
+        scale=scale,
+        path=path,
+        time_scale=time_scale,
+    )
+
+def _export_frame(frame):
+    # Render and encode one frame; a per-frame format is written here and its size returned
+    w = _worker
+    screen_chars, screen_colors = w['render'](frame * w['time_scale'])
+    w['samples'].clear()  # Sample counts are for the benchmark
+    data = w['encode'](screen_chars, screen_colors, w['screen_width'], w['screen_height'], w['scale'])
+    if w['path'] is None:
+        return data
+    with open(w['path'].format(frame=frame), 'wb') as file:
+        file.write(data)
+    return len(data)
+
+def _bounded(pool, frames, window):
+    # Results of _export_frame for the frames in order, with at most `window` frames in flight
+    pending = collections.deque()
+    for frame in frames:
+        if len(pending) >= window:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(_export_frame, (frame,)))
+    while pending:
+        yield pending.popleft().get()
+
+def output_format(path):
+    """The format for a path, from its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"cannot tell the format of {path}; pass one of {', '.join(ENCODERS)}")
+    return EXTENSIONS[extension]
+
+def sequence_pattern(path):
+    """The per-frame path pattern for a path, with a frame number added if it has no `{frame}` field."""
+    if '{' in path:
+        return path
+    root, extension = os.path.splitext(path)
+    return root + '_{frame:05d}' + extension
+
+def export(name, path, frames, screen_width, screen_height, output_format, start=0, frame_rate=DEFAULT_RATE, scale=1,
+           processes=0, window=None, lod=False):
+    """
+    Render frames [start, start + frames) of a benchmark.RENDERERS scene into `path`.
+
+    With processes > 0 the frames are rendered by that many worker processes,
+    at most `window` (default: twice the processes) at a time; otherwise in
+    this process. Returns the number of bytes written.
+    """
+    sequence = output_format in SEQUENCE_FORMATS
+    if sequence:
+        path = sequence_pattern(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    frame_numbers = range(start, start + frames)
+    initargs = (name, screen_width, screen_height, lod, output_format, scale, path if sequence else None,
+                REFERENCE_FPS / frame_rate)
+
+    pool = None
+    if processes:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=initargs)
+        results = _bounded(pool, frame_numbers, window or 2 * processes)
+    else:
+        _init_worker(*initargs, interrupt=False)
+        results = map(_export_frame, frame_numbers)
+
+    try:
+        if sequence:
+            size = sum(results)
+        elif output_format == 'apng':
+            with AnimatedPNGWriter(path, screen_width * CELL_WIDTH * scale, screen_height * CELL_HEIGHT * scale,
+                                   frames, frame_rate) as writer:
+                for data in results:
+                    writer.write(data)
+            size = os.path.getsize(path)
+        else:
+            import benchmark
+            from recording import FrameWriter
+            with FrameWriter(path, screen_width, screen_height, frame_rate, benchmark.scene_palette(name)) as writer:
+                for planes in results:
+                    writer.write(*planes)
+            size = os.path.getsize(path)
+    except BaseException:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return size
+
+def _rate(value):
+    # argparse type for --rate: a positive, finite number of frames per second
+    rate = float(value)
+    if not 0 < rate < float('inf'):
+        raise argparse.ArgumentTypeError(f"frame rate must be positive, not {value}")
+    return rate
+
+def main(argv=None):
+    import benchmark
+    parser = argparse.ArgumentParser(description="Render a scene offline into images, text frames or an animation")
+    parser.add_argument("renderer", choices=list(benchmark.RENDERERS))
+    parser.add_argument("path", help="output file; for per-frame formats a pattern with a {frame} field")
+    parser.add_argument("--format", choices=list(ENCODERS), help="output format (default: from the extension)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--start", type=int, default=0, help="first frame number")
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=24)
+    parser.add_argument("--rate", type=_rate, default=DEFAULT_RATE, help="frames per second of animation")
+    parser.add_argument("--scale", type=int, default=1, help="pixels per font pixel in the images")
+    parser.add_argument("--processes", type=int, default=0, help="render in a pool of this many processes (0: single process)")
+    parser.add_argument("--window", type=int, help="frames in flight at most (default: twice the processes)")
+    parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the shape on screen")
+    args = parser.parse_args(argv)
+
+    try:
+        fmt = args.format or output_format(args.path)
+    except ValueError as error:
+        parser.error(str(error))
+
+    started = time.perf_counter()
+    try:
+        size = export(args.renderer, args.path, args.frames, args.width, args.height, fmt, args.start, args.rate,
+                      args.scale, args.processes, args.window, args.lod)
+    except KeyboardInterrupt:
+        return
+    elapsed = time.perf_counter() - started
+    print(f"{args.frames} frames in {elapsed:.1f} s ({args.frames / max(elapsed, 1e-9):.1f} frames/s), {size} bytes",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
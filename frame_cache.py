@@ -0,0 +1,104 @@
+"""Cache of finished frames for the periodic animations.
+
+The scripts advance their angles by a fixed amount every frame, so the same
+poses come back again and again. A FrameCache keys frames by their angles
+snapped to a grid of ANGLE_STEPS steps per turn, plus whatever else the
+picture depends on (e.g. the light directions, quantized on the same grid),
+and serves a stored frame instead of rasterizing it again.
+
+A hit shows the frame rendered at the first pose that fell into the same
+grid cell, so it can be off by up to one step; at the default half a degree
+that is well below one cell for every shape here. Frames are stored encoded
+(the chars joined into one string, the colors as 16-bit indices into a
+table shared by all frames) and evicted least recently used once the
+encoded size goes over the memory budget.
+
+One cache serves one scene at one resolution: the key does not include the
+screen size, the palette or the sample density.
+"""
+import math
+import sys
+from array import array
+from collections import OrderedDict
+
+# Grid of the keys: steps per turn for angles, per unit for other values
+ANGLE_STEPS = 720
+TURN = 2 * math.pi
+
+# Default memory budget for the encoded frames, in bytes
+DEFAULT_BUDGET = 32 * 1024 * 1024
+
+# Rough per-entry overhead of the key, the entry tuple and the dict slot
+ENTRY_OVERHEAD = 256
+
+class FrameCache:
+    def __init__(self, budget=DEFAULT_BUDGET, steps=ANGLE_STEPS):
+        self.budget = budget
+        self.steps = steps
+        self.frames = OrderedDict()  # key -> (chars, color indices, size), oldest first
+        self.colors = []  # color escape (or None) of every color index
+        self.color_index = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *angles):
+        """Grid cell of a pose: every angle as a whole number of steps, wrapped to one turn."""
+        steps = self.steps
+        return tuple(round(angle % TURN * steps / TURN) % steps for angle in angles)
+
+    def quantize(self, values):
+        """Key part for values that are not angles, such as the components of a light direction."""
+        scale = self.steps / TURN
+        return tuple(round(value * scale) for value in values)
+
+    def get(self, key):
+        """The char and color planes stored for a key, or None."""
+        entry = self.frames.get(key)
+        if entry is None:
+            return None
+        self.frames.move_to_end(key)
+        chars, color_indices, _ = entry
+        colors = self.colors
+        return list(chars), [colors[index] for index in color_indices]
+
+    def put(self, key, screen_chars, screen_colors):
+        """Store a frame, evicting the least recently used ones to stay within the budget."""
+        color_index = self.color_index
+        indices = array('H')
+        for color in screen_colors:
+            index = color_index.get(color)
+            if index is None:
+                index = color_index[color] = len(self.colors)
+                self.colors.append(color)
+            indices.append(index)
+        chars = ''.join(screen_chars)
+        size = sys.getsizeof(chars) + len(indices) * indices.itemsize + ENTRY_OVERHEAD
+
+        old = self.frames.pop(key, None)
+        if old is not None:
+            self.size -= old[2]
+        if size > self.budget:
+            return
+        self.frames[key] = (chars, indices, size)
+        self.size += size
+        while self.size > self.budget:
+            _, (_, _, evicted) = self.frames.popitem(last=False)
+            self.size -= evicted
+
+    def frame(self, key, render):
+        """The frame for a key; on a miss render() draws it and it is stored."""
+        planes = self.get(key)
+        if planes is not None:
+            self.hits += 1
+            return planes
+        self.misses += 1
+        screen_chars, screen_colors = render()
+        self.put(key, screen_chars, screen_colors)
+        return screen_chars, screen_colors
+
+    def stats(self):
+        """One-line summary for a status line."""
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0
+        return f"cache {len(self.frames)} frames, {self.size / 1048576:.1f} MB, {hit_rate:.0%} hits"
@@ -0,0 +1,107 @@
+"""Preallocated per-resolution frame buffers.
+
+A FrameBuffer holds the two planes the renderers draw into: a depth plane
+of doubles ("larger is nearer", cleared to -inf) and a compact plane of
+palette codes (unsigned 16-bit, 0 is the blank cell). Both are allocated
+once per resolution and cleared in place with a bulk copy from a blank
+template, instead of building fresh Python lists every frame.
+
+The planes are typed arrays by default, but any writable buffer of the
+same format works, e.g. slices of a shared-memory block (parallel.py).
+With NumPy, np.frombuffer(buffer.depth) views the depth plane without
+copying.
+
+Dirty rectangles: a renderer that knows the screen box its shape projects
+into (see the projections' screen_box in renderer.py) passes it to
+clear(). The frame then only resets the box of the previous frame, and
+planes() only re-expands the union of the two boxes into the char and
+color planes kept from the previous frame. A small shape on a wide
+terminal costs little outside the sampler, instead of W*H cells per frame.
+"""
+import functools
+import math
+from array import array
+
+from ansi import planes_from_codes
+
+def union(box, other):
+    """Smallest box holding two (left, top, right, bottom) boxes; None (the whole screen) absorbs anything."""
+    if box is None or other is None:
+        return None
+    return min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])
+
+class FrameBuffer:
+    def __init__(self, screen_width, screen_height, depth=None, codes=None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.size = screen_width * screen_height
+
+        # Blank planes, bulk-copied over the live ones by clear()
+        self.blank_depth = array('d', [-math.inf]) * self.size
+        self.blank_codes = array('H', [0]) * self.size
+
+        self.depth = depth if depth is not None else array('d', self.blank_depth)
+        self.codes = codes if codes is not None else array('H', self.blank_codes)
+
+        self.box = None  # Cells the current frame may draw, None for the whole screen
+        self.dirty = None  # Cells whose codes may differ from the expanded planes
+        self.palette = None  # Palette of the expanded planes
+        self.chars = None
+        self.colors = None
+
+    def _reset(self, box):
+        # Copy the blank planes over the rows of the box
+        width = self.screen_width
+        left, top, right, bottom = box if box is not None else (0, 0, width, self.screen_height)
+        if left == 0 and right == width:
+            self.depth[top * width:bottom * width] = self.blank_depth[top * width:bottom * width]
+            self.codes[top * width:bottom * width] = self.blank_codes[top * width:bottom * width]
+            return
+        span = right - left
+        for row in range(top, bottom):
+            start = row * width + left
+            self.depth[start:start + span] = self.blank_depth[:span]
+            self.codes[start:start + span] = self.blank_codes[:span]
+
+    def clear(self, box=None):
+        """
+        Reset the planes in place for the next frame.
+
+        box, if given, is the (left, top, right, bottom) range of cells the
+        frame will draw, right and bottom exclusive; only the box of the
+        previous frame has to be reset then.
+        """
+        self._reset(self.box)
+        self.dirty = union(union(self.dirty, self.box), box)
+        self.box = box
+
+    def planes(self, palette):
+        """Expand the code plane into (fresh) char and color planes."""
+        if self.dirty is None or palette is not self.palette:
+            self.chars, self.colors = planes_from_codes(self.codes, palette)
+            self.palette = palette
+        else:
+            glyphs = [cell[0] for cell in palette]
+            colors = [cell[1] for cell in palette]
+            width = self.screen_width
+            left, top, right, bottom = self.dirty
+            for row in range(top, bottom):
+                start = row * width + left
+                end = row * width + right
+                codes = self.codes[start:end]
+                self.chars[start:end] = [glyphs[code] for code in codes]
+                self.colors[start:end] = [colors[code] for code in codes]
+        # Drawing more before the next clear stays within the box
+        self.dirty = self.box
+        # Copies, so the caller may keep them while the next frame is drawn
+        return list(self.chars), list(self.colors)
+
+@functools.lru_cache(maxsize=4)
+def frame_buffer(screen_width, screen_height):
+    """
+    Shared FrameBuffer for a resolution, reused by every renderer in this process.
+
+    Callers clear it before drawing and must be done with it before the next
+    frame; concurrent renderers (e.g. in threads) need their own FrameBuffer.
+    """
+    return FrameBuffer(screen_width, screen_height)
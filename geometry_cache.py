@@ -0,0 +1,245 @@
+"""Precomputed sample tables shared by the renderers.
+
+The parametric grids only depend on the shape parameters and step sizes,
+so they are built once, held in compact float arrays and reused across
+frames. Only the per-frame rotation and lighting are left to the caller.
+
+Every sampler returns a SampleTable: object-space points, unit normals and,
+for shapes made of distinct parts, a per-sample tag (the cube face).
+
+Tables are also kept on disk, so short-lived processes do not rebuild them
+on every start: a file per sampler and arguments under TABLE_CACHE_DIR
+(RENDER_CACHE_DIR in the environment; empty turns the disk cache off).
+A file holds a header (magic b'SMPT', TABLE_FORMAT_VERSION, tagged flag and
+sample count) followed by the raw little-endian float64 columns x y z nx ny
+nz and the u8 tags. It is memory-mapped on load and the columns are
+memoryviews over the map, so loading costs no parsing or copying, and
+processes using the same table share its pages. Files that do not match
+the header (an older version, a cut-short write) are rebuilt.
+"""
+import functools
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+import profiling
+
+# Number of tables kept before the least recently used one is evicted
+TABLE_CACHE_SIZE = 16
+
+# Bump whenever a sampler's output changes, so older table files are rebuilt
+TABLE_FORMAT_VERSION = 1
+TABLE_MAGIC = b'SMPT'
+TABLE_HEADER = struct.Struct('<4sHBxQ')  # 16 bytes, keeping the columns 8-byte aligned
+
+TABLE_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR')
+if TABLE_CACHE_DIR is None:
+    TABLE_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                   'ascii-shapes')
+
+# Object-space sample points, unit normals and per-sample tags (or None)
+SampleTable = namedtuple('SampleTable', 'x y z nx ny nz tags')
+
+# Outward normals of the cube faces in cube_table, indexed by tag - 1
+CUBE_FACE_NORMALS = ((0, 0, -1), (1, 0, 0), (-1, 0, 0), (0, 0, 1), (0, -1, 0), (0, 1, 0))
+ALL_FACES = (1, 2, 3, 4, 5, 6)
+
+def _new_table(tagged=False):
+    return SampleTable(array('d'), array('d'), array('d'), array('d'), array('d'), array('d'),
+                       array('B') if tagged else None)
+
+def _append(table, point, normal):
+    table.x.append(point[0])
+    table.y.append(point[1])
+    table.z.append(point[2])
+    table.nx.append(normal[0])
+    table.ny.append(normal[1])
+    table.nz.append(normal[2])
+
+def _key_part(value):
+    # File-name form of a sampler argument; tuples (the cube faces) as 1_2_3
+    if isinstance(value, tuple):
+        return '_'.join(map(str, value))
+    return repr(value)
+
+def _table_path(name, args):
+    return os.path.join(TABLE_CACHE_DIR, '-'.join([name] + [_key_part(arg) for arg in args])
+                        + f'.v{TABLE_FORMAT_VERSION}.tbl')
+
+def load_table(path):
+    """Map a table file; returns None if it is missing or does not match the header."""
+    try:
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # ValueError: empty file
+        return None
+    if len(data) < TABLE_HEADER.size:
+        return None
+    magic, version, tagged, count = TABLE_HEADER.unpack_from(data)
+    if magic != TABLE_MAGIC or version != TABLE_FORMAT_VERSION or len(data) != TABLE_HEADER.size + count * (48 + tagged):
+        return None
+
+    # The views keep the map open
+    view = memoryview(data)
+    offset = TABLE_HEADER.size
+    columns = []
+    for _ in range(6):
+        columns.append(view[offset:offset + count * 8].cast('d'))
+        offset += count * 8
+    tags = view[offset:offset + count].cast('B') if tagged else None
+    return SampleTable(*columns, tags)
+
+def save_table(path, table):
+    """Write a table file; written aside and renamed, so readers never see a partial one."""
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary, 'wb') as file:
+            file.write(TABLE_HEADER.pack(TABLE_MAGIC, TABLE_FORMAT_VERSION, table.tags is not None, len(table.x)))
+            for column in table[:6]:
+                file.write(column)
+            if table.tags is not None:
+                file.write(table.tags)
+        os.replace(temporary, path)
+    except OSError:
+        # A read-only or full disk only costs the rebuild next time
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+def _disk_cached(sampler):
+    """Decorator loading a sampler's tables from TABLE_CACHE_DIR, and saving them there when built."""
+    code = sampler.__code__
+    names = code.co_varnames[:code.co_argcount]
+    defaults = dict(zip(names[len(names) - len(sampler.__defaults__ or ()):], sampler.__defaults__ or ()))
+
+    @functools.wraps(sampler)
+    def wrapper(*args, **kwargs):
+        # The files hold native doubles, written little-endian; a call missing
+        # arguments goes straight to the sampler for its TypeError
+        missing = any(name not in kwargs and name not in defaults for name in names[len(args):])
+        if not TABLE_CACHE_DIR or sys.byteorder != 'little' or missing:
+            return sampler(*args, **kwargs)
+        # Defaults and keywords filled in, so every spelling of a call shares a file
+        args += tuple(kwargs[name] if name in kwargs else defaults[name] for name in names[len(args):])
+        path = _table_path(sampler.__name__, args)
+        table = load_table(path)
+        if table is None:
+            table = sampler(*args)
+            save_table(path, table)
+        return table
+    return wrapper
+
+# Function to list the sample angles visited by `angle += step` loops up to 6.28
+def sample_angles(step, limit=6.28):
+    angles = []
+    angle = 0
+    while angle < limit:
+        angle += step
+        angles.append(angle)
+    return angles
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+@profiling.timed('sample')
+@_disk_cached
+def torus_table(phi_step=0.07, theta_step=0.02, R1=1, R2=2):
+    """
+    Return the samples of a torus around the y axis (tube radius R1, centre radius R2).
+
+    Angles are the accumulated `angle += step` values of the original loops in MyDonut.py.
+    """
+    table = _new_table()
+    thetas = [(math.cos(theta), math.sin(theta)) for theta in sample_angles(theta_step)]
+
+    for phi in sample_angles(phi_step):
+        cosphi, sinphi = math.cos(phi), math.sin(phi)
+        for costheta, sintheta in thetas:
+            circlex = R2 + R1 * costheta
+            _append(table,
+                    (circlex * cosphi, R1 * sintheta, circlex * sinphi),
+                    (costheta * cosphi, sintheta, costheta * sinphi))
+
+    return table
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+@profiling.timed('sample')
+@_disk_cached
+def sphere_table(radius, phi_step=7, theta_step=2, phi_limit=628):
+    """
+    Return the sphere samples for range(0, phi_limit, phi_step) x range(0, 628, theta_step).
+
+    Steps are in hundredths of a radian, matching the original loops in the sphere scripts.
+    Those sweep phi over a whole turn, covering the sphere twice; a phi_limit
+    of 315 covers it once.
+    """
+    table = _new_table()
+
+    for phi in range(0, phi_limit, phi_step):
+        for theta in range(0, 628, theta_step):
+            phi_rad = phi / 100
+            theta_rad = theta / 100
+
+            # Unit sphere point, which is also its surface normal
+            ux = math.sin(phi_rad) * math.cos(theta_rad)
+            uy = math.sin(phi_rad) * math.sin(theta_rad)
+            uz = math.cos(phi_rad)
+
+            _append(table, (radius * ux, radius * uy, radius * uz), (ux, uy, uz))
+
+    return table
+
+# Large enough for every subset of visible faces (at most 26) of a lattice
+@functools.lru_cache(maxsize=64)
+@profiling.timed('sample')
+@_disk_cached
+def cube_table(size, step, smooth_normals=False, faces=ALL_FACES):
+    """
+    Return a lattice on the faces of a cube with half-width `size`.
+
+    Face coordinates run from -size in `step` increments while below size. The
+    faces are interleaved in lattice order, so with all six faces samples n::6
+    lie on the face tagged n + 1. Normals are the face normals, or with
+    smooth_normals the normalized sample positions (the rounded shading of
+    Test.py/Test3.py).
+
+    `faces` is a sorted tuple of the tags to keep whole (the faces turned
+    towards the viewer). The lattice stops short of +size, so the cube edges
+    are traced by the outer rows and columns of just one of the two faces;
+    those are kept for the other faces as well, or the silhouette would get
+    gaps. The remaining samples keep their order, so the z-buffer resolves
+    ties the same way.
+    """
+    table = _new_table(tagged=True)
+
+    coords = []
+    while -size + len(coords) * step < size:
+        coords.append(-size + len(coords) * step)
+    outer = (coords[0], coords[-1])
+
+    for u in coords:
+        for v in coords:
+            # The outer rows and columns of every face trace the cube edges
+            on_edge = u in outer or v in outer
+            lattice_faces = (
+                ((u, v, -size), (0, 0, -1)),  # Front face
+                ((size, v, u), (1, 0, 0)),  # Right face
+                ((-size, v, -u), (-1, 0, 0)),  # Left face
+                ((-u, v, size), (0, 0, 1)),  # Back face
+                ((u, -size, -v), (0, -1, 0)),  # Bottom face
+                ((u, size, v), (0, 1, 0)),  # Top face
+            )
+            for tag, (point, normal) in enumerate(lattice_faces, 1):
+                if tag not in faces and not on_edge:
+                    continue
+                if smooth_normals:
+                    length = math.sqrt(point[0] ** 2 + point[1] ** 2 + point[2] ** 2)
+                    normal = (point[0] / length, point[1] / length, point[2] / length)
+                _append(table, point, normal)
+                table.tags.append(tag)
+
+    return table
@@ -0,0 +1,45 @@
+"""Screen-space level of detail for the parametric shapes.
+
+The fixed sample steps of the shape scripts oversample a shape that is small
+on screen and leave holes in one that is large. These functions instead
+derive the steps from the projection, so that neighbouring samples land at
+most SAMPLE_SPACING cells apart where the shape is magnified the most
+(nearest to a perspective viewer, along the wider cell axis). Farther and
+foreshortened parts of the surface are sampled more densely than that, so
+every cell the shape covers gets about one sample or more.
+
+The results are plain sampler arguments for geometry_cache, rounded to a
+whole number of samples per turn or per cube edge, so a shape that keeps its
+size on screen keeps hitting the same cached table.
+"""
+import math
+
+# Largest on-screen distance between neighbouring samples, in cells
+SAMPLE_SPACING = 1.0
+
+# Angle covered by the `angle += step` loops of the torus and sphere tables
+TURN = 6.28
+
+def _angle_step(radius, cells_per_unit, spacing):
+    # Step along a circle of this radius, as a whole number of steps per turn
+    count = math.ceil(TURN * radius * cells_per_unit / spacing)
+    return TURN / max(count, 1)
+
+def torus_steps(projection, R1=1, R2=2, spacing=SAMPLE_SPACING):
+    """(phi_step, theta_step) of geometry_cache.torus_table for this projection."""
+    cells_per_unit = projection.cells_per_unit(R1 + R2)
+    return _angle_step(R1 + R2, cells_per_unit, spacing), _angle_step(R1, cells_per_unit, spacing)
+
+def sphere_steps(projection, radius, spacing=SAMPLE_SPACING):
+    """(phi_step, theta_step, phi_limit) of geometry_cache.sphere_table, in its hundredths of a radian."""
+    step = _angle_step(radius, projection.cells_per_unit(radius), spacing)
+    # Both angles sweep great circles at the equator, so they get the same
+    # step, and phi only needs half a turn to cover the sphere once
+    steps = max(1, int(step * 100))
+    return steps, steps, 315
+
+def cube_step(projection, size, spacing=SAMPLE_SPACING):
+    """Lattice step of geometry_cache.cube_table for this projection, a whole fraction of the edge."""
+    cells_per_unit = projection.cells_per_unit(size * math.sqrt(3))
+    count = math.ceil(2 * size * cells_per_unit / spacing)
+    return 2 * size / count
@@ -0,0 +1,203 @@
+"""Triangle meshes for rasterizer.py.
+
+A Mesh keeps its vertices as a geometry_cache.SampleTable (object-space
+positions, unit normals and optional tags, one entry per vertex) and its
+triangles as a flat array of vertex indices, three per triangle, wound
+counter-clockwise when seen from outside. Keeping the vertices in a
+SampleTable lets the projections and lighting models of renderer.py work on
+them unchanged.
+
+Meshes come from Wavefront OBJ files (load_obj) or from the generators for
+the shapes of the scripts: torus_mesh, sphere_mesh and cube_mesh. The
+generators are cached like the sample tables.
+"""
+import functools
+import math
+from array import array
+from collections import namedtuple
+
+import profiling
+
+from geometry_cache import CUBE_FACE_NORMALS, TABLE_CACHE_SIZE, SampleTable, _append, _new_table
+
+Mesh = namedtuple('Mesh', 'vertices indices')
+
+def triangle_count(mesh):
+    return len(mesh.indices) // 3
+
+def _add_quad(indices, a, b, c, d):
+    # Two counter-clockwise triangles for the counter-clockwise quad a, b, c, d
+    indices.extend((a, b, c, a, c, d))
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+@profiling.timed('sample')
+def torus_mesh(R1=1, R2=2, rings=48, sides=24):
+    """
+    Torus around the y axis (tube radius R1, centre radius R2), as in geometry_cache.torus_table.
+
+    `rings` vertices go around the y axis and `sides` around the tube.
+    """
+    vertices = _new_table()
+    indices = array('I')
+
+    for ring in range(rings):
+        phi = 2 * math.pi * ring / rings
+        cosphi, sinphi = math.cos(phi), math.sin(phi)
+        for side in range(sides):
+            theta = 2 * math.pi * side / sides
+            costheta, sintheta = math.cos(theta), math.sin(theta)
+            circlex = R2 + R1 * costheta
+            _append(vertices,
+                    (circlex * cosphi, R1 * sintheta, circlex * sinphi),
+                    (costheta * cosphi, sintheta, costheta * sinphi))
+
+    for ring in range(rings):
+        next_ring = (ring + 1) % rings
+        for side in range(sides):
+            next_side = (side + 1) % sides
+            _add_quad(indices,
+                      ring * sides + side, ring * sides + next_side,
+                      next_ring * sides + next_side, next_ring * sides + side)
+
+    return Mesh(vertices, indices)
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+@profiling.timed('sample')
+def sphere_mesh(radius, stacks=24, slices=48):
+    """UV sphere around the origin, poles on the z axis as in geometry_cache.sphere_table."""
+    vertices = _new_table()
+    indices = array('I')
+
+    for stack in range(stacks + 1):
+        phi = math.pi * stack / stacks
+        for piece in range(slices + 1):
+            theta = 2 * math.pi * piece / slices
+            ux = math.sin(phi) * math.cos(theta)
+            uy = math.sin(phi) * math.sin(theta)
+            uz = math.cos(phi)
+            _append(vertices, (radius * ux, radius * uy, radius * uz), (ux, uy, uz))
+
+    # The seam and the poles repeat vertices so every quad has its own corners
+    row = slices + 1
+    for stack in range(stacks):
+        for piece in range(slices):
+            top = stack * row + piece
+            _add_quad(indices, top, top + row, top + row + 1, top + 1)
+
+    return Mesh(vertices, indices)
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+@profiling.timed('sample')
+def cube_mesh(size):
+    """
+    Cube with half-width `size`: four vertices per face, tagged like geometry_cache.cube_table.
+
+    Vertices carry the face normal, so faces are shaded flat and FaceCodes
+    draws every face with its own character.
+    """
+    vertices = _new_table(tagged=True)
+    indices = array('I')
+
+    for tag, normal in enumerate(CUBE_FACE_NORMALS, 1):
+        # Two edge directions of the face, counter-clockwise around the outward normal
+        u = (normal[1], normal[2], normal[0])
+        v = (normal[1] * u[2] - normal[2] * u[1],
+             normal[2] * u[0] - normal[0] * u[2],
+             normal[0] * u[1] - normal[1] * u[0])
+        first = len(vertices.x)
+        for su, sv in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+            point = tuple(size * (normal[axis] + su * u[axis] + sv * v[axis]) for axis in range(3))
+            _append(vertices, point, normal)
+            vertices.tags.append(tag)
+        _add_quad(indices, first, first + 1, first + 2, first + 3)
+
+    return Mesh(vertices, indices)
+
+def _obj_index(token, count):
+    # OBJ indices are 1-based; negative ones count back from the last element
+    index = int(token)
+    return index - 1 if index > 0 else count + index
+
+@profiling.timed('sample')
+def load_obj(path):
+    """
+    Load the triangles of a Wavefront OBJ file.
+
+    Polygons are split into triangle fans. Vertices used with different
+    normals are split, so every vertex has one normal; files without
+    normals get smooth ones averaged from the faces around each vertex.
+    Texture coordinates, materials and groups are ignored.
+    """
+    positions = []
+    normals = []
+    corners = {}  # (position index, normal index) -> vertex index
+    vertex_keys = []
+    indices = array('I')
+
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == 'v':
+                positions.append((float(fields[1]), float(fields[2]), float(fields[3])))
+            elif fields[0] == 'vn':
+                normals.append((float(fields[1]), float(fields[2]), float(fields[3])))
+            elif fields[0] == 'f':
+                face = []
+                for corner in fields[1:]:
+                    parts = corner.split('/')
+                    key = (_obj_index(parts[0], len(positions)),
+                           _obj_index(parts[2], len(normals)) if len(parts) > 2 and parts[2] else None)
+                    if key not in corners:
+                        corners[key] = len(vertex_keys)
+                        vertex_keys.append(key)
+                    face.append(corners[key])
+                for i in range(1, len(face) - 1):
+                    indices.extend((face[0], face[i], face[i + 1]))
+
+    vertices = _new_table()
+    for position, normal in vertex_keys:
+        _append(vertices, positions[position], normals[normal] if normal is not None else (0.0, 0.0, 0.0))
+
+    # Area-weighted face normals for the vertices the file gave none
+    missing = [normal is None for _, normal in vertex_keys]
+    if any(missing):
+        x, y, z = vertices.x, vertices.y, vertices.z
+        nx, ny, nz = vertices.nx, vertices.ny, vertices.nz
+        for t in range(0, len(indices), 3):
+            a, b, c = indices[t], indices[t + 1], indices[t + 2]
+            ux, uy, uz = x[b] - x[a], y[b] - y[a], z[b] - z[a]
+            vx, vy, vz = x[c] - x[a], y[c] - y[a], z[c] - z[a]
+            fx, fy, fz = uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+            for i in (a, b, c):
+                if missing[i]:
+                    nx[i] += fx
+                    ny[i] += fy
+                    nz[i] += fz
+
+    # Unit normals throughout; degenerate ones stay zero and light nothing
+    for i in range(len(vertices.x)):
+        length = math.sqrt(vertices.nx[i] ** 2 + vertices.ny[i] ** 2 + vertices.nz[i] ** 2)
+        if length > 0:
+            vertices.nx[i] /= length
+            vertices.ny[i] /= length
+            vertices.nz[i] /= length
+
+    return Mesh(vertices, indices)
+
+def fit(mesh, radius=1.0):
+    """Copy of a mesh moved to be centred on the origin and scaled to the given bounding radius."""
+    x, y, z = mesh.vertices.x, mesh.vertices.y, mesh.vertices.z
+    cx = (min(x) + max(x)) / 2
+    cy = (min(y) + max(y)) / 2
+    cz = (min(z) + max(z)) / 2
+    extent = max(math.sqrt((x[i] - cx) ** 2 + (y[i] - cy) ** 2 + (z[i] - cz) ** 2) for i in range(len(x)))
+    scale = radius / extent if extent > 0 else 1.0
+
+    vertices = SampleTable(array('d', [(value - cx) * scale for value in x]),
+                           array('d', [(value - cy) * scale for value in y]),
+                           array('d', [(value - cz) * scale for value in z]),
+                           array('d', mesh.vertices.nx), array('d', mesh.vertices.ny), array('d', mesh.vertices.nz),
+                           array('B', mesh.vertices.tags) if mesh.vertices.tags is not None else None)
+    return Mesh(vertices, array('I', mesh.indices))
@@ -0,0 +1,205 @@
+"""Multi-core rendering with a persistent process pool.
+
+A sample table (see geometry_cache) is split into contiguous index ranges.
+Each range is rasterized by a pool worker with renderer.draw_samples
+directly into its own partial z-buffer and code plane in shared memory
+(a FrameBuffer over a slice of the block), and the parent
+merges them with a per-pixel depth max. Workers are started once, build
+the table themselves and only receive the per-frame rotation, projection
+and lighting, plus the sampler arguments when they change per frame (the
+visible faces of a cube).
+
+Depth is "larger is nearer" for every projection, and ties go to the
+earlier range, i.e. the earlier sample, so frames are identical to a
+single-process renderer.render.
+
+Given the radius of the shape, workers and merge only cover its screen box
+(the dirty rectangles of framebuffer.py), and the merged codes go into a
+FrameBuffer of the parent that re-expands only that box. With NumPy the
+merge is one masked copy per partition over the box; without it, a
+Python loop over the cells of the box that a partition drew.
+"""
+import multiprocessing
+import os
+import signal
+from array import array
+from multiprocessing import shared_memory
+
+import profiling
+from framebuffer import FrameBuffer, union
+from renderer import draw_samples
+
+try:
+    import numpy as np
+except ImportError:  # The merge falls back to plain Python
+    np = None
+
+# State of the current pool worker, set up once by _init_worker
+_worker = {}
+
+def _init_worker(shm_name, sampler, sampler_args, count, screen_width, screen_height):
+    # Ctrl-C is handled by the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    size = screen_width * screen_height
+    depth_bytes = count * size * 8
+    depth = shm.buf[:depth_bytes].cast('d')
+    codes = shm.buf[depth_bytes:depth_bytes + count * size * 2].cast('H')
+
+    # One frame buffer per partition, each over its own slot of the block
+    buffers = [FrameBuffer(screen_width, screen_height,
+                           depth[index * size:(index + 1) * size], codes[index * size:(index + 1) * size])
+               for index in range(count)]
+
+    _worker.update(
+        shm=shm,
+        buffers=buffers,
+        sampler=sampler,
+        sampler_args=sampler_args,
+        count=count,
+        screen_width=screen_width,
+        screen_height=screen_height,
+    )
+
+def _render_partition(task):
+    index, sampler_args, frame_args, previous_box, box, profile = task
+    # Workers collect their own stage timings and hand them back with the result
+    profiling.enabled = profile
+    if profile:
+        profiling.reset()
+    framebuffer = _worker['buffers'][index]
+    # The slot was last drawn by whichever worker the pool gave it to, so the
+    # box to reset comes from the parent rather than this buffer's own record
+    framebuffer.box = previous_box
+    framebuffer.clear(box)
+
+    # The samplers are cached, so this is a lookup unless the arguments are new
+    table = _worker['sampler'](*(sampler_args or _worker['sampler_args']))
+    samples = len(table.x)
+    start = samples * index // _worker['count']
+    end = samples * (index + 1) // _worker['count']
+    draw_samples(table, *frame_args, framebuffer.depth, framebuffer.codes,
+                 _worker['screen_width'], _worker['screen_height'], start, end)
+    return profiling.snapshot() if profile else None
+
+class ParallelRenderer:
+    """
+    Rasterize parts of a sample table in a pool of processes and merge the results.
+
+    sampler(*sampler_args) must return the table (a picklable top-level
+    function, normally one of the cached geometry_cache samplers). The table
+    is split into `partitions` ranges, by default one per process, each
+    frame. render() can pass other sampler arguments for a single frame.
+    """
+
+    def __init__(self, sampler, sampler_args, palette, screen_width, screen_height, partitions=None, processes=None):
+        count = partitions or processes or os.cpu_count() or 1
+        self.count = max(1, min(count, len(sampler(*sampler_args).x)))
+        self.palette = palette
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.size = screen_width * screen_height
+
+        count = self.count
+        depth_bytes = count * self.size * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=depth_bytes + count * self.size * 2)
+        self.depth = self.shm.buf[:depth_bytes].cast('d')
+        self.codes = self.shm.buf[depth_bytes:depth_bytes + count * self.size * 2].cast('H')
+
+        # The merged frame, expanded into char and color planes box by box
+        self.frame = FrameBuffer(screen_width, screen_height)
+        self.box = None  # Box the partial buffers were last drawn in, None for the whole screen
+        if np is not None:
+            self.depth_arrays = np.frombuffer(self.depth, dtype=np.float64).reshape(count, screen_height, screen_width)
+            self.code_arrays = np.frombuffer(self.codes, dtype=np.uint16).reshape(count, screen_height, screen_width)
+            self.frame_codes = np.frombuffer(self.frame.codes, dtype=np.uint16).reshape(screen_height, screen_width)
+
+        processes = processes or min(count, os.cpu_count() or 1)
+        self.pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                         initargs=(self.shm.name, sampler, sampler_args, count, screen_width, screen_height))
+
+    def render(self, rotation, projection, lighting, sampler_args=None, radius=None):
+        """
+        Render one frame and return the char and color planes.
+
+        radius bounds the shape, as for renderer.render; only its screen box is drawn and merged.
+        """
+        frame_args = (rotation, projection, lighting)
+        box = projection.screen_box(radius, self.screen_width, self.screen_height) if radius is not None else None
+        profile = profiling.enabled
+        tasks = [(index, sampler_args, frame_args, self.box, box, profile) for index in range(self.count)]
+        # Should the frame be interrupted, slots may hold either box
+        self.box = union(self.box, box)
+        collected = self.pool.map(_render_partition, tasks, chunksize=1)
+        self.box = box
+        if not profile:
+            self.merge(box)
+            return self.frame.planes(self.palette)
+
+        for worker_profile in collected:
+            profiling.merge(worker_profile)
+        started = profiling.clock()
+        self.merge(box)
+        started = profiling.stamp('depth-test', started)
+        planes = self.frame.planes(self.palette)
+        profiling.stamp('encode', started)
+        return planes
+
+    def merge(self, box=None):
+        """
+        Per-pixel depth max over the partial buffers, into the codes of self.frame.
+
+        Only the cells of box (None: the whole screen) are merged; ties go to the earlier partition.
+        """
+        self.frame.clear(box)
+        width = self.screen_width
+        left, top, right, bottom = box if box is not None else (0, 0, width, self.screen_height)
+        if left >= right or top >= bottom:
+            return
+
+        if np is not None:
+            depths = self.depth_arrays[:, top:bottom, left:right]
+            codes = self.code_arrays[:, top:bottom, left:right]
+            best_depth = depths[0].copy()
+            best_codes = codes[0].copy()
+            for index in range(1, self.count):
+                nearer = (codes[index] != 0) & (depths[index] > best_depth)
+                np.copyto(best_depth, depths[index], where=nearer)
+                np.copyto(best_codes, codes[index], where=nearer)
+            self.frame_codes[top:bottom, left:right] = best_codes
+            return
+
+        size = self.size
+        span = right - left
+        for row in range(top, bottom):
+            start = row * width + left
+            best_depth = self.depth[start:start + span].tolist()
+            best_codes = self.codes[start:start + span].tolist()
+            for index in range(1, self.count):
+                offset = index * size + start
+                depth = self.depth[offset:offset + span].tolist()
+                codes = self.codes[offset:offset + span].tolist()
+                for cell in [cell for cell, code in enumerate(codes) if code]:
+                    if depth[cell] > best_depth[cell]:
+                        best_depth[cell] = depth[cell]
+                        best_codes[cell] = codes[cell]
+            self.frame.codes[start:start + span] = array('H', best_codes)
+
+    def close(self):
+        # Outstanding partitions take milliseconds, so let them finish
+        self.pool.close()
+        self.pool.join()
+        # Views have to be released before the block can be closed
+        if np is not None:
+            del self.depth_arrays, self.code_arrays, self.frame_codes
+        self.depth.release()
+        self.codes.release()
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,164 @@
+"""Differential terminal output for the renderers.
+
+Instead of clearing the screen and reprinting every row, the presenter keeps
+the previous frame and only emits cursor moves plus the runs of cells that
+changed, all in a single buffered write per frame. Frames are given as the
+char and color planes described in ansi.py.
+
+Presenters share one interface: present(screen_chars, screen_colors, status=None)
+and close(). PrintPresenter repaints every frame in full, for terminals or
+logs where cursor addressing is not wanted.
+"""
+import sys
+
+import profiling
+from ansi import encode_rows, encode_run
+
+HIDE_CURSOR = "\033[?25l"
+SHOW_CURSOR = "\033[?25h"
+CLEAR_SCREEN = "\033[2J"
+CLEAR_TO_END_OF_LINE = "\033[K"
+
+# Below this many cells, _changed_span scans instead of halving
+SCAN_CELLS = 16
+
+def move_cursor(row, col):
+    """ANSI cursor move to a zero-based (row, col)."""
+    return f"\033[{row + 1};{col + 1}H"
+
+def _changed_span(screen_chars, screen_colors, previous_chars, previous_colors, start, end):
+    """
+    Narrow a row range known to differ to the cells from its first to its last change.
+
+    Halving with slice comparisons (done in C) finds both ends, so only the
+    span around the shape is scanned cell by cell, however wide the row.
+    """
+    # First change: [start, low) is unchanged and the change is before high
+    low, high = start, end
+    while high - low > SCAN_CELLS:
+        middle = (low + high) // 2
+        if screen_chars[low:middle] == previous_chars[low:middle] and screen_colors[low:middle] == previous_colors[low:middle]:
+            low = middle
+        else:
+            high = middle
+    while screen_chars[low] == previous_chars[low] and screen_colors[low] == previous_colors[low]:
+        low += 1
+
+    # Last change: [high, end) is unchanged and the change is at or after first
+    first, high = low, end
+    low = first
+    while high - low > SCAN_CELLS:
+        middle = (low + high) // 2
+        if screen_chars[middle:high] == previous_chars[middle:high] and screen_colors[middle:high] == previous_colors[middle:high]:
+            high = middle
+        else:
+            low = middle
+    while screen_chars[high - 1] == previous_chars[high - 1] and screen_colors[high - 1] == previous_colors[high - 1]:
+        high -= 1
+    return first, high
+
+class TerminalPresenter:
+    def __init__(self, screen_width, screen_height, stream=None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.stream = stream if stream is not None else sys.stdout
+        self.previous = None
+        self.previous_status = None
+
+    def reset(self):
+        """Forget the previous frame so the next one is fully repainted."""
+        self.previous = None
+        self.previous_status = None
+
+    def resize(self, screen_width, screen_height):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.reset()
+
+    def present(self, screen_chars, screen_colors, status=None):
+        """
+        Draw a frame given as flat char and color planes (row-major, screen_width per row).
+
+        An optional status line (e.g. the FPS counter) is drawn one line below the frame.
+        """
+        profile = profiling.enabled
+        if profile:
+            started = profiling.clock()
+        width = self.screen_width
+        out = []
+
+        if self.previous is None:
+            out.append(HIDE_CURSOR + CLEAR_SCREEN)
+            previous_chars = [None] * len(screen_chars)
+            previous_colors = [None] * len(screen_colors)
+        else:
+            previous_chars, previous_colors = self.previous
+
+        for row in range(self.screen_height):
+            start = row * width
+            end = start + width
+            # Cheap whole-row comparison before looking at individual cells
+            if screen_chars[start:end] == previous_chars[start:end] and screen_colors[start:end] == previous_colors[start:end]:
+                continue
+
+            i, end = _changed_span(screen_chars, screen_colors, previous_chars, previous_colors, start, end)
+            while i < end:
+                if screen_chars[i] == previous_chars[i] and screen_colors[i] == previous_colors[i]:
+                    i += 1
+                    continue
+                run_start = i
+                while i < end and (screen_chars[i] != previous_chars[i] or screen_colors[i] != previous_colors[i]):
+                    i += 1
+                out.append(move_cursor(row, run_start - start))
+                out.append(encode_run(screen_chars, screen_colors, run_start, i))
+
+        if status is not None and status != self.previous_status:
+            out.append(move_cursor(self.screen_height + 1, 0) + status + CLEAR_TO_END_OF_LINE)
+            self.previous_status = status
+
+        # Copy, since callers are free to reuse their buffers for the next frame
+        self.previous = (list(screen_chars), list(screen_colors))
+
+        if profile:
+            started = profiling.stamp('encode', started)
+        if out:
+            data = ''.join(out)
+            self.stream.write(data)
+            self.stream.flush()
+            if profile:
+                profiling.count('bytes', len(data.encode('utf-8')))
+        if profile:
+            profiling.stamp('present', started)
+            profiling.frame_done()
+
+    def close(self):
+        """Park the cursor below the frame and make it visible again."""
+        self.stream.write(move_cursor(self.screen_height + 2, 0) + SHOW_CURSOR)
+        self.stream.flush()
+
+class PrintPresenter:
+    def __init__(self, screen_width, screen_height, stream=None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.stream = stream if stream is not None else sys.stdout
+
+    def present(self, screen_chars, screen_colors, status=None):
+        """Clear the screen and print every row of the frame, then the status line."""
+        profile = profiling.enabled
+        if profile:
+            started = profiling.clock()
+        rows = encode_rows(screen_chars, screen_colors, self.screen_width, self.screen_height)
+        if status is not None:
+            rows += ['', status]
+        data = CLEAR_SCREEN + move_cursor(0, 0) + '\n'.join(rows) + '\n'
+        if profile:
+            started = profiling.stamp('encode', started)
+        self.stream.write(data)
+        self.stream.flush()
+        if profile:
+            profiling.stamp('present', started)
+            profiling.count('bytes', len(data.encode('utf-8')))
+            profiling.frame_done()
+
+    def close(self):
+        self.stream.flush()
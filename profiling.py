@@ -0,0 +1,155 @@
+"""Per-stage timings and counters for the rendering pipeline.
+
+Every renderer reports the time it spends in the named STAGES and bumps the
+COUNTERS below. Collection is off by default: the hot paths only test
+`profiling.enabled` once per batch of samples, so a disabled profiler costs
+next to nothing. Turn it on with enable(), or for any script by setting the
+RENDER_PROFILE environment variable to a dump interval in seconds (anything but
+a positive number, e.g. 0, dumps only at exit):
+
+    RENDER_PROFILE=5 python MyDonut.py
+
+Stages:
+
+* sample: building sample tables and meshes, or mapping them from the disk
+  cache (an in-memory cache hit costs nothing),
+* transform: rotating and projecting points to screen cells,
+* shade: lighting, i.e. turning normals into palette codes,
+* depth-test: the z-buffer (and merging the partial buffers of parallel.py),
+* encode: expanding codes into char and color planes and building the ANSI
+  output,
+* present: writing to the terminal.
+
+Parallel workers time their own stages and send them back with their
+results, so with parallel.py the stage times add up CPU time over the
+processes and can exceed the wall-clock time of a frame.
+"""
+import atexit
+import functools
+import math
+import os
+import sys
+import time
+
+STAGES = ('sample', 'transform', 'shade', 'depth-test', 'encode', 'present')
+
+# samples: samples (or mesh triangles, or rays) entering the pipeline;
+# culled: those the lighting or back-face culling leaves out (the NumPy torus
+# also counts samples off screen, ray casting the rays that draw nothing);
+# z-passes: z-buffer writes; bytes: bytes written to the terminal
+COUNTERS = ('samples', 'culled', 'z-passes', 'bytes')
+
+enabled = False
+clock = time.perf_counter
+
+times = dict.fromkeys(STAGES, 0.0)
+counters = dict.fromkeys(COUNTERS, 0)
+frames = 0
+
+_interval = None
+_stream = None
+_last_dump = 0.0
+_registered = False
+
+def stamp(stage, start):
+    """Add the time since `start` to a stage and return the current time, to start the next stage."""
+    now = clock()
+    times[stage] += now - start
+    return now
+
+def count(counter, amount):
+    counters[counter] += amount
+
+def timed(stage):
+    """Decorator adding the run time of a function to a stage while collecting."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            started = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stamp(stage, started)
+        return wrapper
+    return decorate
+
+def frame_done():
+    """Count a finished frame (presenters call this) and dump when the interval has passed."""
+    global frames
+    frames += 1
+    if _interval and clock() - _last_dump >= _interval:
+        dump()
+
+def reset():
+    global frames
+    for stage in STAGES:
+        times[stage] = 0.0
+    for counter in COUNTERS:
+        counters[counter] = 0
+    frames = 0
+
+def snapshot():
+    """Picklable copy of the collected numbers, e.g. to send from a worker process."""
+    return dict(times), dict(counters), frames
+
+def merge(collected):
+    """Add a snapshot() from elsewhere (a parallel worker) to the numbers collected here."""
+    global frames
+    other_times, other_counters, other_frames = collected
+    for stage, seconds in other_times.items():
+        times[stage] += seconds
+    for counter, amount in other_counters.items():
+        counters[counter] += amount
+    frames += other_frames
+
+def report():
+    """Table of the stages (total and per frame) and the counters (per frame)."""
+    per_frame = max(frames, 1)
+    total = sum(times.values())
+    lines = [f"{frames} frames, {total * 1000 / per_frame:.2f} ms per frame in the stages"]
+    for stage in STAGES:
+        share = times[stage] / total if total else 0
+        lines.append(f"  {stage:<11} {times[stage] * 1000:>10.1f} ms {times[stage] * 1000 / per_frame:>8.3f} ms/frame {share:>6.1%}")
+    for counter in COUNTERS:
+        lines.append(f"  {counter:<11} {counters[counter]:>12} {counters[counter] / per_frame:>12.1f} /frame")
+    return '\n'.join(lines)
+
+def dump():
+    global _last_dump
+    _last_dump = clock()
+    print(report(), file=_stream or sys.stderr, flush=True)
+
+def enable(interval=None, stream=None, at_exit=True):
+    """
+    Start collecting; dump every `interval` seconds (None: never) and, with at_exit, at exit.
+
+    Dumps go to `stream`, by default stderr.
+    """
+    global enabled, _interval, _stream, _last_dump, _registered
+    enabled = True
+    _interval = interval
+    _stream = stream
+    _last_dump = clock()
+    if at_exit and not _registered:
+        atexit.register(lambda: enabled and dump())
+        _registered = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def _env_interval(value):
+    # Dump interval of a RENDER_PROFILE value; anything but a positive number
+    # of seconds (empty, 0, "yes", "1s") dumps only at exit
+    try:
+        interval = float(value)
+    except ValueError:
+        if value.strip():
+            print(f"RENDER_PROFILE={value!r} is not a number of seconds; dumping at exit only", file=sys.stderr)
+        return None
+    return interval if 0 < interval < math.inf else None
+
+if os.environ.get('RENDER_PROFILE') is not None:
+    enable(_env_interval(os.environ['RENDER_PROFILE']))
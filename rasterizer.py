@@ -0,0 +1,151 @@
+"""Triangle rasterizer for mesh.py meshes.
+
+The counterpart of renderer.draw_samples for meshes. The vertices go through
+the same projections and lighting models as a sample table, then every
+triangle fills the cells whose centres it covers: for each row the three
+edge functions give the span of covered cells directly, so the work per
+frame follows the number of cells covered, not a sampling grid.
+
+Depth is interpolated linearly in screen space. That is perspective-correct
+for both projections, because Perspective's depth is already 1/z and
+Orthographic's is z. The z-buffer semantics match draw_samples: larger
+depth is nearer, and only a strictly nearer triangle overwrites a cell.
+
+Palette codes are interpolated between the vertices and rounded, which
+gives Gouraud shading with the luminance palettes and flat faces with
+FaceCodes. When a vertex has code 0 (not drawn), cells take the code of
+their nearest vertex, so unlit or culled corners stay blank.
+"""
+import math
+
+import profiling
+from framebuffer import frame_buffer
+
+# Slack on the edge functions, so cells centred on a shared edge are not lost to rounding
+EDGE_EPSILON = 1e-9
+
+def _span(a0, b0, a1, b1, a2, b2):
+    # Range of x where all three barycentric weights a + b * x are >= 0 (or None)
+    low = -math.inf
+    high = math.inf
+    for a, b in ((a0 + EDGE_EPSILON, b0), (a1 + EDGE_EPSILON, b1), (a2 + EDGE_EPSILON, b2)):
+        if b > 0:
+            low = max(low, -a / b)
+        elif b < 0:
+            high = min(high, -a / b)
+        elif a < 0:
+            return None
+    return low, high
+
+def draw_triangles(mesh, rotation, projection, lighting, zbuffer, screen_codes, screen_width, screen_height, cull_back=True):
+    """
+    Rasterize all triangles of a mesh into a depth plane and a plane of palette codes.
+
+    With cull_back, triangles seen from behind are skipped, which is right
+    for closed meshes wound as in mesh.py.
+    """
+    profile = profiling.enabled
+    if profile:
+        started = profiling.clock()
+    vertices = mesh.vertices
+    count = len(vertices.x)
+    projected = projection.project(rotation, vertices, 0, count, screen_width, screen_height)
+    if profile:
+        started = profiling.stamp('transform', started)
+    codes = lighting.codes(rotation, vertices, 0, count)
+    if profile:
+        started = profiling.stamp('shade', started)
+    indices = mesh.indices
+    winding = projection.front_winding
+
+    culled = 0
+    passes = 0
+    for t in range(0, len(indices), 3):
+        i0, i1, i2 = indices[t], indices[t + 1], indices[t + 2]
+        c0, c1, c2 = codes[i0], codes[i1], codes[i2]
+        if not (c0 or c1 or c2):
+            culled += 1
+            continue
+        x0, y0, d0 = projected[i0]
+        x1, y1, d1 = projected[i1]
+        x2, y2, d2 = projected[i2]
+
+        # Triangles facing the viewer have the sign of the projection's front_winding
+        area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+        if area == 0 or (cull_back and area * winding < 0):
+            culled += 1
+            continue
+        inv_area = 1 / area
+
+        # Barycentric weight of vertex k at (x, y) is (ka + kb * x + kc * y)
+        w0b, w0c = (y1 - y2) * inv_area, (x2 - x1) * inv_area
+        w1b, w1c = (y2 - y0) * inv_area, (x0 - x2) * inv_area
+        w2b, w2c = (y0 - y1) * inv_area, (x1 - x0) * inv_area
+        w0a = (x1 * y2 - x2 * y1) * inv_area
+        w1a = (x2 * y0 - x0 * y2) * inv_area
+        w2a = (x0 * y1 - x1 * y0) * inv_area
+
+        # Depth and code are linear in x along a row
+        depth_b = d0 * w0b + d1 * w1b + d2 * w2b
+        flat = c0 == c1 == c2
+        blend = c0 and c1 and c2 and not flat
+        code_b = c0 * w0b + c1 * w1b + c2 * w2b
+
+        # Rows whose cell centres (row + 0.5) fall inside the triangle's bounds
+        row_start = max(0, math.ceil(min(y0, y1, y2) - 0.5))
+        row_end = min(screen_height - 1, math.floor(max(y0, y1, y2) - 0.5))
+        for row in range(row_start, row_end + 1):
+            cy = row + 0.5
+            a0 = w0a + w0c * cy
+            a1 = w1a + w1c * cy
+            a2 = w2a + w2c * cy
+            span = _span(a0, w0b, a1, w1b, a2, w2b)
+            if span is None:
+                continue
+            col_start = max(0, math.ceil(span[0] - 0.5))
+            col_end = min(screen_width - 1, math.floor(span[1] - 0.5))
+            if col_start > col_end:
+                continue
+
+            depth_a = d0 * a0 + d1 * a1 + d2 * a2
+            code_a = c0 * a0 + c1 * a1 + c2 * a2
+            offset = row * screen_width
+            for col in range(col_start, col_end + 1):
+                cx = col + 0.5
+                depth = depth_a + depth_b * cx
+                pixel_position = offset + col
+                if depth > zbuffer[pixel_position]:
+                    if flat:
+                        code = c0
+                    elif blend:
+                        code = int(code_a + code_b * cx + 0.5)
+                    else:
+                        # Some corner is not drawn: take the nearest vertex's code
+                        weights = (a0 + w0b * cx, a1 + w1b * cx, a2 + w2b * cx)
+                        code = (c0, c1, c2)[weights.index(max(weights))]
+                        if not code:
+                            continue
+                    zbuffer[pixel_position] = depth
+                    screen_codes[pixel_position] = code
+                    passes += 1
+
+    if profile:
+        profiling.stamp('depth-test', started)
+        profiling.count('samples', len(indices) // 3)
+        profiling.count('culled', culled)
+        profiling.count('z-passes', passes)
+
+def render_mesh(mesh, rotation, projection, lighting, palette, screen_width, screen_height, framebuffer=None, cull_back=True,
+                radius=None):
+    """Like renderer.render, for a mesh: returns the flat char and color planes."""
+    if framebuffer is None:
+        framebuffer = frame_buffer(screen_width, screen_height)
+    framebuffer.clear(projection.screen_box(radius, screen_width, screen_height) if radius is not None else None)
+    draw_triangles(mesh, rotation, projection, lighting, framebuffer.depth, framebuffer.codes,
+                   screen_width, screen_height, cull_back)
+    if not profiling.enabled:
+        return framebuffer.planes(palette)
+    started = profiling.clock()
+    planes = framebuffer.planes(palette)
+    profiling.stamp('encode', started)
+    return planes
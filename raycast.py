@@ -0,0 +1,251 @@
+"""Image-order ray casting for the sphere, cube and torus (NumPy).
+
+The sample tables of geometry_cache are splatted point by point, so their
+cost is fixed by the sampling grid and large shapes get holes between the
+samples. Here every terminal cell casts one ray through its centre instead,
+vectorized over the whole screen, and each shape is intersected in closed
+form where there is one:
+
+* Sphere: the nearer root of the ray/sphere quadratic,
+* Cube: the slab test on the three pairs of faces,
+* Torus: a bounded sphere-trace (ray march) of the torus distance function,
+  which never steps past the surface.
+
+The cost follows the number of cells (only those in the screen box of the
+shape's bounding sphere cast rays), and the coverage is exact at any
+terminal size. Rays are cast in object space, through the inverse of the
+frame's rotation, for both renderer projections. Depth is the one the
+projection would give the hit point (1/z for Perspective, the rotated z for
+Orthographic), so the z-buffer semantics match draw_samples. The hit points
+and their normals form a SampleTable for the frame's lighting model, so
+every shading formula (and FaceCodes) applies unchanged.
+"""
+import functools
+
+import numpy as np
+
+import profiling
+from framebuffer import frame_buffer
+from geometry_cache import SampleTable
+from renderer import Orthographic, Perspective
+
+# Sphere-tracing limits for the torus: steps per ray, and the distance to
+# the surface that counts as a hit (in object units)
+MARCH_STEPS = 64
+MARCH_EPSILON = 1e-4
+
+# Shapes: bound is the radius of a sphere around the origin enclosing the
+# shape; intersect(ox, oy, oz, dx, dy, dz) returns the distance along each
+# ray (unit directions) to its first hit, inf for a miss; surface(x, y, z)
+# returns the unit normals at hit points and their face tags (or None)
+
+class Sphere:
+    """The sphere of sphere_table, centred on the origin."""
+
+    def __init__(self, radius):
+        self.radius = radius
+        self.bound = radius
+
+    def intersect(self, ox, oy, oz, dx, dy, dz):
+        b = ox * dx + oy * dy + oz * dz
+        c = ox * ox + oy * oy + oz * oz - self.radius * self.radius
+        disc = b * b - c
+        with np.errstate(invalid='ignore'):
+            t = -b - np.sqrt(disc)
+        return np.where(disc >= 0, t, np.inf)
+
+    def surface(self, x, y, z):
+        return x / self.radius, y / self.radius, z / self.radius, None
+
+class Cube:
+    """
+    The cube of cube_table with half-width `size`.
+
+    Normals are the face normals, or with smooth_normals the normalized hit
+    points (Test.py/Test3.py); tags are the face tags of cube_table.
+    """
+
+    # Face tag by axis (x, y, z) and side (negative, positive), as in geometry_cache.CUBE_FACE_NORMALS
+    TAGS = np.array(((3, 2), (5, 6), (1, 4)), dtype=np.uint8)
+
+    def __init__(self, size, smooth_normals=False):
+        self.size = size
+        self.smooth_normals = smooth_normals
+        self.bound = size * 3 ** 0.5
+
+    def intersect(self, ox, oy, oz, dx, dy, dz):
+        size = self.size
+        near = np.full(len(dx), -np.inf)
+        far = np.full(len(dx), np.inf)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for o, d in ((ox, dx), (oy, dy), (oz, dz)):
+                # Distances to the two planes of this axis; a ray parallel to
+                # them gets -inf/inf inside the slab and misses outside it
+                t1 = (-size - o) / d
+                t2 = (size - o) / d
+                np.maximum(near, np.minimum(t1, t2), out=near)
+                np.minimum(far, np.maximum(t1, t2), out=far)
+        return np.where((near <= far) & (near > 0), near, np.inf)
+
+    def surface(self, x, y, z):
+        # The face hit is the axis on which the point lies furthest out
+        points = np.stack((x, y, z))
+        axis = np.abs(points).argmax(axis=0)
+        side = np.take_along_axis(points, axis[None], axis=0)[0] > 0
+        tags = self.TAGS[axis, side.astype(np.intp)]
+        if self.smooth_normals:
+            length = np.sqrt(x * x + y * y + z * z)
+            return x / length, y / length, z / length, tags
+
+        normals = np.zeros((3, len(x)))
+        normals[axis, np.arange(len(x))] = np.where(side, 1.0, -1.0)
+        return normals[0], normals[1], normals[2], tags
+
+class Torus:
+    """The torus of torus_table: around the y axis, tube radius R1, centre radius R2."""
+
+    def __init__(self, R1=1, R2=2):
+        self.R1 = R1
+        self.R2 = R2
+        self.bound = R1 + R2
+
+    def distance(self, x, y, z):
+        ring = np.sqrt(x * x + z * z) - self.R2
+        return np.sqrt(ring * ring + y * y) - self.R1
+
+    def intersect(self, ox, oy, oz, dx, dy, dz):
+        # Start where the ray enters the bounding sphere and give up where it leaves
+        b = ox * dx + oy * dy + oz * dz
+        disc = b * b - (ox * ox + oy * oy + oz * oz - self.bound * self.bound)
+        result = np.full(len(dx), np.inf)
+        active = np.flatnonzero(disc > 0)
+        root = np.sqrt(disc[active])
+        t = np.maximum(-b[active] - root, 0)
+        end = -b[active] + root
+
+        # Only the rays still marching are evaluated at each step
+        for _ in range(MARCH_STEPS):
+            distance = self.distance(ox[active] + t * dx[active], oy[active] + t * dy[active], oz[active] + t * dz[active])
+            hit = distance < MARCH_EPSILON
+            result[active[hit]] = t[hit]
+            t += distance
+            going = ~hit & (t < end)
+            active, t, end = active[going], t[going], end[going]
+            if not len(active):
+                break
+        return result
+
+    def surface(self, x, y, z):
+        # The normal points away from the nearest point of the tube's centre circle
+        scale = self.R2 / np.sqrt(x * x + z * z)
+        nx = x - x * scale
+        nz = z - z * scale
+        length = np.sqrt(nx * nx + y * y + nz * nz)
+        return nx / length, y / length, nz / length, None
+
+@functools.lru_cache(maxsize=16)
+def _cells(box, screen_width):
+    # Indices (x + y * screen_width) and screen coordinates of the centres of the cells in a box
+    left, top, right, bottom = box
+    xs = np.tile(np.arange(left, right), bottom - top)
+    ys = np.repeat(np.arange(top, bottom), right - left)
+    return xs + ys * screen_width, xs + 0.5, ys + 0.5
+
+def _rays(rotation, projection, sx, sy, screen_width, screen_height, bound):
+    """
+    Object-space rays through the cell centres (sx, sy): (origin, unit direction, depth).
+
+    depth(t, rays) maps distances along rays (indices into sx and sy) to the projection's depth.
+    """
+    (r00, r01, r02), (r10, r11, r12), (r20, r21, r22) = rotation
+    if isinstance(projection, Perspective):
+        # Viewer at the origin, the shape K2 along z: camera ray (u, v, 1)
+        u = (sx - screen_width / 2) / (projection.K1 * projection.x_scale)
+        v = (screen_height / 2 - sy) / projection.K1
+        length = np.sqrt(u * u + v * v + 1)
+        u = u / length
+        v = v / length
+        w = 1 / length
+        # Rotated back: the transpose of the rotation
+        origin = np.full_like(u, -projection.K2 * r20), np.full_like(u, -projection.K2 * r21), np.full_like(u, -projection.K2 * r22)
+        direction = (r00 * u + r10 * v + r20 * w,
+                     r01 * u + r11 * v + r21 * w,
+                     r02 * u + r12 * v + r22 * w)
+
+        def depth(t, rays):
+            # Camera z of the hit is t * w; the depth is its inverse
+            return 1 / (t * w[rays])
+        return origin, direction, depth
+
+    if isinstance(projection, Orthographic):
+        # Viewer on +z: rays start in front of the shape and run along -z
+        u = (sx - screen_width / 2) / projection.scale_x
+        v = (screen_height / 2 - sy) / projection.scale_y
+        start = bound + 1
+        origin = (r00 * u + r10 * v + r20 * start,
+                  r01 * u + r11 * v + r21 * start,
+                  r02 * u + r12 * v + r22 * start)
+        direction = np.full_like(u, -r20), np.full_like(u, -r21), np.full_like(u, -r22)
+
+        def depth(t, rays):
+            return start - t
+        return origin, direction, depth
+
+    raise TypeError(f"cannot cast rays for a {type(projection).__name__} projection")
+
+def cast(shape, rotation, projection, lighting, zbuffer, screen_codes, screen_width, screen_height):
+    """Ray-cast a shape into a depth plane and a plane of palette codes, like renderer.draw_samples."""
+    profile = profiling.enabled
+    if profile:
+        started = profiling.clock()
+    cells, sx, sy = _cells(projection.screen_box(shape.bound, screen_width, screen_height), screen_width)
+    (ox, oy, oz), (dx, dy, dz), depth = _rays(rotation, projection, sx, sy, screen_width, screen_height, shape.bound)
+
+    # Only the rays through the bounding sphere are intersected
+    b = ox * dx + oy * dy + oz * dz
+    rays = np.flatnonzero(b * b - (ox * ox + oy * oy + oz * oz) + shape.bound * shape.bound > 0)
+    ox, oy, oz, dx, dy, dz = ox[rays], oy[rays], oz[rays], dx[rays], dy[rays], dz[rays]
+    t = shape.intersect(ox, oy, oz, dx, dy, dz)
+    hit = np.isfinite(t)
+    rays, t = rays[hit], t[hit]
+    x = ox[hit] + t * dx[hit]
+    y = oy[hit] + t * dy[hit]
+    z = oz[hit] + t * dz[hit]
+    if profile:
+        started = profiling.stamp('transform', started)
+
+    # The hit points go through the lighting model as a sample table
+    nx, ny, nz, tags = shape.surface(x, y, z)
+    table = SampleTable(x.tolist(), y.tolist(), z.tolist(), nx.tolist(), ny.tolist(), nz.tolist(),
+                        tags.tolist() if tags is not None else None)
+    codes = np.array(lighting.codes(rotation, table, 0, len(rays)), dtype=np.int64)
+    if profile:
+        started = profiling.stamp('shade', started)
+
+    # Only a strictly nearer hit overwrites a cell, as in draw_samples
+    depths = depth(t, rays)
+    rays = cells[rays]
+    zbuffer = np.frombuffer(zbuffer, dtype=np.float64)
+    drawn = (codes > 0) & (depths > zbuffer[rays])
+    pixels = rays[drawn]
+    zbuffer[pixels] = depths[drawn]
+    np.frombuffer(screen_codes, dtype=np.uint16)[pixels] = codes[drawn]
+
+    if profile:
+        profiling.stamp('depth-test', started)
+        profiling.count('samples', len(cells))
+        profiling.count('culled', len(cells) - len(pixels))
+        profiling.count('z-passes', len(pixels))
+
+def render(shape, rotation, projection, lighting, palette, screen_width, screen_height, framebuffer=None):
+    """Like renderer.render, for a ray-cast shape: returns the flat char and color planes."""
+    if framebuffer is None:
+        framebuffer = frame_buffer(screen_width, screen_height)
+    framebuffer.clear(projection.screen_box(shape.bound, screen_width, screen_height))
+    cast(shape, rotation, projection, lighting, framebuffer.depth, framebuffer.codes, screen_width, screen_height)
+    if not profiling.enabled:
+        return framebuffer.planes(palette)
+    started = profiling.clock()
+    planes = framebuffer.planes(palette)
+    profiling.stamp('encode', started)
+    return planes
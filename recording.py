@@ -0,0 +1,307 @@
+"""Recording frames to a compact binary file and replaying them.
+
+A recording holds the char and color planes of every frame as index planes
+into a glyph table and a color table. Layout, all little-endian:
+
+* header: magic b'ASCR', version (u16), screen width and height (u16 each)
+  and the frame rate it was recorded for (f32),
+* palette: the initial glyph table (u16 count, then per glyph a u8 length
+  and its UTF-8 bytes) and color table (u16 count, then per color a u8
+  length and the escape; length 0 is None, the uncolored cell),
+* one record per frame: kind (u8, KEY or DELTA), the number of glyphs and
+  colors it adds to the tables (u16 each), the payload length (u32), the
+  added entries (encoded as in the palette), then the payload.
+
+The payload is the zlib-compressed plane of u16 glyph indices followed by
+the plane of u16 color indices. For a DELTA frame the planes are XORed with
+those of the previous frame first, so cells that did not change compress to
+almost nothing; every KEYFRAME_INTERVAL frames a KEY frame stands alone.
+
+Any renderer can record through a RecordingPresenter. FrameReader maps the
+file and only scans the record headers when it is opened; a frame is
+decompressed when it is asked for, from the nearest KEY frame or the frame
+decoded last. Recording offline and replaying:
+
+    python recording.py record torus torus.ascr --frames 600 --width 160 --height 48
+    python recording.py play torus.ascr --rate 60 --loop
+"""
+import argparse
+import mmap
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+MAGIC = b'ASCR'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHf')
+RECORD = struct.Struct('<BHHI')
+COUNT = struct.Struct('<H')
+
+# Record kinds
+KEY = 0
+DELTA = 1
+
+# Frames between two KEY frames; bounds the decoding needed to seek
+KEYFRAME_INTERVAL = 120
+
+DEFAULT_RATE = 30.0
+
+def _encode_entries(entries):
+    out = []
+    for entry in entries:
+        data = entry.encode('utf-8') if entry is not None else b''
+        out.append(bytes((len(data),)) + data)
+    return b''.join(out)
+
+def _decode_entries(data, offset, count, table):
+    # Append count entries starting at offset to table; returns the offset after them
+    for _ in range(count):
+        length = data[offset]
+        offset += 1
+        table.append(bytes(data[offset:offset + length]).decode('utf-8') if length else None)
+        offset += length
+    return offset
+
+def _plane_bytes(indices):
+    if sys.byteorder == 'big':
+        indices = array('H', indices)
+        indices.byteswap()
+    return indices.tobytes()
+
+def _xor(data, previous):
+    size = len(data)
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(previous, 'little')).to_bytes(size, 'little')
+
+class FrameWriter:
+    def __init__(self, path, screen_width, screen_height, frame_rate=DEFAULT_RATE, palette=None,
+                 keyframe_interval=KEYFRAME_INTERVAL):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.keyframe_interval = keyframe_interval
+        self.glyph_index = {}
+        self.color_index = {}
+        self.previous = None
+        self.count = 0
+
+        # The palette of the renderer, if known, goes into the header
+        glyphs = []
+        colors = []
+        for glyph, color in palette or ():
+            if glyph not in self.glyph_index:
+                self.glyph_index[glyph] = len(glyphs)
+                glyphs.append(glyph)
+            if color not in self.color_index:
+                self.color_index[color] = len(colors)
+                colors.append(color)
+
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, screen_width, screen_height, frame_rate))
+        self.file.write(COUNT.pack(len(glyphs)) + _encode_entries(glyphs))
+        self.file.write(COUNT.pack(len(colors)) + _encode_entries(colors))
+
+    def _indices(self, values, index, added):
+        indices = array('H')
+        for value in values:
+            i = index.get(value)
+            if i is None:
+                i = index[value] = len(index)
+                added.append(value)
+            indices.append(i)
+        return indices
+
+    def write(self, screen_chars, screen_colors):
+        """Append one frame given as char and color planes."""
+        new_glyphs = []
+        new_colors = []
+        glyphs = self._indices(screen_chars, self.glyph_index, new_glyphs)
+        colors = self._indices(screen_colors, self.color_index, new_colors)
+        planes = _plane_bytes(glyphs) + _plane_bytes(colors)
+
+        if self.previous is None or self.count % self.keyframe_interval == 0:
+            kind, payload = KEY, zlib.compress(planes)
+        else:
+            kind, payload = DELTA, zlib.compress(_xor(planes, self.previous))
+        self.previous = planes
+        self.count += 1
+
+        self.file.write(RECORD.pack(kind, len(new_glyphs), len(new_colors), len(payload)))
+        self.file.write(_encode_entries(new_glyphs) + _encode_entries(new_colors))
+        self.file.write(payload)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RecordingPresenter:
+    """Presenter that writes every frame to a FrameWriter, and optionally shows it on another presenter."""
+
+    def __init__(self, writer, presenter=None):
+        self.writer = writer
+        self.presenter = presenter
+
+    def present(self, screen_chars, screen_colors, status=None):
+        self.writer.write(screen_chars, screen_colors)
+        if self.presenter is not None:
+            self.presenter.present(screen_chars, screen_colors, status)
+
+    def close(self):
+        self.writer.close()
+        if self.presenter is not None:
+            self.presenter.close()
+
+class FrameReader:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self.data
+
+        magic, version, self.screen_width, self.screen_height, self.frame_rate = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} frame recording")
+        self.glyphs = []
+        self.colors = []
+        offset = HEADER.size
+        for table in (self.glyphs, self.colors):
+            (count,) = COUNT.unpack_from(data, offset)
+            offset = _decode_entries(data, offset + COUNT.size, count, table)
+
+        # (kind, payload offset, payload length) of every frame; a record cut
+        # short (e.g. by an interrupted recording) ends the file
+        self.records = []
+        while offset + RECORD.size <= len(data):
+            kind, glyph_count, color_count, length = RECORD.unpack_from(data, offset)
+            try:
+                offset = _decode_entries(data, offset + RECORD.size, glyph_count, self.glyphs)
+                offset = _decode_entries(data, offset, color_count, self.colors)
+            except (IndexError, UnicodeDecodeError):
+                break
+            if offset + length > len(data):
+                break
+            self.records.append((kind, offset, length))
+            offset += length
+
+        self.decoded = None  # (index, planes) of the frame decoded last
+
+    def __len__(self):
+        return len(self.records)
+
+    def _payload(self, index):
+        _, offset, length = self.records[index]
+        return zlib.decompress(self.data[offset:offset + length])
+
+    def _planes(self, index):
+        # Walk back to a KEY frame or to the frame decoded last, then apply the deltas after it
+        if self.decoded is not None and self.decoded[0] == index:
+            return self.decoded[1]
+        start = index
+        while True:
+            if self.records[start][0] == KEY:
+                planes = self._payload(start)
+                start += 1
+                break
+            if self.decoded is not None and self.decoded[0] == start - 1:
+                planes = self.decoded[1]
+                break
+            start -= 1
+        for i in range(start, index + 1):
+            planes = _xor(self._payload(i), planes)
+        return planes
+
+    def planes(self, index):
+        """Char and color planes of frame `index`."""
+        data = self._planes(index)
+        self.decoded = (index, data)
+        indices = array('H')
+        indices.frombytes(data)
+        if sys.byteorder == 'big':
+            indices.byteswap()
+        size = self.screen_width * self.screen_height
+        glyphs = self.glyphs
+        colors = self.colors
+        return [glyphs[i] for i in indices[:size]], [colors[i] for i in indices[size:]]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def play(reader, presenter, frame_rate=None, loop=False):
+    """Show the frames of a FrameReader at its recorded rate or at frame_rate."""
+    interval = 1 / (frame_rate or reader.frame_rate)
+    deadline = time.perf_counter()
+    while True:
+        for index in range(len(reader)):
+            presenter.present(*reader.planes(index), f"frame {index + 1}/{len(reader)}")
+            deadline += interval
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running late: carry on from now instead of rushing to catch up
+                deadline = time.perf_counter()
+        if not loop:
+            return
+
+def record(name, path, frames, screen_width, screen_height, frame_rate=DEFAULT_RATE, processes=0, lod=False):
+    """Render `frames` frames of a benchmark.RENDERERS scene into a recording."""
+    import benchmark
+    render, _, pool = benchmark.RENDERERS[name](screen_width, screen_height, processes, None, lod)
+    try:
+        with FrameWriter(path, screen_width, screen_height, frame_rate, benchmark.scene_palette(name)) as writer:
+            for frame in range(frames):
+                writer.write(*render(frame))
+    finally:
+        if pool is not None:
+            pool.close()
+
+def main(argv=None):
+    import benchmark
+    parser = argparse.ArgumentParser(description="Record frames to a file and play them back")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="render a scene offline into a recording")
+    record_parser.add_argument("renderer", choices=list(benchmark.RENDERERS))
+    record_parser.add_argument("path")
+    record_parser.add_argument("--frames", type=int, default=300)
+    record_parser.add_argument("--width", type=int, default=80)
+    record_parser.add_argument("--height", type=int, default=24)
+    record_parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="frame rate to play the recording at")
+    record_parser.add_argument("--processes", type=int, default=0, help="render in a pool of this many processes (0: single process)")
+    record_parser.add_argument("--lod", action="store_true", help="pick the sample density from the size of the shape on screen")
+
+    play_parser = commands.add_parser("play", help="play a recording in the terminal")
+    play_parser.add_argument("path")
+    play_parser.add_argument("--rate", type=float, help="frame rate (default: the recorded one)")
+    play_parser.add_argument("--loop", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(args.renderer, args.path, args.frames, args.width, args.height, args.rate, args.processes, args.lod)
+        with FrameReader(args.path) as reader:
+            size = len(reader.data)
+        print(f"{args.frames} frames, {size} bytes ({size / max(args.frames, 1):.0f} per frame)", file=sys.stderr)
+    else:
+        from presenter import TerminalPresenter
+        with FrameReader(args.path) as reader:
+            presenter = TerminalPresenter(reader.screen_width, reader.screen_height)
+            try:
+                play(reader, presenter, args.rate, args.loop)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                presenter.close()
+
+if __name__ == "__main__":
+    main()
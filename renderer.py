@@ -0,0 +1,367 @@
+"""Rendering core shared by the shape scripts.
+
+Every shape is drawn by the same hot path, draw_samples, from three parts:
+
+* a sample table from geometry_cache (object-space points, unit normals and
+  optional per-sample tags),
+* a projection (Perspective for the torus and cubes, Orthographic for the
+  spheres) that rotates the points and maps them to screen cells with a
+  depth where larger is nearer,
+* a lighting model that turns every sample into a palette code, 0 meaning
+  the sample is not drawn (unlit or facing away).
+
+The z-buffer keeps the nearest code per cell in a reused FrameBuffer, whose
+code plane expands into char and color planes for a presenter. Projections
+and lighting models are small picklable objects, so parallel.py workers run
+exactly the same code on parts of a table.
+"""
+import math
+
+import profiling
+from ansi import rgb
+from framebuffer import frame_buffer
+from geometry_cache import CUBE_FACE_NORMALS
+from shading import LUMINANCE_CHARS
+from transform import (normalize, orthographic_matrix, project_orthographic, project_points,
+                       projection_matrix, spherical, transform_point, transform_points)
+
+GREEN = rgb(0, 255, 0)
+
+# Screen code 0 is blank, 1.. are the luminance characters in green
+LUMINANCE_PALETTE = [(' ', None)] + [(char, GREEN) for char in LUMINANCE_CHARS]
+
+# Samples projected and lit per batch; bounds the temporary lists of a frame
+CHUNK_SIZE = 4096
+
+# Frames between the phi values a LightOrbit keeps for seeking back
+ORBIT_CHECKPOINT = 256
+
+# Nearest distance, as a fraction of K2, that Perspective.cells_per_unit
+# assumes: a shape reaching up to (or past) the viewer would otherwise ask
+# for an unbounded sample density
+NEAR_LIMIT = 0.25
+
+def _points(table, start, end):
+    return zip(table.x[start:end], table.y[start:end], table.z[start:end])
+
+def _normals(table, start, end):
+    return zip(table.nx[start:end], table.ny[start:end], table.nz[start:end])
+
+# Projections: project(rotation, table, start, end, screen_width, screen_height)
+# returns a (screen_x, screen_y, depth) tuple per sample,
+# front_facing(normal, offset) tells whether the plane normal . p = offset
+# (normal already rotated) can be seen from the viewer,
+# cells_per_unit(radius) bounds the screen cells per object-space unit for
+# points within radius of the centre (see lod.py), screen_box(radius,
+# screen_width, screen_height) is a (left, top, right, bottom) range of cells
+# holding every point within radius of the centre, right and bottom exclusive
+# (the dirty rectangle of framebuffer.py), and front_winding is the
+# sign of the screen-space area of a triangle wound counter-clockwise towards
+# the viewer (see rasterizer.py)
+
+def _box(centre_x, centre_y, half_width, half_height, screen_width, screen_height):
+    # Cells reached by screen coordinates within the half extents of the centre;
+    # int() truncates -1 < x < 0 to cell 0 as well, which the clamping keeps
+    return (max(0, min(screen_width, math.floor(centre_x - half_width))),
+            max(0, min(screen_height, math.floor(centre_y - half_height))),
+            max(0, min(screen_width, math.floor(centre_x + half_width) + 1)),
+            max(0, min(screen_height, math.floor(centre_y + half_height) + 1)))
+
+class Perspective:
+    """Pinhole projection, K2 in front of the viewer; depth is 1/z."""
+
+    front_winding = 1
+
+    def __init__(self, K1, K2, x_scale=2):
+        self.K1 = K1
+        self.K2 = K2
+        self.x_scale = x_scale
+
+    def project(self, rotation, table, start, end, screen_width, screen_height):
+        matrix = projection_matrix(rotation, self.K1, self.K2, screen_width, screen_height, self.x_scale)
+        return project_points(matrix, _points(table, start, end))
+
+    def front_facing(self, normal, offset):
+        # The viewer sits at the origin and the shape K2 along z; edge-on planes count as visible
+        return offset + self.K2 * normal[2] <= 0
+
+    def cells_per_unit(self, radius):
+        # Magnification is largest at the nearest point, K2 - radius away,
+        # capped at the one NEAR_LIMIT * K2 away
+        return max(self.K1 * self.x_scale, self.K1) / max(self.K2 - radius, self.K2 * NEAR_LIMIT)
+
+    def screen_box(self, radius, screen_width, screen_height):
+        if radius >= self.K2:
+            return 0, 0, screen_width, screen_height
+        # Tangent of the cone from the viewer around the bounding sphere
+        spread = radius / math.sqrt(self.K2 * self.K2 - radius * radius)
+        return _box(screen_width / 2, screen_height / 2, self.K1 * self.x_scale * spread, self.K1 * spread,
+                    screen_width, screen_height)
+
+class Orthographic:
+    """Parallel projection with the viewer on +z; depth is the rotated z."""
+
+    front_winding = -1
+
+    def __init__(self, scale_x=1.0, scale_y=1.0):
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+
+    def project(self, rotation, table, start, end, screen_width, screen_height):
+        matrix = orthographic_matrix(rotation, self.scale_x, self.scale_y, screen_width, screen_height)
+        return project_orthographic(matrix, _points(table, start, end))
+
+    def front_facing(self, normal, offset):
+        return normal[2] >= 0
+
+    def cells_per_unit(self, radius):
+        return max(abs(self.scale_x), abs(self.scale_y))
+
+    def screen_box(self, radius, screen_width, screen_height):
+        return _box(screen_width / 2, screen_height / 2, radius * abs(self.scale_x), radius * abs(self.scale_y),
+                    screen_width, screen_height)
+
+# Lighting models: codes(rotation, table, start, end) returns a palette code per sample
+
+class FaceCodes:
+    """Unlit: every sample is drawn with its tag as the code (the faces of MyCube.py)."""
+
+    def codes(self, rotation, table, start, end):
+        return table.tags[start:end]
+
+class Diffuse:
+    """
+    Lambert shading into `levels` luminance codes.
+
+    light is pre-scaled so that int(normal . light) is the luminance level.
+    Samples facing away from the light get the darkest level, or are not
+    drawn with skip_unlit. cull_back drops samples facing away from a viewer
+    on +z (the orthographic spheres).
+    """
+
+    def __init__(self, light, levels=len(LUMINANCE_CHARS), skip_unlit=False, cull_back=False):
+        self.light = light
+        self.levels = levels
+        self.skip_unlit = skip_unlit
+        self.cull_back = cull_back
+
+    def codes(self, rotation, table, start, end):
+        lx, ly, lz = self.light
+        top = self.levels - 1
+        unlit = 0 if self.skip_unlit else 1
+        cull_back = self.cull_back
+
+        codes = []
+        for nx, ny, nz in transform_points(rotation, _normals(table, start, end)):
+            if cull_back and nz <= 0:
+                codes.append(0)
+                continue
+            dot = nx * lx + ny * ly + nz * lz
+            codes.append(min(int(dot), top) + 1 if dot > 0 else unlit)
+        return codes
+
+class Phong:
+    """Ambient, diffuse and specular terms for a viewer on +z, back faces culled (BestSphere.py)."""
+
+    def __init__(self, light, intensity, ambient=0.1, specular_power=32, levels=len(LUMINANCE_CHARS)):
+        self.light = normalize(light)
+        self.intensity = intensity
+        self.ambient = ambient
+        self.specular_power = specular_power
+        self.levels = levels
+
+    def codes(self, rotation, table, start, end):
+        lx, ly, lz = self.light
+        intensity = self.intensity
+        ambient = self.ambient
+        specular_power = self.specular_power
+        top = self.levels - 1
+
+        codes = []
+        for nx, ny, nz in transform_points(rotation, _normals(table, start, end)):
+            # Backface culling: discard points facing away from the viewer
+            if nz <= 0:
+                codes.append(0)
+                continue
+
+            dot = max(0, nx * lx + ny * ly + nz * lz)
+            diffuse = dot * intensity
+
+            # Specular highlight from the reflected light direction
+            if dot > 0:
+                specular = max(0, 2 * dot * nz - lz) ** specular_power * intensity
+            else:
+                specular = 0
+
+            total = max(0, min(1, ambient + diffuse + specular))
+            codes.append(int(total * top) + 1)
+        return codes
+
+class ShadedLights:
+    """
+    Averaged Lambert terms of several lights, mapped through a ShadingTable.
+
+    The lights stay fixed relative to the shape, so normals are used in object
+    space, as in Test.py/Test3.py. Intensities are raised to at least `floor`
+    so no lit cell goes completely dark; code n + 1 is shading level n.
+    """
+
+    def __init__(self, lights, intensity, shading, floor=0.0):
+        # Fold direction, attenuation and the averaging into one vector per light
+        self.lights = []
+        for light in lights:
+            attenuation = 1 / (1 + (light[0] ** 2 + light[1] ** 2 + light[2] ** 2))
+            weight = intensity * attenuation / len(lights)
+            lx, ly, lz = normalize(light)
+            self.lights.append((lx * weight, ly * weight, lz * weight))
+        self.floor = floor
+        self.scale = shading.scale
+        self.levels = shading.levels
+
+    def codes(self, rotation, table, start, end):
+        lights = self.lights
+        floor = self.floor
+        scale = self.scale
+        top = self.levels - 1
+
+        codes = []
+        append = codes.append
+        if len(lights) == 2:
+            # The usual pair of lights (Test.py/Test3.py), unrolled: one
+            # multiply-add chain per light and no inner loop
+            (ax, ay, az), (bx, by, bz) = lights
+            for nx, ny, nz in _normals(table, start, end):
+                a = nx * ax + ny * ay + nz * az
+                b = nx * bx + ny * by + nz * bz
+                light_intensity = (a if a > 0 else 0) + (b if b > 0 else 0)
+                append(min(int((light_intensity if light_intensity > floor else floor) * scale), top) + 1)
+            return codes
+
+        for nx, ny, nz in _normals(table, start, end):
+            light_intensity = 0
+            for lx, ly, lz in lights:
+                dot = nx * lx + ny * ly + nz * lz
+                if dot > 0:
+                    light_intensity += dot
+            append(min(int(max(floor, light_intensity) * scale), top) + 1)
+        return codes
+
+class LightOrbit:
+    """
+    A light circling the shape, its polar angle wobbling within [phi_min, phi_max].
+
+    Per frame, theta turns by delta_theta, then phi moves by delta_phi plus
+    0.2 * sin(wobble_rate * theta) and is clamped to its range. The clamp makes
+    phi depend on the whole path, so at() replays whole frames: onwards from
+    the last time it was asked for, or from the nearest of the phi values kept
+    every ORBIT_CHECKPOINT frames when seeking back. The fractional rest of the
+    time is taken as one partial step.
+    """
+
+    def __init__(self, theta, phi, phi_min, phi_max, delta_theta=0.0, delta_phi=0.0, wobble_rate=1.0):
+        self.theta = theta
+        self.phi = phi
+        self.phi_min = phi_min
+        self.phi_max = phi_max
+        self.delta_theta = delta_theta
+        self.delta_phi = delta_phi
+        self.wobble_rate = wobble_rate
+        self.checkpoints = [phi]  # Clamped phi at every ORBIT_CHECKPOINT-th frame reached so far
+        self.frame = 0
+        self.frame_phi = phi
+
+    def _step(self, frame, phi, steps=1.0):
+        # Phi `steps` frames after whole frame `frame`, starting from `phi`
+        theta = self.theta + self.delta_theta * (frame + steps)
+        phi += (self.delta_phi + 0.2 * math.sin(theta * self.wobble_rate)) * steps
+        return max(self.phi_min, min(phi, self.phi_max))
+
+    def _phi_at_frame(self, frame):
+        # Clamped phi after a whole number of frames
+        if frame < self.frame:
+            checkpoint = frame // ORBIT_CHECKPOINT
+            self.frame = checkpoint * ORBIT_CHECKPOINT
+            self.frame_phi = self.checkpoints[checkpoint]
+        phi = self.frame_phi
+        for n in range(self.frame + 1, frame + 1):
+            phi = self._step(n - 1, phi)
+            if n == len(self.checkpoints) * ORBIT_CHECKPOINT:
+                self.checkpoints.append(phi)
+        self.frame = frame
+        self.frame_phi = phi
+        return phi
+
+    def at(self, time):
+        """Unit direction of the light `time` frames (fractional ones too) into the animation."""
+        time = max(time, 0.0)
+        frame = int(time)
+        phi = self._phi_at_frame(frame)
+        if time > frame:
+            phi = self._step(frame, phi, time - frame)
+        return spherical(1.0, self.theta + self.delta_theta * time, phi)
+
+def visible_cube_faces(rotation, projection, size):
+    """
+    Tags of the cube faces (see geometry_cache.cube_table) turned towards the viewer.
+
+    Only six normals are rotated per frame; passing the result as cube_table's
+    `faces` skips the samples of back faces before any per-point work.
+    """
+    return tuple(tag for tag, normal in enumerate(CUBE_FACE_NORMALS, 1)
+                 if projection.front_facing(transform_point(rotation, *normal), size))
+
+def draw_samples(table, rotation, projection, lighting, zbuffer, screen_codes, screen_width, screen_height, start=0, end=None):
+    """Rasterize samples [start, end) of a table into a depth plane and a plane of palette codes."""
+    if end is None:
+        end = len(table.x)
+
+    for chunk_start in range(start, end, CHUNK_SIZE):
+        chunk_end = min(chunk_start + CHUNK_SIZE, end)
+        profile = profiling.enabled
+        if profile:
+            started = profiling.clock()
+        projected = projection.project(rotation, table, chunk_start, chunk_end, screen_width, screen_height)
+        if profile:
+            started = profiling.stamp('transform', started)
+        codes = lighting.codes(rotation, table, chunk_start, chunk_end)
+        if profile:
+            started = profiling.stamp('shade', started)
+
+        passes = 0
+        for (x, y, depth), code in zip(projected, codes):
+            if code:
+                xp = int(x)
+                yp = int(y)
+                if 0 <= xp < screen_width and 0 <= yp < screen_height:
+                    pixel_position = xp + yp * screen_width
+                    # Larger depth is nearer; on ties the earlier sample stays
+                    if depth > zbuffer[pixel_position]:
+                        zbuffer[pixel_position] = depth
+                        screen_codes[pixel_position] = code
+                        passes += 1
+
+        if profile:
+            profiling.stamp('depth-test', started)
+            profiling.count('samples', chunk_end - chunk_start)
+            # Any sequence: the codes of FaceCodes are memoryviews for disk-cached tables
+            profiling.count('culled', len(codes) - sum(map(bool, codes)))
+            profiling.count('z-passes', passes)
+
+def render(table, rotation, projection, lighting, palette, screen_width, screen_height, framebuffer=None, radius=None):
+    """
+    Render a whole sample table and return the flat char and color planes.
+
+    Draws into `framebuffer`, by default the shared one for this resolution.
+    radius, if given, bounds the distance of the samples from the origin, so
+    only the screen box they project into is cleared and expanded.
+    """
+    if framebuffer is None:
+        framebuffer = frame_buffer(screen_width, screen_height)
+    framebuffer.clear(projection.screen_box(radius, screen_width, screen_height) if radius is not None else None)
+    draw_samples(table, rotation, projection, lighting, framebuffer.depth, framebuffer.codes, screen_width, screen_height)
+    if not profiling.enabled:
+        return framebuffer.planes(palette)
+    started = profiling.clock()
+    planes = framebuffer.planes(palette)
+    profiling.stamp('encode', started)
+    return planes
@@ -0,0 +1,245 @@
+"""Interactive asyncio runner for the shapes.
+
+The scripts compute a frame, write it, sleep and start over, so a slow
+terminal write delays the next frame's computation, and their parameters
+are fixed in main(). This runner pipelines the two: while frame N is
+written to the terminal (in one worker thread), frame N + 1 is computed (in
+another), paced by a scheduler.FrameScheduler. Meanwhile the event loop
+reads keys from stdin without blocking and adjusts the running scene:
+
+    +/-   rotation speed          l/L   light intensity
+    [/]   smaller/larger screen   s     next shape
+    space pause                   q     quit
+
+On a terminal, keys act immediately (cbreak mode); from a pipe they are
+read as they arrive.
+
+    python runner.py --shape sphere --fps 30
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import BestSphere
+import BoringSphere
+import MyCube
+import MyDonut
+import renderer
+import Test
+import Test3
+from geometry_cache import cube_table, torus_table
+from presenter import TerminalPresenter
+from renderer import Diffuse
+from scheduler import DEFAULT_FPS, FrameScheduler
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows: keys are read from a pipe only
+    termios = None
+
+SPEED_FACTOR = 1.25
+LIGHT_FACTOR = 1.25
+MIN_WIDTH, MIN_HEIGHT = 20, 8
+WIDTH_STEP, HEIGHT_STEP = 8, 3
+
+# Scenes: advance(steps) moves the animation clock on by `steps` frames, and
+# render(screen_width, screen_height, light) returns the char and color
+# planes of the pose at that time (the scripts' pose_at), with the light
+# intensity scaled by `light`
+
+class Scene:
+    def __init__(self):
+        self.time = 0.0
+
+    def advance(self, steps):
+        self.time += steps
+
+class TorusScene(Scene):
+    """The torus of MyDonut.py."""
+
+    def render(self, screen_width, screen_height, light):
+        rotation, projection, lighting = MyDonut.torus_frame(*MyDonut.pose_at(self.time), screen_width, screen_height)
+        lx, ly, lz = lighting.light
+        lighting = Diffuse((lx * light, ly * light, lz * light), skip_unlit=True)
+        table = torus_table(*MyDonut.sample_steps(projection))
+        return renderer.render(table, rotation, projection, lighting, MyDonut.PALETTE, screen_width, screen_height,
+                               radius=MyDonut.BOUND)
+
+class CubeScene(Scene):
+    """The cube of MyCube.py; it is unlit, so the light intensity has no effect."""
+
+    def render(self, screen_width, screen_height, light):
+        return MyCube.rasterize_frame(*MyCube.pose_at(self.time), screen_width, screen_height)
+
+class SphereScene(Scene):
+    """The sphere of BestSphere.py with its orbiting light."""
+
+    def render(self, screen_width, screen_height, light):
+        rotation_x, rotation_y, light_theta, light_phi = BestSphere.pose_at(self.time)
+        return BestSphere.rasterize_sphere(12, rotation_x, rotation_y, light_theta, light_phi,
+                                           3.0, 1.5 * light, screen_width, screen_height, 2.0, 1.0)
+
+class BoringSphereScene(Scene):
+    """The sphere of BoringSphere.py with its swinging light."""
+
+    def render(self, screen_width, screen_height, light):
+        rotation_x, rotation_y, light_theta, light_phi = BoringSphere.pose_at(self.time)
+        return BoringSphere.rasterize_sphere(10, rotation_x, rotation_y, light_theta, light_phi,
+                                             1.5, 1.2 * light, screen_width, screen_height, 2.0, 1.0)
+
+class ShadedCubeScene(Scene):
+    """The cube of Test.py with its two orbiting lights, drawn with the script's lattice settings."""
+
+    module = Test
+
+    def render(self, screen_width, screen_height, light):
+        module = self.module
+        rotation, projection, lighting = module.cube_frame(self.time)
+        lighting.lights = [(lx * light, ly * light, lz * light) for lx, ly, lz in lighting.lights]
+        table = cube_table(*module.frame_lattice(rotation, module.cull_faces, module.lod))
+        return renderer.render(table, rotation, projection, lighting, module.palette, screen_width, screen_height,
+                               radius=module.cubesize * math.sqrt(3))
+
+class ShadedCube3Scene(ShadedCubeScene):
+    """The cube of Test3.py."""
+
+    module = Test3
+
+SCENES = {
+    'torus': TorusScene,
+    'cube': CubeScene,
+    'sphere': SphereScene,
+    'boring-sphere': BoringSphereScene,
+    'test': ShadedCubeScene,
+    'test3': ShadedCube3Scene,
+}
+
+class Settings:
+    """The parameters the keys change, read by the render loop once per frame."""
+
+    def __init__(self, shape, screen_width, screen_height):
+        self.shape = shape
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.speed = 1.0
+        self.light = 1.0
+        self.paused = False
+        self.running = True
+
+    def key(self, char):
+        if char == '+':
+            self.speed *= SPEED_FACTOR
+        elif char == '-':
+            self.speed /= SPEED_FACTOR
+        elif char == 'L':
+            self.light *= LIGHT_FACTOR
+        elif char == 'l':
+            self.light /= LIGHT_FACTOR
+        elif char == ']':
+            self.screen_width += WIDTH_STEP
+            self.screen_height += HEIGHT_STEP
+        elif char == '[':
+            self.screen_width = max(MIN_WIDTH, self.screen_width - WIDTH_STEP)
+            self.screen_height = max(MIN_HEIGHT, self.screen_height - HEIGHT_STEP)
+        elif char == 's':
+            shapes = list(SCENES)
+            self.shape = shapes[(shapes.index(self.shape) + 1) % len(shapes)]
+        elif char == ' ':
+            self.paused = not self.paused
+        elif char == 'q':
+            self.running = False
+
+    def status(self):
+        return f"{self.shape}  speed x{self.speed:.2f}  light x{self.light:.2f}  {self.screen_width}x{self.screen_height}"
+
+def _watch_keys(loop, settings):
+    # Feed stdin to the settings as it arrives; returns a function undoing the setup
+    fd = sys.stdin.fileno()
+    saved = None
+    if termios is not None and os.isatty(fd):
+        saved = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+
+    def on_input():
+        data = os.read(fd, 64)
+        if not data:  # End of the pipe: no more keys, keep running
+            loop.remove_reader(fd)
+            return
+        for char in data.decode('utf-8', 'ignore'):
+            settings.key(char)
+
+    try:
+        loop.add_reader(fd, on_input)
+    except (NotImplementedError, ValueError, OSError):
+        on_input = None  # No readable stdin (e.g. Windows consoles): run without keys
+
+    def restore():
+        if on_input is not None:
+            loop.remove_reader(fd)
+        if saved is not None:
+            termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+    return restore
+
+async def run(settings, presenter=None, fps=DEFAULT_FPS):
+    """Render, present and take keys until `q` is pressed (or settings.running is cleared)."""
+    loop = asyncio.get_running_loop()
+    compute = ThreadPoolExecutor(max_workers=1)
+    output = ThreadPoolExecutor(max_workers=1)
+    if presenter is None:
+        presenter = TerminalPresenter(settings.screen_width, settings.screen_height)
+    restore_keys = _watch_keys(loop, settings)
+    scheduler = FrameScheduler(fps)
+
+    scenes = {}  # One scene per shape, so switching back resumes it
+    shown_size = (settings.screen_width, settings.screen_height)
+
+    def next_frame():
+        scene = scenes.setdefault(settings.shape, SCENES[settings.shape]())
+        size = (settings.screen_width, settings.screen_height)
+        return scene, size, loop.run_in_executor(compute, scene.render, *size, settings.light)
+
+    try:
+        scene, size, pending = next_frame()
+        frame = await pending
+        while settings.running:
+            # Start writing frame N ...
+            status = f"{scheduler.status()}  {settings.status()}"
+            writing = loop.run_in_executor(output, presenter.present, *frame, status)
+
+            # ... while waiting for the next tick, moving the clock on and
+            # computing frame N + 1 at its own time
+            await asyncio.sleep(max(0, scheduler.remaining()))
+            steps = scheduler.tick()
+            if not settings.paused:
+                scene.advance(steps * settings.speed)
+            scene, size, pending = next_frame()
+
+            await writing
+            frame = await pending
+            if size != shown_size:
+                presenter.resize(*size)
+                shown_size = size
+    finally:
+        restore_keys()
+        compute.shutdown()
+        output.shutdown()
+        presenter.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Interactive shape viewer; see the module docstring for the keys")
+    parser.add_argument("--shape", choices=list(SCENES), default="torus")
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=24)
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run(Settings(args.shape, args.width, args.height), fps=args.fps))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
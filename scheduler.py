@@ -0,0 +1,83 @@
+"""Fixed-timestep frame pacing for the animation loops.
+
+The scripts used to sleep a flat 30 ms after every frame, so a frame took
+render time + 30 ms and the animation slowed down whenever rendering did.
+A FrameScheduler instead keeps a deadline every 1 / fps seconds and only
+sleeps for what is left of the current one. wait() returns how much
+wall-clock time passed since the previous frame, counted in frames of
+REFERENCE_FPS (the rate the per-frame speeds of the scripts are given
+for), and adds it to `time`, the animation clock. The scripts compute
+their whole state from that clock (their pose_at functions), so the
+animation runs at the same speed whatever the frame rate and however long
+a frame takes, and skipped frames leave no drift behind.
+
+The unit of the steps is what keeps --fps from changing the animation
+speed: counted in periods of the target rate instead (as the first version
+of this module did), a loop at 60 fps would take twice as many one-frame
+steps per second and run twice as fast.
+
+When a frame overruns its budget, the deadlines it missed are dropped
+instead of being rendered late, and counted in `dropped`. Loops that cannot
+block (runner.py) sleep for remaining() themselves and then call tick().
+"""
+import time
+
+DEFAULT_FPS = 30
+
+# The animation speeds of the scripts are per frame at this rate
+REFERENCE_FPS = 30
+
+# Largest step reported by wait(), in frames, so the animation does
+# not jump after the process was suspended
+MAX_STEPS = 10
+
+class FrameScheduler:
+    def __init__(self, fps=DEFAULT_FPS, max_steps=MAX_STEPS, clock=time.perf_counter, sleep=time.sleep,
+                 reference_fps=REFERENCE_FPS):
+        self.period = 1 / fps
+        self.reference_fps = reference_fps  # Rate the steps are counted in, independent of fps
+        self.max_steps = max_steps
+        self.clock = clock
+        self.sleep = sleep
+        self.dropped = 0
+        self.fps = 0.0
+        self.time = 0.0  # Animation time in frames of reference_fps
+
+        self.last = clock()
+        self.deadline = self.last + self.period
+        self.window_start = self.last  # Start and frame count of the FPS measurement
+        self.window_frames = 0
+
+    def remaining(self):
+        """Seconds left until the next frame is due (negative when it is late)."""
+        return self.deadline - self.clock()
+
+    def tick(self):
+        """Start the next frame; returns the time elapsed since the last one, in frames of REFERENCE_FPS."""
+        now = self.clock()
+        # Overrun: skip the deadlines already missed and aim for the next one
+        missed = max(0, int((now - self.deadline) / self.period))
+        self.dropped += missed
+        self.deadline += (missed + 1) * self.period
+
+        steps = min((now - self.last) * self.reference_fps, self.max_steps)
+        self.last = now
+        self.time += steps
+
+        self.window_frames += 1
+        if now - self.window_start >= 1:
+            self.fps = self.window_frames / (now - self.window_start)
+            self.window_start = now
+            self.window_frames = 0
+        return steps
+
+    def wait(self):
+        """Sleep until the next frame is due; returns the time elapsed since the last one, in frames of REFERENCE_FPS."""
+        delay = self.remaining()
+        if delay > 0:
+            self.sleep(delay)
+        return self.tick()
+
+    def status(self):
+        """FPS and dropped-frame line for the presenters."""
+        return f"FPS: {self.fps:.2f}  dropped: {self.dropped}"
@@ -0,0 +1,63 @@
+"""Precomputed shading lookup for the HSV color path of the cube renderers.
+
+The glyph and color of a lit cell in Test.py/Test3.py depend only on the
+light intensity factor, so they are computed once for a fixed number of
+quantized intensity levels instead of per pixel.
+"""
+import colorsys
+import functools
+
+from ansi import rgb
+
+LUMINANCE_CHARS = ".,-~:;=!*#$@"  # Set of characters representing brightness levels
+
+class ShadingTable:
+    def __init__(self, hue=0.33, saturation=1.0, white_blend=0.3, levels=256, chars=LUMINANCE_CHARS):
+        # Above this intensity neither the glyph nor the (white-blended) color change
+        self.max_intensity = max(1.0, 1.0 / white_blend) if white_blend > 0 else 1.0
+
+        # Use a whole number of levels per glyph so glyph boundaries stay exact;
+        # at most `levels` entries are built
+        glyph_steps = len(chars) - 1
+        levels_per_glyph = max(1, int((levels - 1) / (self.max_intensity * glyph_steps)))
+        self.scale = glyph_steps * levels_per_glyph
+        self.levels = min(levels, int(self.max_intensity * self.scale) + 1)
+
+        self.glyphs = []
+        self.colors = []
+        for level in range(self.levels):
+            intensity = level / self.scale
+
+            # Convert intensity to a color using HSV, capping the value at 1
+            r, g, b = colorsys.hsv_to_rgb(hue, saturation, min(1, intensity))
+
+            # Blend towards white as the light gets stronger
+            r = min(1, r + intensity * white_blend)
+            g = min(1, g + intensity * white_blend)
+            b = min(1, b + intensity * white_blend)
+            self.colors.append(rgb(int(r * 255), int(g * 255), int(b * 255)))
+
+            self.glyphs.append(chars[min(level // levels_per_glyph, glyph_steps)])
+
+    def level(self, intensity):
+        """Return the table index for a light intensity factor."""
+        level = int(intensity * self.scale)
+        if level >= self.levels:
+            return self.levels - 1
+        if level < 0:
+            return 0
+        return level
+
+    def lookup(self, intensity):
+        """Return the (glyph, color escape) pair for a light intensity factor."""
+        level = self.level(intensity)
+        return self.glyphs[level], self.colors[level]
+
+    def palette(self):
+        """Screen-code palette: code 0 is blank, code n + 1 is level n."""
+        return [(' ', None)] + list(zip(self.glyphs, self.colors))
+
+@functools.lru_cache(maxsize=None)
+def shading_table(hue=0.33, saturation=1.0, white_blend=0.3, levels=256):
+    """Shared ShadingTable, built once per palette/hue and level count."""
+    return ShadingTable(hue, saturation, white_blend, levels)
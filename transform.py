@@ -0,0 +1,134 @@
+"""Matrix-based rotation and projection shared by the renderers.
+
+The rotation of a frame is folded into one 3x3 matrix (optionally extended
+to a perspective or orthographic projection) and applied to whole batches
+of points, instead of evaluating sines and cosines per point.
+"""
+from math import sin, cos, sqrt
+
+def normalize(vector):
+    """Scale a 3D vector to unit length."""
+    length = sqrt(vector[0] * vector[0] + vector[1] * vector[1] + vector[2] * vector[2])
+    return (vector[0] / length, vector[1] / length, vector[2] / length)
+
+def dot_product(v1, v2):
+    return v1[0] * v2[0] + v1[1] * v2[1] + v1[2] * v2[2]
+
+def spherical(radius, theta, phi):
+    """Point at azimuth theta and polar angle phi (from +z) on a sphere around the origin."""
+    return (radius * sin(phi) * cos(theta),
+            radius * sin(phi) * sin(theta),
+            radius * cos(phi))
+
+def rotation_matrix(A, B, C):
+    """Return the cube rotation (angles A, B, C) as a 3x3 tuple of rows."""
+    sinA, cosA = sin(A), cos(A)
+    sinB, cosB = sin(B), cos(B)
+    sinC, cosC = sin(C), cos(C)
+    return (
+        (cosB * cosC, sinA * sinB * cosC + cosA * sinC, sinA * sinC - cosA * sinB * cosC),
+        (-cosB * sinC, cosA * cosC - sinA * sinB * sinC, sinA * cosC + cosA * sinB * sinC),
+        (-sinB, -sinA * cosB, cosA * cosB),
+    )
+
+def rotation_xz(A, B):
+    """Rotation by A around the x axis, then by B around the z axis (the torus)."""
+    sinA, cosA = sin(A), cos(A)
+    sinB, cosB = sin(B), cos(B)
+    return (
+        (cosB, -sinB * cosA, sinB * sinA),
+        (sinB, cosB * cosA, -cosB * sinA),
+        (0.0, sinA, cosA),
+    )
+
+def rotation_yx(rotation_x, rotation_y):
+    """Rotation by rotation_y around the y axis, then by rotation_x around the x axis (the spheres)."""
+    sin_rx, cos_rx = sin(rotation_x), cos(rotation_x)
+    sin_ry, cos_ry = sin(rotation_y), cos(rotation_y)
+    return (
+        (cos_ry, 0.0, -sin_ry),
+        (-sin_rx * sin_ry, cos_rx, -sin_rx * cos_ry),
+        (cos_rx * sin_ry, sin_rx, cos_rx * cos_ry),
+    )
+
+def transform_point(matrix, i, j, k):
+    """Rotate a single point."""
+    (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = matrix
+    return (m00 * i + m01 * j + m02 * k,
+            m10 * i + m11 * j + m12 * k,
+            m20 * i + m21 * j + m22 * k)
+
+# Per-point rotation of the original cube scripts (compatibility shims; build
+# the matrix once per frame instead when transforming many points)
+def calculate_x(i, j, k, A, B, C):
+    return transform_point(rotation_matrix(A, B, C), i, j, k)[0]
+
+def calculate_y(i, j, k, A, B, C):
+    return transform_point(rotation_matrix(A, B, C), i, j, k)[1]
+
+def calculate_z(i, j, k, A, B, C):
+    return transform_point(rotation_matrix(A, B, C), i, j, k)[2]
+
+def transform_points(matrix, points):
+    """Rotate a batch of (i, j, k) points, returning a list of (x, y, z) tuples."""
+    (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = matrix
+    return [(m00 * i + m01 * j + m02 * k,
+             m10 * i + m11 * j + m12 * k,
+             m20 * i + m21 * j + m22 * k) for i, j, k in points]
+
+def projection_matrix(rotation, K1, K2, screen_width, screen_height, x_scale=2):
+    """
+    Extend a rotation to a 4x4 matrix producing homogeneous screen coordinates.
+
+    The point is rotated, pushed back by K2 and projected with K1 (x is
+    stretched by x_scale for the character aspect ratio) around the screen
+    centre. Rows are screen x, screen y, depth and w (the depth again).
+    """
+    (r00, r01, r02), (r10, r11, r12), (r20, r21, r22) = rotation
+    kx = K1 * x_scale
+    ky = -K1
+    cx = screen_width / 2
+    cy = screen_height / 2
+    return (
+        (kx * r00 + cx * r20, kx * r01 + cx * r21, kx * r02 + cx * r22, cx * K2),
+        (ky * r10 + cy * r20, ky * r11 + cy * r21, ky * r12 + cy * r22, cy * K2),
+        (r20, r21, r22, K2),
+        (r20, r21, r22, K2),
+    )
+
+def project_points(matrix, points):
+    """
+    Apply a projection_matrix to a batch of points.
+
+    Returns a list of (screen_x, screen_y, ooz) tuples, where ooz is 1/z as
+    used by the z-buffers. Screen coordinates are not yet truncated to cells.
+    """
+    (m00, m01, m02, m03), (m10, m11, m12, m13), _, (m30, m31, m32, m33) = matrix
+    projected = []
+    for i, j, k in points:
+        ooz = 1 / (m30 * i + m31 * j + m32 * k + m33)
+        projected.append(((m00 * i + m01 * j + m02 * k + m03) * ooz,
+                          (m10 * i + m11 * j + m12 * k + m13) * ooz,
+                          ooz))
+    return projected
+
+def orthographic_matrix(rotation, scale_x, scale_y, screen_width, screen_height):
+    """
+    Extend a rotation to a 3x4 parallel projection around the screen centre.
+
+    Rows are screen x, screen y and depth (the rotated z, larger is nearer).
+    """
+    (r00, r01, r02), (r10, r11, r12), (r20, r21, r22) = rotation
+    ky = -scale_y
+    return (
+        (scale_x * r00, scale_x * r01, scale_x * r02, screen_width / 2),
+        (ky * r10, ky * r11, ky * r12, screen_height / 2),
+        (r20, r21, r22, 0.0),
+    )
+
+def project_orthographic(matrix, points):
+    """Apply an orthographic_matrix to a batch of points, returning (screen_x, screen_y, depth) tuples."""
+    (m00, m01, m02, m03), (m10, m11, m12, m13), (m20, m21, m22, _) = matrix
+    return [(m00 * i + m01 * j + m02 * k + m03,
+             m10 * i + m11 * j + m12 * k + m13,
+             m20 * i + m21 * j + m22 * k) for i, j, k in points]